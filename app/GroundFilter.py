@@ -4,7 +4,7 @@ from pathlib import Path
 
 from sqlalchemy import and_, select
 
-from app.core.CONFIG import DATABASE_NAME, LOGGER
+from app.core.CONFIG import DATABASE_NAME, DEM_PERCENTILE, LOGGER
 from app.core.base.Point import Point
 from app.core.base.Scan import Scan
 from app.core.db.start_db import create_db, engine, Tables
@@ -12,12 +12,16 @@ from app.core.filters.PointFilterByMaxV import PointFilterMaxV
 from app.core.filters.PointFilterMedian import PointFilterMedian
 from app.core.models.BIModel import BiModel
 from app.core.models.VoxelModel import VoxelModel
+from app.core.utils.ModelRegistry import ModelRegistry
+from app.core.utils.MultiVMSeparator import MultiVMSeparator
+from app.core.utils.ScanCache import ScanCache
+from app.core.utils.VoxelPyramidRegistry import VoxelPyramidRegistry
 
 
 class GroundFilter:
     logger = logging.getLogger(LOGGER)
 
-    def __init__(self, path, n, step, k_value, n_vm=4, max_v=1):
+    def __init__(self, path, n, step, k_value, n_vm=4, max_v=1, base_model_type="DEM", dem_percentile=DEM_PERCENTILE):
         create_db()
         self.path = Path(path)
         self.scan = self.create_scan()
@@ -26,36 +30,48 @@ class GroundFilter:
         self.k_value = k_value
         self.max_v = max_v
         self.n_vm = n_vm
+        self.base_model_type = base_model_type
+        self.dem_percentile = dem_percentile
         self.voxels_models = self.create_voxel_models()
 
     def create_scan(self):
         scan = Scan(self.path.stem)
         scan.load_scan_from_file(str(self.path))
+        ScanCache().invalidate(scan.id)
         return scan
 
     def create_voxel_models(self):
+        scan = ScanCache().get_scan(self.scan.id)
+        separator = MultiVMSeparator()
         voxels_models = []
         for n_vm in range(self.n_vm):
             delta = round(1 / self.n_vm * n_vm, 2)
-            vm = VoxelModel(self.scan, self.step, dx=delta, dy=delta)
+            vm = VoxelModel(scan, self.step, dx=delta, dy=delta, voxel_model_separator=separator)
             voxels_models.append(vm)
+        separator.separate_voxel_models()
         return voxels_models
 
     def filter_scan(self):
         base_dir = self.path.parent
         for idx in range(self.n):
             vm = self.voxels_models[idx % len(self.voxels_models)]
-            dem_model = BiModel(vm, "DEM")
+            dem_model = ModelRegistry().get_model(BiModel, vm, self.base_model_type, True, self.dem_percentile)
             pf = PointFilterMedian(self.scan, dem_model, self.k_value)
             self.write_mse(f"{os.path.join(base_dir, self.scan.scan_name)}_log.txt", pf, idx, vm)
             if pf.median * self.k_value < self.max_v:
                 pf.filter_scan()
             else:
-                PointFilterMaxV(self.scan, dem_model, self.max_v).filter_scan()
-            dem_model.delete_model()
+                pf = PointFilterMaxV(self.scan, dem_model, self.max_v)
+                pf.filter_scan()
+            for voxel_model in self.voxels_models:
+                voxel_model.update_voxels_from_deactivated_points(pf.deactivated_points)
+            ModelRegistry().update_models_from_removed_points(self.scan.id, pf.deactivated_points)
             yield 1
         self.save_ground_scan(self.scan, f"{os.path.join(base_dir, self.scan.scan_name)}_ground_points.txt")
         self.save_not_ground_scan(self.scan, f"{os.path.join(base_dir, self.scan.scan_name)}_not_ground_points.txt")
+        ModelRegistry().clear()
+        ScanCache().invalidate(self.scan.id)
+        VoxelPyramidRegistry().invalidate(self.scan.id)
         engine.dispose()
         os.remove(os.path.join(".", DATABASE_NAME))
         yield 1
@@ -2,6 +2,33 @@
 DATABASE_NAME = "TEMP_DB.sqlite"
 
 POINTS_CHUNK_COUNT = 100_000
+# Максимальное количество ключей вокселей в одном запросе SELECT ... WHERE vxl_key IN (...)
+VOXEL_KEYS_CHUNK_COUNT = 10_000
 
 LOGGER = "console"
 LOGGING_LEVEL = "DEBUG"
+
+# "raster" - ячейки сегментированных моделей хранятся в БД массивами (BLOB) целиком на модель
+# "cells" - каждая ячейка хранится отдельной строкой в таблицах dem_cells / bi_cells
+SEGMENTED_MODEL_STORAGE = "raster"
+
+# Максимальное полное число вокселей модели, при котором метрики вокселей накапливаются в плотных массивах
+# Для моделей большего размера используется разреженная воксельная структура
+DENSE_VOXEL_STRUCTURE_MAX_SIZE = 50_000_000
+
+# Сохранять ли при разбиении воксельной модели принадлежность точек вокселям (таблица voxel_memberships)
+STORE_VOXEL_MEMBERSHIP = True
+
+# Каталог дискового кеша разбитых воксельных моделей, None - каталог voxel_model_cache рядом с файлом БД
+VOXEL_MODEL_CACHE_DIR = None
+# Максимальный размер каталога кеша воксельных моделей в байтах, 0 - кеш отключен
+VOXEL_MODEL_CACHE_MAX_SIZE = 1024 ** 3
+
+# Количество уровней воксельной пирамиды над базовой моделью (размер вокселя до base_step * 2^VOXEL_PYRAMID_MAX_LEVEL)
+VOXEL_PYRAMID_MAX_LEVEL = 5
+
+# Максимальный суммарный объем сегментированных моделей в реестре моделей в байтах
+MODEL_REGISTRY_MAX_SIZE = 512 * 1024 ** 2
+
+# Процентиль высот точек ячейки по умолчанию для DemPercentileModel и BiModel с базовой моделью "DEM_PERCENTILE"
+DEM_PERCENTILE = 10
@@ -9,21 +9,43 @@ class BiCell(CellABC):
     Класс ячейки модели с билинейной интерполяцией между вершинами ячейки
     """
     db_table = Tables.bi_cell_db_table
+    # Оценка объема оперативной памяти, занимаемой ячейкой с вершинами (без ячейки базовой модели), в байтах
+    memory_size = 1250
 
-    def __init__(self, cell, dem_model):
+    def __init__(self, cell, dem_model, x, y, step):
         self.cell = cell
-        self.voxel = cell.voxel
         self.dem_model = dem_model
-        self.voxel_id = None
+        self.voxel_id = cell.voxel_id
         self.base_model_id = None
-        self.r = len(self.voxel) - 4
-        self.left_down = {"X": self.voxel.X, "Y": self.voxel.Y, "Z": None, "MSE": None}
-        self.left_up = {"X": self.voxel.X, "Y": self.voxel.Y + self.voxel.step, "Z": None, "MSE": None}
-        self.right_down = {"X": self.voxel.X + self.voxel.step, "Y": self.voxel.Y, "Z": None, "MSE": None}
-        self.right_up = {"X": self.voxel.X + self.voxel.step, "Y": self.voxel.Y + self.voxel.step, "Z": None,
-                         "MSE": None}
+        self.r = cell.r - 3
+        self.left_down = {"X": x, "Y": y, "Z": None, "MSE": None}
+        self.left_up = {"X": x, "Y": y + step, "Z": None, "MSE": None}
+        self.right_down = {"X": x + step, "Y": y, "Z": None, "MSE": None}
+        self.right_up = {"X": x + step, "Y": y + step, "Z": None, "MSE": None}
         self.mse = None
 
+    @property
+    def voxel(self):
+        """
+        Воксель ячейки (общий с ячейкой базовой модели)
+        :return: объект VoxelLite
+        """
+        return self.cell.voxel
+
+    @classmethod
+    def create_cells(cls, base_model, dem_model):
+        """
+        Создает ячейки модели по ячейкам базовой модели
+        Координаты вершин рассчитываются по столбцам массивов вокселей без создания объектов вокселей
+        :param base_model: базовая сегментированная модель
+        :param dem_model: модель, которой принадлежат ячейки
+        :return: список ячеек в порядке ячеек базовой модели
+        """
+        voxel_arrays = base_model._voxel_arrays
+        step = dem_model.voxel_model.step
+        return [cls(cell, dem_model, x, y, step)
+                for cell, x, y in zip(base_model, voxel_arrays.X.tolist(), voxel_arrays.Y.tolist())]
+
     def get_z_from_xy(self, x, y):
         """
         Рассчитывает отметку точки (x, y) в ячейке
@@ -45,7 +67,7 @@ class BiCell(CellABC):
         raise NotImplementedError
 
     def get_db_raw_data(self):
-        return {"voxel_id": self.voxel.id,
+        return {"voxel_id": self.voxel_id,
                 "base_model_id": self.dem_model.id,
                 "Z_ld": self.left_down["Z"],
                 "Z_lu": self.left_up["Z"],
@@ -64,7 +86,7 @@ class BiCell(CellABC):
         :param db_connection: открытое соединение с БД
         :return: None
         """
-        stmt = insert(self.db_table).values(voxel_id=self.voxel.id,
+        stmt = insert(self.db_table).values(voxel_id=self.voxel_id,
                                             base_model_id=self.dem_model.id,
                                             Z_ld=self.left_down["Z"],
                                             Z_lu=self.left_up["Z"],
@@ -95,8 +117,8 @@ class BiCell(CellABC):
         self.mse = db_cell_data["MSE"]
 
     def __str__(self):
-        return f"{self.__class__.__name__} [ID: {self.voxel.id},\tbi_model: {self.dem_model}\t" \
+        return f"{self.__class__.__name__} [ID: {self.voxel_id},\tbi_model: {self.dem_model}\t" \
                f"MSE: {self.mse:.3f}\tr: {self.r}]"
 
     def __repr__(self):
-        return f"{self.__class__.__name__} [ID: {self.voxel.id}]"
+        return f"{self.__class__.__name__} [ID: {self.voxel_id}]"
@@ -6,8 +6,20 @@ from sqlalchemy import select, and_
 class CellABC(ABC):
     """
     Абстрактный класс ячейки сегментированной модели
+    Ячейка ссылается на воксель позицией в массивах вокселей модели VoxelArrays,
+    объект вокселя создается только при первом обращении к атрибуту voxel
     """
 
+    @property
+    def voxel(self):
+        """
+        Воксель ячейки, создается по массивам вокселей модели при первом обращении
+        :return: объект VoxelLite
+        """
+        if self._voxel is None:
+            self._voxel = self._voxel_arrays.get_voxel(self._voxel_idx)
+        return self._voxel
+
     @abstractmethod
     def get_z_from_xy(self, x, y):
         """
@@ -48,7 +60,7 @@ class CellABC(ABC):
         :return: None
         """
         select_ = select(self.db_table) \
-            .where(and_(self.db_table.c.voxel_id == self.voxel.id,
+            .where(and_(self.db_table.c.voxel_id == self.voxel_id,
                         self.db_table.c.base_model_id == self.dem_model.id))
         db_cell_data = db_connection.execute(select_).mappings().first()
         if db_cell_data is not None:
@@ -9,15 +9,31 @@ class DemCell(CellABC):
     Класс ячейки стандартной DEM модели
     """
     db_table = Tables.dem_cell_db_table
+    # Оценка объема оперативной памяти, занимаемой ячейкой вместе с вокселем, в байтах
+    memory_size = 550
 
-    def __init__(self, voxel, dem_model):
-        self.voxel = voxel
+    def __init__(self, voxel_arrays, voxel_idx, voxel_id, voxel_len, dem_model):
+        self._voxel_arrays = voxel_arrays
+        self._voxel_idx = voxel_idx
+        self._voxel = None
         self.dem_model = dem_model
-        self.voxel_id = None
+        self.voxel_id = voxel_id
         self.avr_z = None
-        self.r = len(self.voxel) - 1
+        self.r = voxel_len - 1
         self.mse = None
 
+    @classmethod
+    def create_cells(cls, voxel_arrays, dem_model):
+        """
+        Создает ячейки модели по столбцам массивов вокселей без создания объектов вокселей
+        :param voxel_arrays: массивы непустых вокселей воксельной модели VoxelArrays
+        :param dem_model: модель, которой принадлежат ячейки
+        :return: список ячеек в порядке вокселей в массивах
+        """
+        return [cls(voxel_arrays, voxel_idx, voxel_id, voxel_len, dem_model)
+                for voxel_idx, (voxel_id, voxel_len) in enumerate(zip(voxel_arrays.ids.tolist(),
+                                                                      voxel_arrays.len.tolist()))]
+
     def get_z_from_xy(self, x, y):
         """
         Рассчитывает отметку точки (x, y) в ячейке
@@ -31,7 +47,7 @@ class DemCell(CellABC):
         return self.mse
 
     def get_db_raw_data(self):
-        return {"voxel_id": self.voxel.id,
+        return {"voxel_id": self.voxel_id,
                 "base_model_id": self.dem_model.id,
                 "Avr_Z": self.avr_z,
                 "r": self.r,
@@ -43,7 +59,7 @@ class DemCell(CellABC):
         :param db_connection: открытое соединение с БД
         :return: None
         """
-        stmt = insert(Tables.dem_cell_db_table).values(voxel_id=self.voxel.id,
+        stmt = insert(Tables.dem_cell_db_table).values(voxel_id=self.voxel_id,
                                                        base_model_id=self.dem_model.id,
                                                        Avr_Z=self.avr_z,
                                                        r=self.r,
@@ -64,8 +80,8 @@ class DemCell(CellABC):
         self.mse = db_cell_data["MSE"]
 
     def __str__(self):
-        return f"{self.__class__.__name__} [ID: {self.voxel.id},\tavr_z: {self.avr_z:.3f}\t" \
+        return f"{self.__class__.__name__} [ID: {self.voxel_id},\tavr_z: {self.avr_z:.3f}\t" \
                f"MSE: {self.mse:.3f}\tr: {self.r}]"
 
     def __repr__(self):
-        return f"{self.__class__.__name__} [ID: {self.voxel.id}]"
+        return f"{self.__class__.__name__} [ID: {self.voxel_id}]"
@@ -0,0 +1,79 @@
+import numpy as np
+
+
+class PointBatch:
+    """
+    Пакет точек в виде массивов numpy
+    Используется вместо отдельных объектов Point при пакетном переборе скана
+    """
+    __slots__ = ["ids", "xyz", "rgb"]
+
+    def __init__(self, ids, xyz, rgb):
+        self.ids = ids
+        self.xyz = xyz
+        self.rgb = rgb
+
+    def __str__(self):
+        return f"{self.__class__.__name__} [LEN: {len(self)}]"
+
+    def __repr__(self):
+        return f"{self.__class__.__name__} [LEN: {len(self)}]"
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, item):
+        """
+        Возвращает часть пакета по срезу, маске или массиву индексов
+        :param item: срез, булева маска или массив индексов точек
+        :return: объект класса PointBatch
+        """
+        return self.__class__(self.ids[item], self.xyz[item], self.rgb[item])
+
+    @property
+    def X(self):
+        return self.xyz[:, 0]
+
+    @property
+    def Y(self):
+        return self.xyz[:, 1]
+
+    @property
+    def Z(self):
+        return self.xyz[:, 2]
+
+    @classmethod
+    def parse_batch_from_db_rows(cls, rows):
+        """
+        Создает пакет точек из списка строк читаемых из БД
+        :param rows: список кортежей (id, X, Y, Z, R, G, B)
+        :return: объект класса PointBatch
+        """
+        # Строки sqlalchemy (Row) приводятся к кортежам - иначе numpy долго опрашивает их атрибуты
+        data = np.array(list(map(tuple, rows)), dtype=np.float64).reshape((-1, 7))
+        return cls(ids=data[:, 0].astype(np.int64),
+                   xyz=np.ascontiguousarray(data[:, 1:4]),
+                   rgb=data[:, 4:7].astype(np.int64))
+
+    @classmethod
+    def create_from_points(cls, points):
+        """
+        Создает пакет точек из списка объектов Point
+        :param points: список точек
+        :return: объект класса PointBatch
+        """
+        return cls.parse_batch_from_db_rows([(point.id, point.X, point.Y, point.Z,
+                                              point.R, point.G, point.B) for point in points])
+
+    @classmethod
+    def concatenate(cls, batches):
+        """
+        Объединяет несколько пакетов точек в один
+        :param batches: список пакетов точек
+        :return: объект класса PointBatch
+        """
+        if len(batches) == 0:
+            return cls.parse_batch_from_db_rows([])
+        return cls(ids=np.concatenate([batch.ids for batch in batches]),
+                   xyz=np.concatenate([batch.xyz for batch in batches]),
+                   rgb=np.concatenate([batch.rgb for batch in batches]))
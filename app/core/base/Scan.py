@@ -3,6 +3,7 @@ from abc import ABC, abstractmethod
 from sqlalchemy import select, insert
 
 from app.core.CONFIG import POINTS_CHUNK_COUNT
+from app.core.base.PointBatch import PointBatch
 from app.core.db.start_db import Tables, engine
 from app.core.utils.ScanIterator import ScanIterator
 from app.core.utils.ScanLoader import ScanLoader
@@ -36,6 +37,21 @@ class ScanABC(ABC):
     def __iter__(self):
         pass
 
+    def iter_batches(self, size=POINTS_CHUNK_COUNT):
+        """
+        Перебирает точки скана пакетами
+        :param size: максимальное количество точек в пакете
+        :return: генератор пакетов точек PointBatch
+        """
+        points = []
+        for point in self:
+            points.append(point)
+            if len(points) == size:
+                yield PointBatch.create_from_points(points)
+                points = []
+        if points:
+            yield PointBatch.create_from_points(points)
+
 
 class Scan(ScanABC):
     """
@@ -53,6 +69,14 @@ class Scan(ScanABC):
         """
         return iter(ScanIterator(self))
 
+    def iter_batches(self, size=POINTS_CHUNK_COUNT):
+        """
+        Перебирает точки скана из БД пакетами массивов numpy без создания объектов Point
+        :param size: максимальное количество точек в пакете
+        :return: генератор пакетов точек PointBatch
+        """
+        return ScanIterator(self).iter_batches(size)
+
     def load_scan_from_file(self, file_name,
                             scan_loader=ScanLoader(scan_parser=ScanTxtParser(chunk_count=POINTS_CHUNK_COUNT))):
         """
@@ -1,9 +1,10 @@
 import logging
 from abc import ABC
 
+import numpy as np
 from sqlalchemy import delete, select, insert
 
-from app.core.CONFIG import LOGGER
+from app.core.CONFIG import LOGGER, VOXEL_KEYS_CHUNK_COUNT
 from app.core.db.start_db import Tables, engine
 
 
@@ -14,6 +15,11 @@ class VoxelABC(ABC):
 
     logger = logging.getLogger(LOGGER)
 
+    # Количество младших бит ключа вокселя, отводимых под плоский индекс вокселя в модели
+    VXL_KEY_MODEL_SHIFT = 40
+    # Допустимое отклонение координат вокселя от узлов сетки воксельной модели в долях размера вокселя
+    VXL_GRID_TOLERANCE = 1e-6
+
     def __init__(self, X, Y, Z, step, vxl_mdl_id):
         self.id = None
         self.X = X
@@ -21,19 +27,44 @@ class VoxelABC(ABC):
         self.Z = Z
         self.step = step
         self.vxl_mdl_id = vxl_mdl_id
-        self.vxl_name = self.__name_generator()
+        self.vxl_key = None
         self.len = 0
         self.R, self.G, self.B = 0, 0, 0
 
-    def __name_generator(self):
+    @property
+    def vxl_name(self):
         """
-        Конструктор имени вокселя
-        :return: None
+        Имя вокселя, формируется только при обращении к нему (для вывода)
+        :return: имя вокселя
+        """
+        return self.generate_vxl_name(self.X, self.Y, self.Z, self.step, self.vxl_mdl_id)
+
+    @classmethod
+    def generate_vxl_key(cls, vxl_mdl_id, flat_key):
+        """
+        Конструктор целочисленного ключа вокселя
+        key = (vxl_mdl_id << VXL_KEY_MODEL_SHIFT) + (z * Y_count + y) * X_count + x
+        :param vxl_mdl_id: id воксельной модели
+        :param flat_key: плоский индекс вокселя в модели (число или массив numpy)
+        :return: ключ вокселя (число или массив numpy)
+        """
+        return (int(vxl_mdl_id) << cls.VXL_KEY_MODEL_SHIFT) + flat_key
+
+    @staticmethod
+    def generate_vxl_name(X, Y, Z, step, vxl_mdl_id):
         """
-        return (f"VXL_VM:{self.vxl_mdl_id}_s{self.step}_"
-                f"X:{round(self.X, 5)}_"
-                f"Y:{round(self.Y, 5)}_"
-                f"Z:{round(self.Z, 5)}"
+        Конструктор имени вокселя по его координатам
+        :param X: координата X вокселя
+        :param Y: координата Y вокселя
+        :param Z: координата Z вокселя
+        :param step: размер вокселя
+        :param vxl_mdl_id: id воксельной модели
+        :return: имя вокселя
+        """
+        return (f"VXL_VM:{vxl_mdl_id}_s{step}_"
+                f"X:{round(X, 5)}_"
+                f"Y:{round(Y, 5)}_"
+                f"Z:{round(Z, 5)}"
                 )
 
     def __str__(self):
@@ -52,9 +83,11 @@ class VoxelABC(ABC):
 class Voxel(VoxelABC):
     """
     Воксель связанный с базой данных
+    Воксельная модель вокселя должна быть записана в БД, координаты вокселя должны лежать в узлах сетки модели
+    в ее границах, иначе при создании вокселя выбрасывается ValueError
     """
 
-    __slots__ = ["id", "X", "Y", "Z", "step", "vxl_mdl_id", "vxl_name", "len", "R", "G", "B"]
+    __slots__ = ["id", "X", "Y", "Z", "step", "vxl_mdl_id", "vxl_key", "len", "R", "G", "B"]
 
     def __init__(self, X, Y, Z, step, vxl_mdl_id, db_connection=None):
         super().__init__(X, Y, Z, step, vxl_mdl_id)
@@ -80,18 +113,21 @@ class Voxel(VoxelABC):
     def __init_voxel(self, db_connection=None):
         """
         Инициализирует воксель при запуске
-        Если воксель с таким именем уже есть в БД - запускает копирование данных из БД в атрибуты скана
+        Если воксель с таким ключом уже есть в БД - запускает копирование данных из БД в атрибуты скана
         Если такого вокселя нет - создает новую запись в БД
         :param db_connection: Открытое соединение с БД
         :return: None
         """
         def init_logic(db_conn):
-            select_ = select(Tables.voxels_db_table).where(Tables.voxels_db_table.c.vxl_name == self.vxl_name)
+            if self.vxl_key is None:
+                self.vxl_key = self.__calk_vxl_keys([(self.X, self.Y, self.Z, self.step, self.vxl_mdl_id)],
+                                                    db_conn)[0]
+            select_ = select(Tables.voxels_db_table).where(Tables.voxels_db_table.c.vxl_key == self.vxl_key)
             db_voxel_data = db_conn.execute(select_).mappings().first()
             if db_voxel_data is not None:
                 self.__copy_voxel_data(db_voxel_data)
             else:
-                stmt = insert(Tables.voxels_db_table).values(vxl_name=self.vxl_name,
+                stmt = insert(Tables.voxels_db_table).values(vxl_key=self.vxl_key,
                                                              X=self.X,
                                                              Y=self.Y,
                                                              Z=self.Z,
@@ -108,6 +144,115 @@ class Voxel(VoxelABC):
         else:
             init_logic(db_connection)
 
+    @classmethod
+    def get_or_create_many(cls, voxels_data, db_connection=None):
+        """
+        Пакетно находит в БД или создает воксели
+        Существующие воксели выбираются по ключам, отсутствующие создаются одним пакетным INSERT
+        и выбираются повторно, вместо отдельных SELECT и INSERT для каждого вокселя
+        Если воксельной модели нет в БД или координаты вокселя не лежат в узлах сетки модели в ее границах,
+        выбрасывается ValueError, воксели при этом не создаются
+        :param voxels_data: последовательность кортежей (X, Y, Z, step, vxl_mdl_id)
+        :param db_connection: Открытое соединение с БД
+        :return: список объектов Voxel в порядке voxels_data
+        """
+        def get_or_create_logic(db_conn):
+            vxl_keys = cls.__calk_vxl_keys(voxels_data, db_conn)
+            db_voxels_data = cls.__select_voxels_by_keys(set(vxl_keys), db_conn)
+            new_voxels = {}
+            for vxl_key, (X, Y, Z, step, vxl_mdl_id) in zip(vxl_keys, voxels_data):
+                if vxl_key not in db_voxels_data and vxl_key not in new_voxels:
+                    new_voxels[vxl_key] = {"vxl_key": vxl_key, "X": X, "Y": Y, "Z": Z,
+                                           "step": step, "vxl_mdl_id": vxl_mdl_id}
+            if new_voxels:
+                db_conn.execute(insert(Tables.voxels_db_table), list(new_voxels.values()))
+                db_conn.commit()
+                db_voxels_data.update(cls.__select_voxels_by_keys(new_voxels.keys(), db_conn))
+            voxels = []
+            for vxl_key in vxl_keys:
+                voxel = cls.__new__(cls)
+                voxel.__copy_voxel_data(db_voxels_data[vxl_key])
+                voxels.append(voxel)
+            return voxels
+
+        if db_connection is None:
+            with engine.connect() as db_connection:
+                return get_or_create_logic(db_connection)
+        return get_or_create_logic(db_connection)
+
+    @staticmethod
+    def __select_voxels_by_keys(vxl_keys, db_connection):
+        """
+        Выбирает из БД записи вокселей по ключам
+        Ключи передаются в запрос частями, чтобы не превысить ограничение SQLite на число параметров
+        :param vxl_keys: коллекция ключей вокселей
+        :param db_connection: Открытое соединение с БД
+        :return: словарь {ключ вокселя: запись вокселя из БД}
+        """
+        vxl_keys = list(vxl_keys)
+        db_voxels_data = {}
+        for start in range(0, len(vxl_keys), VOXEL_KEYS_CHUNK_COUNT):
+            select_ = select(Tables.voxels_db_table) \
+                .where(Tables.voxels_db_table.c.vxl_key.in_(vxl_keys[start:start + VOXEL_KEYS_CHUNK_COUNT]))
+            for db_voxel_data in db_connection.execute(select_).mappings():
+                db_voxels_data[db_voxel_data["vxl_key"]] = db_voxel_data
+        return db_voxels_data
+
+    @classmethod
+    def __calk_vxl_keys(cls, voxels_data, db_connection):
+        """
+        Рассчитывает ключи вокселей по их координатам и границам воксельных моделей из БД
+        :param voxels_data: последовательность кортежей (X, Y, Z, step, vxl_mdl_id)
+        :param db_connection: Открытое соединение с БД
+        :return: список ключей вокселей
+        """
+        data = np.array(voxels_data, dtype=np.float64).reshape((-1, 5))
+        vxl_mdl_ids = data[:, 4].astype(np.int64)
+        vxl_keys = np.empty(len(data), dtype=np.int64)
+        for vxl_mdl_id in np.unique(vxl_mdl_ids).tolist():
+            select_ = select(Tables.voxel_models_db_table).where(Tables.voxel_models_db_table.c.id == vxl_mdl_id)
+            db_vm_data = db_connection.execute(select_).mappings().first()
+            if db_vm_data is None:
+                raise ValueError(f"Воксельная модель с id {vxl_mdl_id} отсутствует в БД!")
+            mask = vxl_mdl_ids == vxl_mdl_id
+            x, y, z = cls.__calk_grid_indices(data[mask], db_vm_data)
+            vxl_keys[mask] = cls.generate_vxl_key(vxl_mdl_id,
+                                                  (z * db_vm_data["Y_count"] + y) * db_vm_data["X_count"] + x)
+        return vxl_keys.tolist()
+
+    @classmethod
+    def __calk_grid_indices(cls, data, db_vm_data):
+        """
+        Рассчитывает индексы вокселей в сетке воксельной модели и проверяет, что воксели принадлежат модели:
+        размер вокселей равен размеру вокселей модели, координаты лежат в узлах сетки модели,
+        индексы по каждой оси находятся в диапазоне [0, count)
+        :param data: массив строк (X, Y, Z, step, vxl_mdl_id) вокселей одной воксельной модели
+        :param db_vm_data: запись воксельной модели из БД
+        :return: массивы индексов x, y, z вокселей в сетке модели
+        """
+        vm_step = db_vm_data["step"]
+        if db_vm_data["X_count"] * db_vm_data["Y_count"] * db_vm_data["Z_count"] > 1 << cls.VXL_KEY_MODEL_SHIFT:
+            raise ValueError(f"Количество вокселей воксельной модели {db_vm_data['vm_name']} "
+                             f"не помещается в ключ вокселя!")
+        bad = ~np.isclose(data[:, 3], vm_step, rtol=0, atol=vm_step * cls.VXL_GRID_TOLERANCE)
+        if bad.any():
+            raise ValueError(f"Размер вокселя {data[bad][0, 3]} не совпадает с размером вокселей {vm_step} "
+                             f"воксельной модели {db_vm_data['vm_name']}!")
+        indices = []
+        for axis, name in enumerate(("X", "Y", "Z")):
+            grid_coords = (data[:, axis] - db_vm_data[f"min_{name}"]) / vm_step
+            idx = np.round(grid_coords)
+            off_grid = ~(np.abs(grid_coords - idx) <= cls.VXL_GRID_TOLERANCE)
+            if off_grid.any():
+                raise ValueError(f"Координата {name}={data[off_grid][0, axis]} вокселя не лежит в узле сетки "
+                                 f"воксельной модели {db_vm_data['vm_name']}!")
+            out_of_range = (idx < 0) | (idx >= db_vm_data[f"{name}_count"])
+            if out_of_range.any():
+                raise ValueError(f"Координата {name}={data[out_of_range][0, axis]} вокселя выходит за границы "
+                                 f"воксельной модели {db_vm_data['vm_name']}!")
+            indices.append(idx.astype(np.int64))
+        return indices
+
     def __copy_voxel_data(self, db_voxel_data: dict):
         """
         Копирует данные записи из БД в атрибуты вокселя
@@ -120,7 +265,7 @@ class Voxel(VoxelABC):
         self.Z = db_voxel_data["Z"]
         self.step = db_voxel_data["step"]
         self.vxl_mdl_id = db_voxel_data["vxl_mdl_id"]
-        self.vxl_name = db_voxel_data["vxl_name"]
+        self.vxl_key = db_voxel_data["vxl_key"]
         self.len = db_voxel_data["len"]
         self.R = db_voxel_data["R"]
         self.G = db_voxel_data["G"]
@@ -131,7 +276,7 @@ class VoxelLite(VoxelABC):
     """
     Воксель не связанный с базой данных
     """
-    __slots__ = ["id", "X", "Y", "Z", "step", "vxl_mdl_id", "vxl_name", "len", "R", "G", "B"]
+    __slots__ = ["id", "X", "Y", "Z", "step", "vxl_mdl_id", "vxl_key", "len", "R", "G", "B"]
 
     def __init__(self, X, Y, Z, step, vxl_mdl_id):
         super().__init__(X, Y, Z, step, vxl_mdl_id)
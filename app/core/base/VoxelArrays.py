@@ -0,0 +1,81 @@
+import numpy as np
+
+from app.core.base.Voxel import VoxelABC, VoxelLite
+
+
+class VoxelArrays:
+    """
+    Непустые воксели воксельной модели в виде выровненных массивов numpy
+    Воксели упорядочены по возрастанию ключа (z * Y_count + y) * X_count + x
+    Используется вместо отдельных объектов VoxelLite при построении моделей
+    """
+    __slots__ = ["voxel_model", "ids", "ix", "iy", "iz", "len", "rgb"]
+
+    def __init__(self, voxel_model, ids, ix, iy, iz, lens, rgb):
+        self.voxel_model = voxel_model
+        self.ids = ids
+        self.ix, self.iy, self.iz = ix, iy, iz
+        self.len = lens
+        self.rgb = rgb
+
+    def __str__(self):
+        return f"{self.__class__.__name__} [vm: {self.voxel_model.vm_name},\tLEN: {len(self)}]"
+
+    def __repr__(self):
+        return f"{self.__class__.__name__} [LEN: {len(self)}]"
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self.get_voxel(idx)
+
+    @property
+    def keys(self):
+        return (self.iz * self.voxel_model.Y_count + self.iy) * self.voxel_model.X_count + self.ix
+
+    @property
+    def X(self):
+        return self.voxel_model.min_X + self.ix * self.voxel_model.step
+
+    @property
+    def Y(self):
+        return self.voxel_model.min_Y + self.iy * self.voxel_model.step
+
+    @property
+    def Z(self):
+        return self.voxel_model.min_Z + self.iz * self.voxel_model.step
+
+    @classmethod
+    def parse_arrays_from_db_rows(cls, voxel_model, rows):
+        """
+        Создает массивы вокселей из списка строк читаемых из БД
+        Индексы вокселей восстанавливаются из ключа вокселя vxl_key
+        :param voxel_model: воксельная модель
+        :param rows: список кортежей (id, vxl_key, len, R, G, B)
+        :return: объект класса VoxelArrays
+        """
+        # Строки sqlalchemy (Row) приводятся к кортежам - иначе numpy долго опрашивает их атрибуты
+        data = np.array(list(map(tuple, rows)), dtype=np.int64).reshape((-1, 6))
+        data = data[np.argsort(data[:, 1], kind="stable")]
+        keys = data[:, 1] & ((1 << VoxelABC.VXL_KEY_MODEL_SHIFT) - 1)
+        ix = keys % voxel_model.X_count
+        iy = (keys // voxel_model.X_count) % voxel_model.Y_count
+        iz = keys // (voxel_model.X_count * voxel_model.Y_count)
+        return cls(voxel_model, data[:, 0], ix, iy, iz, data[:, 2], data[:, 3:6])
+
+    def get_voxel(self, idx):
+        """
+        Создает объект вокселя по его позиции в массивах
+        :param idx: позиция вокселя в массивах
+        :return: объект VoxelLite
+        """
+        vm = self.voxel_model
+        x, y, z = int(self.ix[idx]), int(self.iy[idx]), int(self.iz[idx])
+        voxel = VoxelLite(vm.min_X + x * vm.step, vm.min_Y + y * vm.step, vm.min_Z + z * vm.step, vm.step, vm.id)
+        voxel.id = int(self.ids[idx])
+        voxel.vxl_key = voxel.generate_vxl_key(vm.id, (z * vm.Y_count + y) * vm.X_count + x)
+        voxel.len = int(self.len[idx])
+        voxel.R, voxel.G, voxel.B = self.rgb[idx].tolist()
+        return voxel
@@ -1,6 +1,6 @@
 from threading import Lock
 
-from sqlalchemy import Table, Column, Integer, Float, String, Boolean, ForeignKey
+from sqlalchemy import Table, Column, Integer, Float, String, Boolean, ForeignKey, LargeBinary
 
 
 class SingletonMeta(type):
@@ -31,6 +31,8 @@ class TableInitializer(metaclass=SingletonMeta):
         self.dem_models_db_table = self.__create_dem_models_db_table()
         self.dem_cell_db_table = self.__create_dem_cell_db_table()
         self.bi_cell_db_table = self.__create_bi_cell_db_table()
+        self.model_rasters_db_table = self.__create_model_rasters_db_table()
+        self.voxel_memberships_db_table = self.__create_voxel_memberships_db_table()
 
     def __create_points_db_table(self):
         points_db_table = Table("points", self.__db_metadata,
@@ -79,7 +81,7 @@ class TableInitializer(metaclass=SingletonMeta):
     def __create_voxels_db_table(self):
         voxels_db_table = Table("voxels", self.__db_metadata,
                                 Column("id", Integer, primary_key=True),
-                                Column("vxl_name", String, nullable=False, unique=True, index=True),
+                                Column("vxl_key", Integer, nullable=False, unique=True, index=True),
                                 Column("X", Float),
                                 Column("Y", Float),
                                 Column("Z", Float),
@@ -158,3 +160,28 @@ class TableInitializer(metaclass=SingletonMeta):
                                  Column("MSE", Float, default=None)
                                  )
         return bi_cell_db_table
+
+    def __create_model_rasters_db_table(self):
+        model_rasters_db_table = Table("model_rasters", self.__db_metadata,
+                                       Column("base_model_id", Integer,
+                                              ForeignKey("dem_models.id", ondelete="CASCADE"),
+                                              primary_key=True),
+                                       Column("raster_name", String, primary_key=True),
+                                       Column("dtype", String, nullable=False),
+                                       Column("Z_count", Integer, nullable=False),
+                                       Column("Y_count", Integer, nullable=False),
+                                       Column("X_count", Integer, nullable=False),
+                                       Column("data", LargeBinary, nullable=False)
+                                       )
+        return model_rasters_db_table
+
+    def __create_voxel_memberships_db_table(self):
+        voxel_memberships_db_table = Table("voxel_memberships", self.__db_metadata,
+                                           Column("vxl_mdl_id", Integer,
+                                                  ForeignKey("voxel_models.id", ondelete="CASCADE"),
+                                                  primary_key=True),
+                                           Column("point_ids", LargeBinary, nullable=False),
+                                           Column("voxel_idx", LargeBinary, nullable=False),
+                                           Column("voxel_keys", LargeBinary, nullable=False)
+                                           )
+        return voxel_memberships_db_table
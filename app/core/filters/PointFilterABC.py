@@ -2,12 +2,14 @@ import logging
 from abc import ABC, abstractmethod
 from os import remove
 
+import numpy as np
 from sqlalchemy import delete, and_, select
 
 from app.core.CONFIG import LOGGER, POINTS_CHUNK_COUNT
 from app.core.base.Point import Point
 from app.core.base.Scan import Scan
 from app.core.db.start_db import Tables, engine
+from app.core.utils.ScanCache import ScanCache
 from app.core.utils.Scan_metrics import update_scan_in_db_from_scan, update_scan_metrics
 
 
@@ -16,6 +18,8 @@ class PointFilterABC(ABC):
 
     def __init__(self, scan):
         self.scan = scan
+        self.deactivated_ids = None
+        self.deactivated_points = None
 
     def __scan_name_generator(self):
         return f"{self.scan.scan_name}_FB_{self.__class__.__name__}"
@@ -24,6 +28,32 @@ class PointFilterABC(ABC):
     def _filter_logic(self, point):
         pass
 
+    def _filter_batch_logic(self, batch):
+        """
+        Определяет, какие точки пакета остаются активными
+        По умолчанию применяет _filter_logic к каждой точке пакета
+        :param batch: пакет точек PointBatch
+        :return: булев массив, True - точка остается активной
+        """
+        return np.array([self._filter_logic(Point.parse_point_from_db_row(row)) is True
+                         for row in zip(batch.ids.tolist(), *batch.xyz.T.tolist(), *batch.rgb.T.tolist())],
+                        dtype=np.bool_)
+
+    @staticmethod
+    def _get_batch_residuals(model, batch):
+        """
+        Рассчитывает отклонения высот точек пакета от поверхности сегментированной модели
+        :param model: сегментированная модель
+        :param batch: пакет точек PointBatch
+        :return: массив отклонений, NaN для точек вне ячеек модели, в ячейках без СКП
+        и в точках с неопределенной отметкой поверхности
+        """
+        cell_z, _ = model.sample(batch.X, batch.Y, batch.Z)
+        residuals = batch.Z - cell_z
+        cell_mse = model.get_cell_values("mse", model.get_cell_indices(batch.X, batch.Y, batch.Z))
+        residuals[np.isnan(cell_mse)] = np.nan
+        return residuals
+
     def filter_scan(self):
         self.__write_temp_points_scans_file(self.scan)
         with engine.connect() as db_connection:
@@ -35,6 +65,7 @@ class PointFilterABC(ABC):
                 db_connection.execute(Tables.points_scans_db_table.insert(), data)
                 self.logger.info(f"Пакет отфильтрованных точек загружен в БД")
             db_connection.commit()
+        self.deactivated_points = ScanCache().deactivate_points(self.scan.id, self.deactivated_ids)
         update_scan_metrics(self.scan)
         update_scan_in_db_from_scan(self.scan)
         return Scan(self.scan.scan_name)
@@ -46,7 +77,10 @@ class PointFilterABC(ABC):
         :return: None
         Рассчитывает и записывает во временный файл пару id точки и скана в вокселе
         Обновляет занчения метрик скана и вокселя в который попадает текущая точка
+        Активные точки берутся из кеша скана и фильтруются пакетами,
+        id деактивированных точек сохраняются в self.deactivated_ids
         """
+        deactivated_ids = []
         with open("temp_file.txt", "w", encoding="UTF-8") as file:
             select_0 = select(Tables.points_scans_db_table).\
                 where(and_(self.scan.id == Tables.points_scans_db_table.c.scan_id,
@@ -55,11 +89,12 @@ class PointFilterABC(ABC):
                 db_points_data = db_connection.execute(select_0).mappings()
                 for row in db_points_data:
                     file.write(f"{row['point_id']}, {scan.id}, 0\n")
-            for point in scan:
-                if self._filter_logic(point) is True:
-                    file.write(f"{point.id}, {scan.id}, 1\n")
-                else:
-                    file.write(f"{point.id}, {scan.id}, 0\n")
+            for batch in ScanCache().get_scan(scan.id).iter_batches():
+                is_active = self._filter_batch_logic(batch)
+                file.writelines(f"{point_id}, {scan.id}, {active}\n"
+                                for point_id, active in zip(batch.ids.tolist(), is_active.astype(np.int64).tolist()))
+                deactivated_ids.append(batch.ids[~is_active])
+        self.deactivated_ids = np.concatenate(deactivated_ids) if deactivated_ids else np.array([], dtype=np.int64)
 
     @staticmethod
     def __parse_temp_points_scans_file():
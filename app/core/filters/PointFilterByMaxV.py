@@ -21,3 +21,6 @@ class PointFilterMaxV(PointFilterABC):
             return True
         else:
             return False
+
+    def _filter_batch_logic(self, batch):
+        return self._get_batch_residuals(self.dem_model, batch) <= self.max_v
@@ -29,3 +29,6 @@ class PointFilterMedian(PointFilterABC):
             return True
         else:
             return False
+
+    def _filter_batch_logic(self, batch):
+        return self._get_batch_residuals(self.dem_model, batch) <= self.median * self.k_value
@@ -1,8 +1,11 @@
+import numpy as np
+
+from app.core.CONFIG import DEM_PERCENTILE
 from app.core.base.BICell import BiCell
-from app.core.base.Point import Point
-from app.core.base.Scan import Scan
 from app.core.models.DemModel import DemModel
+from app.core.models.DemPercentileModel import DemMedianModel, DemMinModel, DemPercentileModel
 from app.core.models.SegmentedModelABC import SegmentedModelABC
+from app.core.utils.ScanCache import ScanCache
 
 
 class BiModel(SegmentedModelABC):
@@ -12,14 +15,27 @@ class BiModel(SegmentedModelABC):
 
     __base_models_classes = {"BI_DEM_WITH_MSE": DemModel,
                              "BI_DEM_WITHOUT_MSE": DemModel,
+                             "BI_DEM_MIN_WITH_MSE": DemMinModel,
+                             "BI_DEM_MEDIAN_WITH_MSE": DemMedianModel,
+                             "BI_DEM_PERCENTILE_WITH_MSE": DemPercentileModel,
                              }
+    # Смещения (dy, dx) вершин left_down, left_up, right_down, right_up в растре узлов относительно индекса ячейки
+    __nodes_shifts = ((0, 0), (1, 0), (0, 1), (1, 1))
 
-    def __init__(self, voxel_model, base_model_type, enable_mse=True):
+    def __init__(self, voxel_model, base_model_type, enable_mse=True, percentile=DEM_PERCENTILE):
+        self.__base_model_class = self.__base_models_classes[f"BI_{base_model_type}_WITH_MSE"]
+        self.__base_model_args = ()
+        if self.__base_model_class is DemPercentileModel:
+            self.__base_model_args = (percentile,)
+            base_model_type = DemPercentileModel.get_model_type(percentile)
         self.model_type = f"BI_{base_model_type}_WITH_MSE"
         self.model_name = f"{self.model_type}_from_{voxel_model.vm_name}"
         self.mse_data = None
         self.__enable_mse = enable_mse
         self.cell_type = BiCell
+        self.base_model = None
+        self.__node_z = None
+        self.__node_mse = None
         super().__init__(voxel_model, self.cell_type)
 
     def _calk_segment_model(self):
@@ -28,154 +44,308 @@ class BiModel(SegmentedModelABC):
         :return: None
         """
         self.logger.info(f"Начат расчет модели {self.model_name}")
-        base_scan = Scan.get_scan_from_id(self.voxel_model.base_scan_id)
         self.__calk_cells_z()
-        self._calk_cell_mse(base_scan)
+        self._calk_cell_mse(ScanCache().get_scan(self.voxel_model.base_scan_id))
 
     def __calk_cells_z(self):
         """
         Расчитывает средние отметки и СКП в узлах модели
+        Растры узлов формы (Z_count, Y_count + 1, X_count + 1) рассчитываются один раз для всех ячеек
+        по растрам средних высот и СКП ячеек базовой модели, дополненным пустыми ячейками по краям
         :return: None
         """
-        for cell in self:
-            n_s = self.__get_cell_neighbour_structure(cell)
-            cell.left_down["Z"], cell.left_down["MSE"] = self.__calk_mean_z([[n_s[0][0], n_s[0][1]],
-                                                                             [n_s[1][0], n_s[1][1]]])
-            cell.left_up["Z"], cell.left_up["MSE"] = self.__calk_mean_z([[n_s[0][1], n_s[0][2]],
-                                                                         [n_s[1][1], n_s[1][2]]])
-            cell.right_down["Z"], cell.right_down["MSE"] = self.__calk_mean_z([[n_s[1][0], n_s[1][1]],
-                                                                               [n_s[2][0], n_s[2][1]]])
-            cell.right_up["Z"], cell.right_up["MSE"] = self.__calk_mean_z([[n_s[1][1], n_s[1][2]],
-                                                                           [n_s[2][1], n_s[2][2]]])
-        self.logger.info(f"Расчет средних высот модели {self.model_name} завершен")
-
-    def __get_cell_neighbour_structure(self, cell):
-        """
-        Создает структуру соседних ячеек относительно ячейки cell
-        :param cell: чентральная ячейка относительно которой ищутся соседи
-        :return: 3х3 масив с ячейками относительно ячейки cell
-        """
-        step = cell.voxel.step
-        x0, y0 = cell.voxel.X + step / 2, cell.voxel.Y + step / 2
-        neighbour_structure = [[(-step, -step), (-step, 0), (-step, step)],
-                               [(0, -step), (0, 0), (0, step)],
-                               [(step, -step), (step, 0), (step, step)]]
-        for x in range(3):
-            for y in range(3):
-                dx, dy = neighbour_structure[x][y]
-                point = Point(X=x0 + dx, Y=y0 + dy, Z=0, R=0, G=0, B=0)
-                try:
-                    cell = self.get_model_element_for_point(point)
-                    neighbour_structure[x][y] = cell
-                except KeyError:
-                    neighbour_structure[x][y] = None
-        return neighbour_structure
-
-    def __calk_mean_z(self, n_s):
-        """
-        Определяет логику расчета средней отметки в вершине ячейки относительно того
-        нужно ли учитывать СКП  поверхности в ячейках
-        :param n_s: 2х2 масив ячеек для общей точки которых выполняется расчет
-        :return: средняя высота и СКП точки
-        """
-        z, mse = self.__prepare_data_to_calk_mean_z(n_s)
+        exists = self._grid_index >= 0
+        avr_z = self.base_model._get_cell_attribute_grid("avr_z")
+        mse = self.base_model._get_cell_attribute_grid("mse")
         if self.__enable_mse:
-            avr_z, mse = self.__calculate_weighted_average(z, mse)
+            node_z, node_mse = self.__calculate_weighted_average(*self.__get_node_neighbours(avr_z, mse, exists))
         else:
-            avr_z, mse = self.__calculate_average(z)
-        return avr_z, mse
+            node_z, node_mse = self.__calculate_average(*self.__get_node_neighbours(avr_z, mse, exists))
+        self.__set_cells_nodes(node_z, node_mse)
+        self.__node_z, self.__node_mse = node_z, node_mse
+        self.logger.info(f"Расчет средних высот модели {self.model_name} завершен")
 
     @staticmethod
-    def __prepare_data_to_calk_mean_z(n_s):
-        """
-        Возвращает данные для расчет высот и СКП
-        :param n_s: 2х2 масив ячеек для общей точки которых выполняется расчет
-        :return: списки высот и СКП общей точки
-        """
-        z, mse = [], []
-        if n_s[0][0] is not None:
-            z.append(n_s[0][0].cell.get_z_from_xy(n_s[0][0].voxel.X + n_s[0][0].voxel.step,
-                                                  n_s[0][0].voxel.Y + n_s[0][0].voxel.step))
-            mse.append(n_s[0][0].cell.get_mse_z_from_xy(n_s[0][0].voxel.X + n_s[0][0].voxel.step,
-                                                        n_s[0][0].voxel.Y + n_s[0][0].voxel.step))
-        if n_s[0][1] is not None:
-            z.append(n_s[0][1].cell.get_z_from_xy(n_s[0][1].voxel.X + n_s[0][1].voxel.step,
-                                                  n_s[0][1].voxel.Y))
-            mse.append(n_s[0][1].cell.get_mse_z_from_xy(n_s[0][1].voxel.X + n_s[0][1].voxel.step,
-                                                        n_s[0][1].voxel.Y))
-        if n_s[1][0] is not None:
-            z.append(n_s[1][0].cell.get_z_from_xy(n_s[1][0].voxel.X,
-                                                  n_s[1][0].voxel.Y + n_s[1][0].voxel.step))
-            mse.append(n_s[1][0].cell.get_mse_z_from_xy(n_s[1][0].voxel.X,
-                                                        n_s[1][0].voxel.Y + n_s[1][0].voxel.step))
-        if n_s[1][1] is not None:
-            z.append(n_s[1][1].cell.get_z_from_xy(n_s[1][1].voxel.X,
-                                                  n_s[1][1].voxel.Y))
-            mse.append(n_s[1][1].cell.get_mse_z_from_xy(n_s[1][1].voxel.X,
-                                                        n_s[1][1].voxel.Y))
-        return z, mse
+    def __get_node_neighbours(avr_z, mse, exists):
+        """
+        Возвращает растры ячеек, смежных с узлами модели, сдвигами дополненных растров ячеек
+        Порядок смежных ячеек относительно узла (dx, dy): (-1, -1), (-1, 0), (0, -1), (0, 0)
+        :param avr_z: растр средних высот ячеек формы (Z_count, Y_count, X_count), NaN - нет значения
+        :param mse: растр СКП ячеек той же формы, NaN - нет значения
+        :param exists: булев растр наличия ячеек модели той же формы
+        :return: списки растров высот, СКП и наличия смежных ячеек формы (Z_count, Y_count + 1, X_count + 1)
+        """
+        pad = ((0, 0), (1, 1), (1, 1))
+        avr_z = np.pad(avr_z, pad, constant_values=np.nan)
+        mse = np.pad(mse, pad, constant_values=np.nan)
+        exists = np.pad(exists, pad, constant_values=False)
+        y_count, x_count = avr_z.shape[1] - 1, avr_z.shape[2] - 1
+        shifts = [(0, 0), (1, 0), (0, 1), (1, 1)]
+        return ([grid[:, dy:dy + y_count, dx:dx + x_count] for dy, dx in shifts] for grid in (avr_z, mse, exists))
 
     @staticmethod
-    def __calculate_weighted_average(z, mse):
-        """
-        Расчитывает среднюю отметку и СКП учитывая СКП в поверхностях ячеек
-        :param z: список высот
-        :param mse: список СКП
-        :return: средняя высота и ее СКП
-        """
-        sum_p = 0
-        sum_of_pz = None
-        for idx, mse in enumerate(mse):
-            try:
-                p = 1 / (mse ** 2)
-            except TypeError:
-                continue
-            except ZeroDivisionError:
-                return z[idx], 0
-            try:
-                sum_of_pz += p * z[idx]
-            except TypeError:
-                sum_of_pz = p * z[idx]
-            sum_p += p
-        try:
-            avr_z = sum_of_pz / sum_p
-            mse = 1 / (sum_p ** 0.5)
-        except TypeError:
-            avr_z = None
-            mse = None
-        return avr_z, mse
+    def __calculate_weighted_average(z, mse, exists):
+        """
+        Расчитывает средние отметки и СКП узлов учитывая СКП в поверхностях смежных ячеек
+        Вес отметки p = 1 / mse^2, отметки без СКП не учитываются, СКП узла = 1 / sqrt(sum(p))
+        Если у смежной ячейки СКП равна 0 - узлу присваивается ее отметка (первой в порядке смежных ячеек) и СКП 0
+        :param z: список растров высот смежных ячеек
+        :param mse: список растров СКП смежных ячеек
+        :param exists: список растров наличия смежных ячеек
+        :return: растры средних высот и СКП узлов, NaN - нет значения
+        """
+        shape = z[0].shape
+        sum_p, sum_of_pz = np.zeros(shape), np.zeros(shape)
+        has_p = np.zeros(shape, dtype=np.bool_)
+        zero_mse, zero_mse_z = np.zeros(shape, dtype=np.bool_), np.full(shape, np.nan)
+        for cell_z, cell_mse, cell_exists in zip(z, mse, exists):
+            valid = cell_exists & ~np.isnan(cell_mse)
+            mse2 = np.where(valid, cell_mse, 1.0) ** 2
+            first_zero = valid & (mse2 == 0) & ~zero_mse
+            zero_mse_z[first_zero] = cell_z[first_zero]
+            zero_mse |= first_zero
+            weighted = valid & (mse2 != 0)
+            p = 1 / np.where(weighted, mse2, 1.0)
+            sum_of_pz = np.where(weighted, sum_of_pz + p * cell_z, sum_of_pz)
+            sum_p = np.where(weighted, sum_p + p, sum_p)
+            has_p |= weighted
+        node_z = np.where(has_p, sum_of_pz / np.where(has_p, sum_p, 1.0), np.nan)
+        node_mse = np.where(has_p, 1 / np.sqrt(np.where(has_p, sum_p, 1.0)), np.nan)
+        node_z[zero_mse], node_mse[zero_mse] = zero_mse_z[zero_mse], 0.0
+        return node_z, node_mse
 
     @staticmethod
-    def __calculate_average(z):
+    def __calculate_average(z, mse, exists):
+        """
+        Расчитывает средние отметки узлов НЕ учитывая СКП поверхностях смежных ячеек
+        Если у какой-либо смежной ячейки нет отметки - отметка узла не определена
+        :param z: список растров высот смежных ячеек
+        :param mse: список растров СКП смежных ячеек (не используется)
+        :param exists: список растров наличия смежных ячеек
+        :return: растры средних высот и СКП узлов (СКП не определена - NaN)
+        """
+        shape = z[0].shape
+        sum_z, count = np.zeros(shape), np.zeros(shape, dtype=np.int64)
+        undefined = np.zeros(shape, dtype=np.bool_)
+        for cell_z, cell_exists in zip(z, exists):
+            undefined |= cell_exists & np.isnan(cell_z)
+            sum_z = np.where(cell_exists, sum_z + np.nan_to_num(cell_z), sum_z)
+            count += cell_exists
+        defined = ~undefined & (count > 0)
+        node_z = np.where(defined, sum_z / np.maximum(count, 1), np.nan)
+        return node_z, np.full(shape, np.nan)
+
+    def _sample_cells(self, cell_idx, x, y):
+        """
+        Рассчитывает отметки поверхности модели в точках билинейной интерполяцией по растру высот узлов
+        Формула совпадает с BiCell.get_z_from_xy, отметка не определена, если не определена высота
+        хотя бы одной вершины ячейки. СКП отметок билинейной модели не рассчитывается
+        :param cell_idx: массив позиций ячеек точек, -1 для точек вне ячеек модели
+        :param x: массив координат X точек
+        :param y: массив координат Y точек
+        :return: массивы отметок и СКП (NaN), NaN - значение не определено
+        """
+        node_z, _ = self.__get_nodes()
+        vm = self.voxel_model
+        inside = cell_idx >= 0
+        z, y_idx, x_idx = (grid_idx[cell_idx[inside]] for grid_idx in self._cells_grid_idx)
+        cell_z = np.full(len(cell_idx), np.nan, dtype=np.float64)
+        cell_z[inside] = self.__interpolate(node_z, z, y_idx, x_idx, x[inside], y[inside],
+                                            vm.min_X + x_idx * vm.step, vm.min_Y + y_idx * vm.step, vm.step)
+        return cell_z, np.full(len(cell_idx), np.nan, dtype=np.float64)
+
+    @staticmethod
+    def __interpolate(node_z, z, y_idx, x_idx, x, y, x1, y1, step):
+        """
+        Рассчитывает отметки точек билинейной интерполяцией по высотам вершин их ячеек
+        Формула совпадает с BiCell.get_z_from_xy
+        :param node_z: растр высот узлов
+        :param z: массив индексов ячеек точек в растре узлов по оси Z
+        :param y_idx: массив индексов левых нижних вершин ячеек точек в растре узлов по оси Y
+        :param x_idx: массив индексов левых нижних вершин ячеек точек в растре узлов по оси X
+        :param x: массив координат X точек
+        :param y: массив координат Y точек
+        :param x1: массив координат X левых нижних вершин ячеек
+        :param y1: массив координат Y левых нижних вершин ячеек
+        :param step: размер ячейки
+        :return: массив отметок, NaN - не определена высота хотя бы одной вершины ячейки
+        """
+        x2, y2 = x1 + step, y1 + step
+        z_ld, z_lu, z_rd, z_ru = (node_z[z, y_idx + dy, x_idx + dx] for dy, dx in BiModel.__nodes_shifts)
+        r1 = ((x2 - x) / (x2 - x1)) * z_ld + ((x - x1) / (x2 - x1)) * z_rd
+        r2 = ((x2 - x) / (x2 - x1)) * z_lu + ((x - x1) / (x2 - x1)) * z_ru
+        return ((y2 - y) / (y2 - y1)) * r1 + ((y - y1) / (y2 - y1)) * r2
+
+    def __get_nodes(self):
+        """
+        Возвращает растры высот и СКП узлов модели, при отсутствии - собирает их по вершинам ячеек
+        :return: растры высот и СКП узлов формы (Z_count, Y_count + 1, X_count + 1), NaN - нет значения
+        """
+        if self.__node_z is None:
+            self.__node_z, self.__node_mse = self.__collect_nodes()
+        return self.__node_z, self.__node_mse
+
+    def _reset_cell_values(self):
+        """
+        Сбрасывает собранные массивы значений ячеек и растры узлов после изменения данных ячеек
+        :return: None
+        """
+        super()._reset_cell_values()
+        self.__node_z, self.__node_mse = None, None
+
+    def _update_cells_from_removed_points(self, points):
+        """
+        Обновляет базовую модель и пересчитывает только узлы, смежные с изменившимися ячейками базовой модели,
+        затем вершины, избыточность и СКП ячеек, у которых изменился хотя бы один узел
+        :param points: пакет деактивированных точек PointBatch
+        :return: массив позиций изменившихся ячеек
+        """
+        base_changed = self.base_model.update_from_removed_points(points)
+        if len(base_changed) == 0:
+            return base_changed
+        node_z, node_mse = self.__get_nodes()
+        z, y, x = (grid_idx[base_changed] for grid_idx in self.base_model._cells_grid_idx)
+        cells_len = self.base_model.cell_statistics.count[base_changed]
+        for idx, cell_len in zip(self._grid_index[z, y, x].tolist(), cells_len.tolist()):
+            self._cells[idx].r = cell_len - 4
+        nodes = np.unique(np.concatenate([np.ravel_multi_index((z, y + dy, x + dx), node_z.shape)
+                                          for dy, dx in self.__nodes_shifts]))
+        nodes = np.unravel_index(nodes, node_z.shape)
+        neighbours = self.__get_nodes_neighbours(nodes)
+        if self.__enable_mse:
+            node_z[nodes], node_mse[nodes] = self.__calculate_weighted_average(*neighbours)
+        else:
+            node_z[nodes], node_mse[nodes] = self.__calculate_average(*neighbours)
+        cell_idx = self.__get_nodes_cells(nodes)
+        self.__set_cells_nodes(node_z, node_mse, cell_idx)
+        self._calk_cell_mse(ScanCache().get_scan(self.voxel_model.base_scan_id), cell_idx)
+        return cell_idx
+
+    def __get_nodes_neighbours(self, nodes):
+        """
+        Возвращает данные ячеек базовой модели, смежных с заданными узлами
+        Порядок смежных ячеек совпадает с __get_node_neighbours
+        :param nodes: индексы узлов (z, y, x) в растре узлов
+        :return: списки массивов высот, СКП и наличия смежных ячеек
+        """
+        z, y, x = nodes
+        vm = self.voxel_model
+        z_list, mse_list, exists_list = [], [], []
+        for dy, dx in self.__nodes_shifts:
+            cell_y, cell_x = y - 1 + dy, x - 1 + dx
+            inside = (cell_y >= 0) & (cell_y < vm.Y_count) & (cell_x >= 0) & (cell_x < vm.X_count)
+            cell_idx = np.full(len(z), -1, dtype=np.int64)
+            cell_idx[inside] = self.base_model._grid_index[z[inside], cell_y[inside], cell_x[inside]]
+            z_list.append(self.base_model.get_cell_values("avr_z", cell_idx))
+            mse_list.append(self.base_model.get_cell_values("mse", cell_idx))
+            exists_list.append(cell_idx >= 0)
+        return z_list, mse_list, exists_list
+
+    def __get_nodes_cells(self, nodes):
+        """
+        Возвращает позиции ячеек модели, у которых хотя бы одна вершина входит в заданные узлы
+        :param nodes: индексы узлов (z, y, x) в растре узлов
+        :return: массив позиций ячеек
         """
-        Расчитывает среднюю отметку и СКП НЕ учитывая СКП поверхностях ячеек
-        :param z: список высот
-        :return: средняя высота, СКП = None
+        z, y, x = nodes
+        vm = self.voxel_model
+        cells = []
+        for dy, dx in self.__nodes_shifts:
+            cell_y, cell_x = y - dy, x - dx
+            inside = (cell_y >= 0) & (cell_y < vm.Y_count) & (cell_x >= 0) & (cell_x < vm.X_count)
+            cells.append(self._grid_index[z[inside], cell_y[inside], cell_x[inside]])
+        cell_idx = np.unique(np.concatenate(cells))
+        return cell_idx[cell_idx >= 0]
+
+    def get_memory_size(self):
+        """
+        Оценивает объем оперативной памяти, занимаемой моделью вместе с базовой моделью
+        :return: объем в байтах
         """
-        z = [el for el in z if z is not None]
-        try:
-            avr_z, mse = sum(z) / len(z), None
-        except TypeError:
-            avr_z, mse = None, None
-        return avr_z, mse
+        nodes_size = 0 if self.__node_z is None else self.__node_z.nbytes + self.__node_mse.nbytes
+        return super().get_memory_size() + self.base_model.get_memory_size() + nodes_size
 
     def _create_model_structure(self, element_class):
         """
         Создает структуру модели, учитывая тип базовой сегментированой модели
-        :param element_class: Тип элемента базовой модели (ывбирается из словаря self.__base_models_classes)
+        Класс базовой модели выбирается из словаря self.__base_models_classes, для базовой модели "DEM_PERCENTILE"
+        ей передается процентиль percentile
+        :param element_class: Тип элемента модели
         :return: None
         """
-        base_segment_model = self.__base_models_classes[self.model_type](self.voxel_model)
-        for cell in base_segment_model:
-            try:
-                voxel = cell.voxel
-            except AttributeError:
-                continue
-            model_key = f"{voxel.X:.5f}_{voxel.Y:.5f}_{voxel.Z:.5f}"
-            self._model_structure[model_key] = element_class(cell, self)
+        self.base_model = self.__base_model_class(self.voxel_model, *self.__base_model_args)
+        self._voxel_arrays = self.base_model._voxel_arrays
+        self._cells = element_class.create_cells(self.base_model, self)
+
+    def _get_rasters(self):
+        """
+        Собирает данные модели в растры высот и СКП узлов, а также СКП и избыточности ячеек
+        Растры узлов имеют форму (Z_count, Y_count + 1, X_count + 1), растры ячеек - (Z_count, Y_count, X_count)
+        :return: словарь {"Z": ..., "MSE_node": ..., "MSE": ..., "r": ...}
+        """
+        node_z, node_mse = self.__get_nodes()
+        return {"Z": node_z.copy(), "MSE_node": node_mse.copy(),
+                "MSE": self._get_cell_attribute_grid("mse"),
+                "r": self._get_cell_attribute_grid("r", 0, np.int64)}
+
+    def __collect_nodes(self):
+        """
+        Собирает высоты и СКП вершин ячеек модели в растры узлов
+        :return: растры высот и СКП узлов формы (Z_count, Y_count + 1, X_count + 1), NaN - нет значения
+        """
+        z_count, y_count, x_count = self.voxel_model.Z_count, self.voxel_model.Y_count, self.voxel_model.X_count
+        node_z = np.full((z_count, y_count + 1, x_count + 1), np.nan, dtype=np.float64)
+        node_mse = np.full((z_count, y_count + 1, x_count + 1), np.nan, dtype=np.float64)
+        for cell, z, y, x in zip(self, *[grid_idx.tolist() for grid_idx in self._cells_grid_idx]):
+            for node, (dy, dx) in self.__get_cell_nodes(cell):
+                node_z[z, y + dy, x + dx] = np.nan if node["Z"] is None else node["Z"]
+                node_mse[z, y + dy, x + dx] = np.nan if node["MSE"] is None else node["MSE"]
+        return node_z, node_mse
+
+    def _set_rasters(self, rasters):
+        """
+        Копирует данные из растров узлов и ячеек в ячейки модели
+        :param rasters: словарь {"Z": ..., "MSE_node": ..., "MSE": ..., "r": ...}
+        :return: None
+        """
+        self.__set_cells_nodes(rasters["Z"], rasters["MSE_node"])
+        mse = rasters["MSE"][self._cells_grid_idx].tolist()
+        r = rasters["r"][self._cells_grid_idx].tolist()
+        for cell, cell_mse, cell_r in zip(self, mse, r):
+            cell.mse = None if np.isnan(cell_mse) else cell_mse
+            cell.r = cell_r
+
+    def __set_cells_nodes(self, node_z, node_mse, cell_idx=None):
+        """
+        Копирует высоты и СКП узлов из растров узлов в вершины ячеек модели
+        :param node_z: растр высот узлов формы (Z_count, Y_count + 1, X_count + 1), NaN - нет значения
+        :param node_mse: растр СКП узлов той же формы, NaN - нет значения
+        :param cell_idx: массив позиций обновляемых ячеек, None - обновляются все ячейки
+        :return: None
+        """
+        if cell_idx is None:
+            cell_idx = np.arange(len(self), dtype=np.int64)
+        z, y, x = (grid_idx[cell_idx] for grid_idx in self._cells_grid_idx)
+        nodes_values = []
+        for dy, dx in self.__nodes_shifts:
+            nodes_values.append((np.where(np.isnan(node_z[z, y + dy, x + dx]), None,
+                                          node_z[z, y + dy, x + dx]).tolist(),
+                                 np.where(np.isnan(node_mse[z, y + dy, x + dx]), None,
+                                          node_mse[z, y + dy, x + dx]).tolist()))
+        for cell_pos, idx in enumerate(cell_idx.tolist()):
+            for (node, _), (nodes_z, nodes_mse) in zip(self.__get_cell_nodes(self._cells[idx]), nodes_values):
+                node["Z"], node["MSE"] = nodes_z[cell_pos], nodes_mse[cell_pos]
+
+    @staticmethod
+    def __get_cell_nodes(cell):
+        """
+        Возвращает вершины ячейки вместе с их смещением в растре узлов относительно индекса ячейки
+        :param cell: ячейка билинейной модели
+        :return: список пар (вершина, (dy, dx))
+        """
+        return list(zip((cell.left_down, cell.left_up, cell.right_down, cell.right_up), BiModel.__nodes_shifts))
 
     def delete_model(self, db_connection=None):
         super().delete_model(db_connection)
-        base_segment_model = self.__base_models_classes[self.model_type](self.voxel_model)
-        base_segment_model.delete_model(db_connection)
+        self.base_model.delete_model(db_connection)
         self.logger.info(f"Удаление модели {self.model_name} из БД завершено\n")
@@ -1,6 +1,9 @@
+import numpy as np
+
 from app.core.base.DemCell import DemCell
-from app.core.base.Scan import Scan
 from app.core.models.SegmentedModelABC import SegmentedModelABC
+from app.core.utils.CellStatistics import CellStatistics
+from app.core.utils.ScanCache import ScanCache
 
 
 class DemModel(SegmentedModelABC):
@@ -8,37 +11,140 @@ class DemModel(SegmentedModelABC):
     Стандартная DEM модель связанная с базой данных
     """
 
-    def __init__(self, voxel_model):
-        self.model_type = "DEM"
+    def __init__(self, voxel_model, model_type="DEM"):
+        self.model_type = model_type
         self.model_name = f"{self.model_type}_from_{voxel_model.vm_name}"
         self.mse_data = None
         self.cell_type = DemCell
+        self.cell_statistics = None
         super().__init__(voxel_model, self.cell_type)
 
     def _calk_segment_model(self):
         """
-        Метод определяющий логику создания стандартной DEM модели
+        Метод определяющий логику создания DEM модели
         :return: None
         """
         self.logger.info(f"Начат расчет модели {self.model_name}")
-        base_scan = Scan.get_scan_from_id(self.voxel_model.base_scan_id)
-        self.__calk_average_z(base_scan)
-        self._calk_cell_mse(base_scan)
+        self.cell_statistics = self._create_cell_statistics()
+        self._calk_cells_statistics(ScanCache().get_scan(self.voxel_model.base_scan_id))
+        self._set_cells_z_and_mse()
+        self.logger.info(f"Расчет высот и СКП высот в ячейках модели {self.model_name} завершен")
+
+    def _create_cell_statistics(self):
+        """
+        Создает пустые статистики ячеек модели (для стандартной DEM модели - средние высоты, CellStatistics)
+        :return: объект статистик ячеек с массивами count, value и m2
+        """
+        return CellStatistics(len(self))
 
-    def __calk_average_z(self, base_scan):
+    def _calk_cells_statistics(self, base_scan):
         """
-        Расчет средней высотной отметки между точками в ячейке
+        Накопление статистик высот точек в ячейках модели за один проход по скану
+        Количество точек, средние высоты и суммы квадратов отклонений высот в ячейках накапливаются
+        по пакетам точек численно устойчивым способом в объекте CellStatistics
         :param base_scan: базовый скан воксельной модели
         :return: None
         """
-        for point in base_scan:
-            dem_cell = self.get_model_element_for_point(point)
-            if dem_cell is None:
-                continue
-            try:
-                dem_cell.avr_z = (dem_cell.avr_z * dem_cell.len + point.Z) / (dem_cell.len + 1)
-                dem_cell.len += 1
-            except AttributeError:
-                dem_cell.avr_z = point.Z
-                dem_cell.len = 1
-        self.logger.info(f"Расчет средних высот модели {self.model_name} завершен")
+        for batch, cell_idx in self._iter_cells_batches(base_scan):
+            self.cell_statistics.add_values(cell_idx, batch.Z)
+
+    def _set_cells_z_and_mse(self, cell_idx=None):
+        """
+        Копирует высоты и СКП высот из статистик ячеек в ячейки модели
+        СКП = sqrt(M2 / r), где r - избыточность ячейки, M2 - сумма квадратов отклонений высот точек от высоты ячейки
+        :param cell_idx: массив позиций обновляемых ячеек, None - обновляются все ячейки
+        :return: None
+        """
+        if cell_idx is None:
+            cell_idx = np.arange(len(self), dtype=np.int64)
+        counts = self.cell_statistics.count[cell_idx]
+        r = np.array([self._cells[idx].r for idx in cell_idx.tolist()], dtype=np.int64)
+        with_mse = (counts > 0) & (r > 0)
+        mse = np.full(len(cell_idx), np.nan, dtype=np.float64)
+        mse[with_mse] = np.sqrt(self.cell_statistics.m2[cell_idx][with_mse] / r[with_mse])
+        for idx, cell_len, cell_avr_z, cell_mse in zip(cell_idx.tolist(), counts.tolist(),
+                                                       self.cell_statistics.value[cell_idx].tolist(), mse.tolist()):
+            cell = self._cells[idx]
+            cell.len = cell_len
+            cell.avr_z = cell_avr_z if cell_len > 0 else None
+            cell.mse = None if np.isnan(cell_mse) else cell_mse
+        self._update_cell_values(cell_idx)
+
+    def _update_cells_from_removed_points(self, points):
+        """
+        Исключает деактивированные точки из статистик ячеек и пересчитывает только затронутые ячейки
+        Избыточность затронутых ячеек r = n - 1 пересчитывается по оставшемуся количеству точек
+        :param points: пакет деактивированных точек PointBatch
+        :return: массив позиций изменившихся ячеек
+        """
+        if self.cell_statistics is None:
+            self.__restore_cell_statistics()
+        cell_idx = self.get_cell_indices(points.X, points.Y, points.Z)
+        inside = cell_idx >= 0
+        changed = np.unique(cell_idx[inside])
+        self._remove_points_from_cell_statistics(cell_idx[inside], points.Z[inside], changed)
+        for idx, cell_len in zip(changed.tolist(), self.cell_statistics.count[changed].tolist()):
+            cell = self._cells[idx]
+            cell.voxel.len = cell_len
+            cell.r = cell_len - 1
+        self._set_cells_z_and_mse(changed)
+        return changed
+
+    def _remove_points_from_cell_statistics(self, cell_idx, z, changed):
+        """
+        Исключает высоты деактивированных точек из статистик ячеек
+        :param cell_idx: массив позиций ячеек деактивированных точек
+        :param z: массив высот деактивированных точек
+        :param changed: массив позиций затронутых ячеек без повторов
+        :return: None
+        """
+        self.cell_statistics.remove_values(cell_idx, z)
+
+    def __restore_cell_statistics(self):
+        """
+        Восстанавливает статистики ячеек модели, загруженной из БД, по высотам, СКП и избыточности ячеек
+        n = r + 1, M2 = mse^2 * r
+        :return: None
+        """
+        avr_z = self.get_cell_values("avr_z")
+        mse = self.get_cell_values("mse")
+        r = self.get_cell_values("r")
+        not_empty = ~np.isnan(avr_z)
+        self.cell_statistics = self._create_cell_statistics()
+        self.cell_statistics.count[not_empty] = r[not_empty].astype(np.int64) + 1
+        self.cell_statistics.value[not_empty] = avr_z[not_empty]
+        with_mse = not_empty & ~np.isnan(mse)
+        self.cell_statistics.m2[with_mse] = mse[with_mse] ** 2 * r[with_mse]
+
+    def _sample_cells(self, cell_idx, x, y):
+        """
+        Возвращает средние высоты и СКП ячеек, содержащих точки
+        :param cell_idx: массив позиций ячеек точек, -1 для точек вне ячеек модели
+        :param x: массив координат X точек (не используется)
+        :param y: массив координат Y точек (не используется)
+        :return: массивы отметок и СКП, NaN - значение не определено
+        """
+        return self.get_cell_values("avr_z", cell_idx), self.get_cell_values("mse", cell_idx)
+
+    def _get_rasters(self):
+        """
+        Собирает данные ячеек модели в растры средних высот, СКП и избыточности
+        :return: словарь {"Avr_Z": ..., "MSE": ..., "r": ...} с массивами формы (Z_count, Y_count, X_count)
+        """
+        return {"Avr_Z": self._get_cell_attribute_grid("avr_z"),
+                "MSE": self._get_cell_attribute_grid("mse"),
+                "r": self._get_cell_attribute_grid("r", 0, np.int64)}
+
+    def _set_rasters(self, rasters):
+        """
+        Копирует данные из растров средних высот, СКП и избыточности в ячейки модели
+        :param rasters: словарь {"Avr_Z": ..., "MSE": ..., "r": ...}
+        :return: None
+        """
+        avr_z = rasters["Avr_Z"][self._cells_grid_idx].tolist()
+        mse = rasters["MSE"][self._cells_grid_idx].tolist()
+        r = rasters["r"][self._cells_grid_idx].tolist()
+        for cell, cell_avr_z, cell_mse, cell_r in zip(self, avr_z, mse, r):
+            cell.avr_z = None if np.isnan(cell_avr_z) else cell_avr_z
+            cell.mse = None if np.isnan(cell_mse) else cell_mse
+            cell.r = cell_r
@@ -0,0 +1,73 @@
+from app.core.CONFIG import DEM_PERCENTILE
+from app.core.models.DemModel import DemModel
+from app.core.utils.CellOrderStatistics import CellOrderStatistics
+from app.core.utils.ScanCache import ScanCache
+
+
+class DemPercentileModel(DemModel):
+    """
+    DEM модель, высота ячейки которой - процентиль высот точек ячейки
+    В отличие от средней высоты низкий процентиль слабо смещается точками растительности над рельефом
+    СКП ячейки рассчитывается по отклонениям высот точек ячейки от процентиля
+    """
+
+    def __init__(self, voxel_model, percentile=DEM_PERCENTILE):
+        self.percentile = percentile
+        super().__init__(voxel_model, self.get_model_type(percentile))
+
+    @staticmethod
+    def get_model_type(percentile):
+        """
+        Возвращает тип модели по процентилю: DEM_MIN, DEM_MEDIAN или DEM_P<процентиль>
+        :param percentile: процентиль высот точек ячейки
+        :return: строка типа модели
+        """
+        return {0: "DEM_MIN", 50: "DEM_MEDIAN"}.get(percentile, f"DEM_P{percentile:g}")
+
+    def _create_cell_statistics(self):
+        """
+        Создает пустые порядковые статистики ячеек модели
+        :return: объект CellOrderStatistics
+        """
+        return CellOrderStatistics(len(self), self.percentile)
+
+    def _calk_cells_statistics(self, base_scan, selected=None):
+        """
+        Накопление высот точек по ячейкам и расчет статистик ячеек одной сортировкой
+        :param base_scan: базовый скан воксельной модели
+        :param selected: массив позиций пересчитываемых ячеек, None - пересчитываются все ячейки
+        :return: None
+        """
+        for batch, cell_idx in self._iter_cells_batches(base_scan, selected):
+            self.cell_statistics.add_values(cell_idx, batch.Z)
+        self.cell_statistics.calk_statistics(selected)
+
+    def _remove_points_from_cell_statistics(self, cell_idx, z, changed):
+        """
+        Пересчитывает статистики ячеек, затронутых деактивированными точками, по оставшимся точкам скана
+        Процентиль нельзя исключить из статистики, поэтому высоты точек затронутых ячеек собираются заново
+        :param cell_idx: массив позиций ячеек деактивированных точек
+        :param z: массив высот деактивированных точек
+        :param changed: массив позиций затронутых ячеек без повторов
+        :return: None
+        """
+        if len(changed) > 0:
+            self._calk_cells_statistics(ScanCache().get_scan(self.voxel_model.base_scan_id), changed)
+
+
+class DemMinModel(DemPercentileModel):
+    """
+    DEM модель, высота ячейки которой - минимальная высота точек ячейки
+    """
+
+    def __init__(self, voxel_model):
+        super().__init__(voxel_model, 0)
+
+
+class DemMedianModel(DemPercentileModel):
+    """
+    DEM модель, высота ячейки которой - медиана высот точек ячейки
+    """
+
+    def __init__(self, voxel_model):
+        super().__init__(voxel_model, 50)
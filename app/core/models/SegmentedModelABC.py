@@ -1,10 +1,13 @@
 import logging
 from abc import ABC, abstractmethod
 
-from sqlalchemy import select, desc, update, insert, and_, delete
+import numpy as np
+from sqlalchemy import select, desc, update, insert, and_, delete, bindparam
 
-from app.core.CONFIG import LOGGER
+from app.core.CONFIG import LOGGER, SEGMENTED_MODEL_STORAGE
 from app.core.db.start_db import Tables, engine
+from app.core.utils.Model_rasters import save_model_rasters, load_model_rasters, delete_model_rasters, \
+    update_model_rasters
 
 
 class SegmentedModelABC(ABC):
@@ -18,12 +21,20 @@ class SegmentedModelABC(ABC):
     def __init__(self, voxel_model, element_class):
         self.base_voxel_model_id = voxel_model.id
         self.voxel_model = voxel_model
-        self._model_structure = {}
+        self._cells = []
+        self._voxel_arrays = None
+        self._cells_grid_idx = None
+        self._grid_index = None
+        self._cells_values = {}
         self._create_model_structure(element_class)
+        self._create_grid_index()
         self.__init_model()
 
     def __iter__(self):
-        return iter(self._model_structure.values())
+        return iter(self._cells)
+
+    def __len__(self):
+        return len(self._cells)
 
     def __str__(self):
         return f"{self.__class__.__name__} [ID: {self.id},\tmodel_name: {self.model_name}]"
@@ -39,15 +50,56 @@ class SegmentedModelABC(ABC):
         """
         pass
 
+    @abstractmethod
+    def _get_rasters(self):
+        """
+        Собирает данные ячеек модели в растры
+        :return: словарь {имя растра: массив numpy формы (Z_count, Y_count, X_count) или больше}
+        """
+        pass
+
+    @abstractmethod
+    def _set_rasters(self, rasters):
+        """
+        Копирует данные из растров в атрибуты ячеек модели
+        :param rasters: словарь {имя растра: массив numpy}
+        :return: None
+        """
+        pass
+
+    @abstractmethod
+    def _sample_cells(self, cell_idx, x, y):
+        """
+        Рассчитывает отметки поверхности модели и их СКП в точках с известными позициями ячеек
+        :param cell_idx: массив позиций ячеек точек, -1 для точек вне ячеек модели
+        :param x: массив координат X точек
+        :param y: массив координат Y точек
+        :return: массивы отметок и СКП, NaN - значение не определено
+        """
+        pass
+
     def _create_model_structure(self, element_class):
         """
         Создание структуры сегментированной модели
+        Воксели модели загружаются из БД одним запросом в виде массивов, ячейки создаются по столбцам массивов,
+        объекты вокселей ячеек создаются только при обращении к ним
         :param element_class: Класс ячейки конкретной модели
         :return: None
         """
-        for voxel in self.voxel_model:
-            model_key = f"{voxel.X:.5f}_{voxel.Y:.5f}_{voxel.Z:.5f}"
-            self._model_structure[model_key] = element_class(voxel, self)
+        self._voxel_arrays = self.voxel_model.load_arrays()
+        self._cells = element_class.create_cells(self._voxel_arrays, self)
+
+    def _create_grid_index(self):
+        """
+        Создает индекс ячеек модели - массив формы (Z_count, Y_count, X_count) с позициями ячеек в списке ячеек,
+        -1 для индексов сетки без ячеек
+        Индексы ячеек в сетке берутся из массивов вокселей модели, ячейки расположены в порядке вокселей в массивах
+        :return: None
+        """
+        vm = self.voxel_model
+        self._cells_grid_idx = (self._voxel_arrays.iz, self._voxel_arrays.iy, self._voxel_arrays.ix)
+        self._grid_index = np.full((vm.Z_count, vm.Y_count, vm.X_count), -1, dtype=np.int64)
+        self._grid_index[self._cells_grid_idx] = np.arange(len(self._cells), dtype=np.int64)
 
     def get_model_element_for_point(self, point):
         """
@@ -55,55 +107,221 @@ class SegmentedModelABC(ABC):
         :param point: точка для которой нужна соответствующая ячейка
         :return: объект ячейки модели, содержащая точку point
         """
-        vxl_md_X = int((point.X - self.voxel_model.min_X) // self.voxel_model.step)
-        vxl_md_Y = int((point.Y - self.voxel_model.min_Y) // self.voxel_model.step)
-        X = self.voxel_model.min_X + vxl_md_X * self.voxel_model.step
-        Y = self.voxel_model.min_Y + vxl_md_Y * self.voxel_model.step
-        if self.voxel_model.is_2d_vxl_mdl is False:
-            Z = point.Z // self.voxel_model.step * self.voxel_model.step
+        vm = self.voxel_model
+        vxl_md_X = int((point.X - vm.min_X) // vm.step)
+        vxl_md_Y = int((point.Y - vm.min_Y) // vm.step)
+        vxl_md_Z = 0 if vm.is_2d_vxl_mdl else int((point.Z - vm.min_Z) // vm.step)
+        if 0 <= vxl_md_X < vm.X_count and 0 <= vxl_md_Y < vm.Y_count and 0 <= vxl_md_Z < vm.Z_count:
+            cell_idx = self._grid_index[vxl_md_Z, vxl_md_Y, vxl_md_X]
+            if cell_idx >= 0:
+                return self._cells[cell_idx]
+        return None
+
+    def get_cell_indices(self, x, y, z=None):
+        """
+        Возвращает позиции ячеек, содержащих точки, одной операцией индексации по индексу ячеек
+        :param x: массив координат X точек
+        :param y: массив координат Y точек
+        :param z: массив координат Z точек (не используется для 2D моделей)
+        :return: массив int64 позиций ячеек в списке ячеек модели, -1 для точек вне ячеек модели
+        """
+        vm = self.voxel_model
+        vxl_md_X = np.floor_divide(np.asarray(x, dtype=np.float64) - vm.min_X, vm.step).astype(np.int64)
+        vxl_md_Y = np.floor_divide(np.asarray(y, dtype=np.float64) - vm.min_Y, vm.step).astype(np.int64)
+        if vm.is_2d_vxl_mdl or z is None:
+            vxl_md_Z = np.zeros(len(vxl_md_X), dtype=np.int64)
         else:
-            Z = self.voxel_model.min_Z
-        model_key = f"{X:.5f}_{Y:.5f}_{Z:.5f}"
-        return self._model_structure.get(model_key, None)
+            vxl_md_Z = np.floor_divide(np.asarray(z, dtype=np.float64) - vm.min_Z, vm.step).astype(np.int64)
+        inside = (vxl_md_X >= 0) & (vxl_md_X < vm.X_count) & \
+                 (vxl_md_Y >= 0) & (vxl_md_Y < vm.Y_count) & \
+                 (vxl_md_Z >= 0) & (vxl_md_Z < vm.Z_count)
+        cell_idx = np.full(len(vxl_md_X), -1, dtype=np.int64)
+        cell_idx[inside] = self._grid_index[vxl_md_Z[inside], vxl_md_Y[inside], vxl_md_X[inside]]
+        return cell_idx
+
+    def get_cell(self, cell_idx):
+        """
+        Возвращает ячейку по ее позиции в списке ячеек модели
+        :param cell_idx: позиция ячейки
+        :return: объект ячейки модели или None для отрицательной позиции
+        """
+        return self._cells[cell_idx] if cell_idx >= 0 else None
+
+    def sample(self, x, y, z=None):
+        """
+        Рассчитывает отметки поверхности модели и их СКП для массивов координат точек
+        :param x: массив координат X точек
+        :param y: массив координат Y точек
+        :param z: массив координат Z точек (используется только для поиска ячеек 3D моделей)
+        :return: массивы float64 отметок и СКП, NaN для точек вне ячеек модели и неопределенных значений
+        """
+        x, y = np.asarray(x, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        return self._sample_cells(self.get_cell_indices(x, y, z), x, y)
+
+    def get_cell_values(self, attribute, cell_idx=None):
+        """
+        Возвращает значения атрибута ячеек модели в виде массива
+        Массив собирается один раз и хранится до изменения данных ячеек
+        :param attribute: имя атрибута ячейки
+        :param cell_idx: массив позиций ячеек, None - все ячейки модели
+        :return: массив float64 значений, NaN для значений None и отрицательных позиций ячеек
+        """
+        values = self._cells_values.get(attribute, None)
+        if values is None:
+            values = np.array([getattr(cell, attribute) for cell in self._cells], dtype=np.float64)
+            self._cells_values[attribute] = values
+        if cell_idx is None:
+            return values
+        cell_idx = np.asarray(cell_idx, dtype=np.int64)
+        result = np.full(len(cell_idx), np.nan, dtype=np.float64)
+        inside = cell_idx >= 0
+        result[inside] = values[cell_idx[inside]]
+        return result
+
+    def _update_cell_values(self, cell_idx):
+        """
+        Обновляет собранные массивы значений ячеек для изменившихся ячеек
+        :param cell_idx: массив позиций изменившихся ячеек
+        :return: None
+        """
+        for attribute, values in self._cells_values.items():
+            values[cell_idx] = np.array([getattr(self._cells[idx], attribute) for idx in cell_idx.tolist()],
+                                        dtype=np.float64)
+
+    def _reset_cell_values(self):
+        """
+        Сбрасывает собранные массивы значений ячеек после изменения данных ячеек
+        :return: None
+        """
+        self._cells_values = {}
+
+    def get_memory_size(self):
+        """
+        Оценивает объем оперативной памяти, занимаемой моделью
+        :return: объем в байтах
+        """
+        return len(self) * self.cell_type.memory_size + self._grid_index.nbytes + \
+            sum(values.nbytes for values in self._cells_values.values())
+
+    def _get_cell_attribute_grid(self, attribute, fill_value=np.nan, dtype=np.float64):
+        """
+        Собирает значения атрибута ячеек в растр формы (Z_count, Y_count, X_count)
+        :param attribute: имя атрибута ячейки
+        :param fill_value: значение для индексов сетки без ячеек
+        :param dtype: тип данных растра, значения None заменяются на NaN
+        :return: массив numpy
+        """
+        vm = self.voxel_model
+        grid = np.full((vm.Z_count, vm.Y_count, vm.X_count), fill_value, dtype=dtype)
+        grid[self._cells_grid_idx] = self.get_cell_values(attribute).astype(dtype)
+        return grid
 
     def _calk_model_mse(self, db_connection):
         """
-        Расчитывает СКП всей модели по СКП отдельных ячеек
+        Расчитывает СКП всей модели по массивам СКП и избыточности ячеек
         :param db_connection: открытое соединение с БД
         :return: None
         """
-        vv = 0
-        sum_of_r = 0
-        for cell in self:
-            if cell.r > 0 and cell.mse is not None:
-                vv += (cell.mse ** 2) * cell.r
-                sum_of_r += cell.r
-        try:
-            self.mse_data = (vv / sum_of_r) ** 0.5
-        except ZeroDivisionError:
-            self.mse_data = None
+        mse = self.get_cell_values("mse")
+        r = self.get_cell_values("r")
+        valid = (r > 0) & ~np.isnan(mse)
+        sum_of_r = r[valid].sum()
+        self.mse_data = float(np.sqrt((mse[valid] ** 2 * r[valid]).sum() / sum_of_r)) if sum_of_r > 0 else None
         stmt = update(self.db_table).values(MSE_data=self.mse_data).where(self.db_table.c.id == self.id)
         db_connection.execute(stmt)
         db_connection.commit()
         self.logger.info(f"Расчет СКП модели {self.model_name} завершен и загружен в БД")
 
+    def _load_model_data_from_db(self, db_connection):
+        """
+        Загружает данные ячеек модели из БД
+        Если модель сохранена в виде растров - загружает их одним запросом,
+        иначе загружает каждую ячейку отдельно
+        :param db_connection: открытое соединение с БД
+        :return: None
+        """
+        rasters = load_model_rasters(self.id, db_connection)
+        if rasters:
+            self._set_rasters(rasters)
+        else:
+            self._load_cell_data_from_db(db_connection)
+
+    def _save_model_data_in_db(self, db_connection):
+        """
+        Сохраняет данные ячеек модели в БД в формате заданном в SEGMENTED_MODEL_STORAGE
+        :param db_connection: открытое соединение с БД
+        :return: None
+        """
+        if SEGMENTED_MODEL_STORAGE == "raster":
+            save_model_rasters(self.id, self._get_rasters(), db_connection)
+        else:
+            self._save_cell_data_in_db(db_connection)
+
+    def _update_model_data_in_db(self, db_connection, cell_idx=None):
+        """
+        Перезаписывает данные ячеек модели в БД после изменения модели
+        При хранении ячеек строками обновляются только строки изменившихся ячеек,
+        при хранении растрами растр содержит всю модель, поэтому строки растров перезаписываются целиком
+        :param db_connection: открытое соединение с БД
+        :param cell_idx: массив позиций изменившихся ячеек, None - данные модели сохраняются заново
+        :return: None
+        """
+        if cell_idx is not None:
+            if SEGMENTED_MODEL_STORAGE == "raster":
+                if update_model_rasters(self.id, self._get_rasters(), db_connection):
+                    return
+            else:
+                self._update_cell_data_in_db(cell_idx, db_connection)
+                return
+        db_table = self.cell_type.db_table
+        db_connection.execute(delete(db_table).where(db_table.c.base_model_id == self.id))
+        delete_model_rasters(self.id, db_connection)
+        self._save_model_data_in_db(db_connection)
+
     def _load_cell_data_from_db(self, db_connection):
         """
-        Загружает данные всех ячеек модели из БД
+        Загружает данные всех ячеек модели из БД одним запросом
+        Записи сопоставляются с ячейками модели по id вокселя
         :param db_connection: открытое соединение с БД
         :return: None
         """
-        for cell in self._model_structure.values():
-            cell._load_cell_data_from_db(db_connection)
+        db_table = self.cell_type.db_table
+        select_ = select(db_table).where(db_table.c.base_model_id == self.id)
+        db_cells_data = {db_cell_data["voxel_id"]: db_cell_data
+                         for db_cell_data in db_connection.execute(select_).mappings()}
+        for cell in self._cells:
+            db_cell_data = db_cells_data.get(cell.voxel_id, None)
+            if db_cell_data is not None:
+                cell._copy_cell_data(db_cell_data)
 
     def _save_cell_data_in_db(self, db_connection):
         """
-        Сохраняет данные из всех ячеек модели в БД
+        Сохраняет данные из всех ячеек модели в БД одним пакетным запросом
+        :param db_connection: открытое соединение с БД
+        :return: None
+        """
+        cells_data = [cell.get_db_raw_data() for cell in self._cells]
+        if cells_data:
+            db_connection.execute(insert(self.cell_type.db_table), cells_data)
+
+    def _update_cell_data_in_db(self, cell_idx, db_connection):
+        """
+        Перезаписывает строки изменившихся ячеек модели одним пакетным UPDATE
+        :param cell_idx: массив позиций изменившихся ячеек
         :param db_connection: открытое соединение с БД
         :return: None
         """
-        for cell in self._model_structure.values():
-            cell._save_cell_data_in_db(db_connection)
+        cells_data = [self._cells[idx].get_db_raw_data() for idx in cell_idx.tolist()]
+        if not cells_data:
+            return
+        db_table = self.cell_type.db_table
+        stmt = update(db_table) \
+            .where(and_(db_table.c.base_model_id == bindparam("b_base_model_id"),
+                        db_table.c.voxel_id == bindparam("b_voxel_id"))) \
+            .values({column: bindparam(f"b_{column}") for column in cells_data[0]
+                     if column not in ("base_model_id", "voxel_id")})
+        db_connection.execute(stmt, [{f"b_{column}": value for column, value in cell_data.items()}
+                                     for cell_data in cells_data])
 
     def _get_last_model_id(self):
         """
@@ -146,7 +364,8 @@ class SegmentedModelABC(ABC):
             db_model_data = db_connection.execute(select_).mappings().first()
             if db_model_data is not None:
                 self._copy_model_data(db_model_data)
-                self._load_cell_data_from_db(db_connection)
+                self._load_model_data_from_db(db_connection)
+                self._reset_cell_values()
                 self.logger.info(f"Загрузка {self.model_name} модели завершена")
             else:
                 stmt = insert(self.db_table).values(base_voxel_model_id=self.voxel_model.id,
@@ -158,38 +377,115 @@ class SegmentedModelABC(ABC):
                 db_connection.commit()
                 self.id = self._get_last_model_id()
                 self._calk_segment_model()
+                self._reset_cell_values()
                 self._calk_model_mse(db_connection)
-                self._save_cell_data_in_db(db_connection)
+                self._save_model_data_in_db(db_connection)
                 db_connection.commit()
                 self.logger.info(f"Расчет модели {self.model_name} завершен и загружен в БД\n")
 
-    def _calk_cell_mse(self, base_scan):
+    def _calk_cell_mse(self, base_scan, cell_idx=None):
         """
         Расчитываает СКП в ячейках сегментированной модели от точек базового скана
+        Отметки поверхности в точках рассчитываются по пакетам точек методом _sample_cells,
+        суммы квадратов отклонений накапливаются по ячейкам через np.bincount
         :param base_scan: базовый скан из воксельной модели
+        :param cell_idx: массив позиций пересчитываемых ячеек, None - пересчитываются все ячейки
         :return: None
         """
-        for point in base_scan:
-            try:
-                cell = self.get_model_element_for_point(point)
-                cell_z = cell.get_z_from_xy(point.X, point.Y)
-                if cell_z is None:
-                    continue
-            except AttributeError:
-                continue
-            try:
-                cell.vv += (point.Z - cell_z) ** 2
-            except AttributeError:
-                cell.vv = (point.Z - cell_z) ** 2
-
-        for cell in self:
-            if cell.r > 0:
-                try:
-                    cell.mse = (cell.vv / cell.r) ** 0.5
-                except AttributeError:
-                    cell.mse = None
+        cells_count = len(self)
+        vv = np.zeros(cells_count, dtype=np.float64)
+        vv_count = np.zeros(cells_count, dtype=np.int64)
+        for batch, points_cell_idx in self._iter_cells_batches(base_scan, cell_idx):
+            cell_z, _ = self._sample_cells(points_cell_idx, batch.X, batch.Y)
+            valid = ~np.isnan(cell_z)
+            vv += np.bincount(points_cell_idx[valid], weights=(batch.Z[valid] - cell_z[valid]) ** 2,
+                              minlength=cells_count)
+            vv_count += np.bincount(points_cell_idx[valid], minlength=cells_count)
+
+        self._set_cells_mse(vv, vv_count, cell_idx)
         self.logger.info(f"Расчет СКП высот в ячейках модели {self.model_name} завершен")
 
+    def _iter_cells_batches(self, base_scan, cell_idx=None):
+        """
+        Перебирает пакеты точек скана, попадающих в ячейки модели
+        Точки заданных ячеек выбираются по принадлежности точек вокселям (VoxelMembership) без перебора скана,
+        если принадлежность для воксельной модели не сохранялась - скан перебирается пакетами с отбором точек
+        :param base_scan: базовый скан из воксельной модели
+        :param cell_idx: массив позиций ячеек, None - все ячейки модели
+        :return: генератор пар (пакет точек PointBatch, массив позиций ячеек точек)
+        """
+        membership = None
+        if cell_idx is not None and hasattr(base_scan, "get_points_by_ids"):
+            membership = self.voxel_model.get_membership()
+        if membership is not None:
+            batch = base_scan.get_points_by_ids(membership.get_point_ids(self._voxel_arrays.keys[cell_idx]))
+            yield batch, self.get_cell_indices(batch.X, batch.Y, batch.Z)
+            return
+        selected = None
+        if cell_idx is not None:
+            selected = np.zeros(len(self), dtype=np.bool_)
+            selected[cell_idx] = True
+        for batch in base_scan.iter_batches():
+            points_cell_idx = self.get_cell_indices(batch.X, batch.Y, batch.Z)
+            inside = points_cell_idx >= 0
+            if selected is not None:
+                inside[inside] = selected[points_cell_idx[inside]]
+            if not np.all(inside):
+                batch, points_cell_idx = batch[inside], points_cell_idx[inside]
+            yield batch, points_cell_idx
+
+    def _set_cells_mse(self, vv, vv_count, cell_idx=None):
+        """
+        Рассчитывает СКП ячеек по суммам квадратов отклонений точек от поверхности модели
+        СКП = sqrt(vv / r), для ячеек без избыточности или без отклонений СКП не определена
+        :param vv: массив сумм квадратов отклонений по всем ячейкам модели
+        :param vv_count: массив количества учтенных отклонений по всем ячейкам модели
+        :param cell_idx: массив позиций обновляемых ячеек, None - обновляются все ячейки
+        :return: None
+        """
+        if cell_idx is None:
+            for cell, cell_vv, cell_vv_count in zip(self, vv.tolist(), vv_count.tolist()):
+                cell.mse = (cell_vv / cell.r) ** 0.5 if cell.r > 0 and cell_vv_count > 0 else None
+            self._reset_cell_values()
+        else:
+            for idx, cell_vv, cell_vv_count in zip(cell_idx.tolist(), vv[cell_idx].tolist(),
+                                                   vv_count[cell_idx].tolist()):
+                cell = self._cells[idx]
+                cell.mse = (cell_vv / cell.r) ** 0.5 if cell.r > 0 and cell_vv_count > 0 else None
+            self._update_cell_values(cell_idx)
+
+    def update_from_removed_points(self, points):
+        """
+        Обновляет модель после деактивации точек базового скана без полного перерасчета
+        Пересчитываются только ячейки, затронутые удаленными точками, затем СКП модели и данные изменившихся
+        ячеек в БД; если ячейки не изменились, модель в БД не перезаписывается
+        :param points: пакет деактивированных точек PointBatch
+        :return: массив позиций изменившихся ячеек
+        """
+        if points is None or len(points) == 0:
+            return np.array([], dtype=np.int64)
+        cell_idx = self._update_cells_from_removed_points(points)
+        if len(cell_idx) == 0:
+            return cell_idx
+        with engine.connect() as db_connection:
+            self._calk_model_mse(db_connection)
+            self._update_model_data_in_db(db_connection, cell_idx)
+            db_connection.commit()
+        self.logger.info(f"Модель {self.model_name} обновлена, изменено ячеек: {len(cell_idx)}")
+        return cell_idx
+
+    def _update_cells_from_removed_points(self, points):
+        """
+        Пересчитывает данные ячеек модели, затронутых деактивированными точками
+        Базовая реализация для моделей без инкрементного обновления рассчитывает все ячейки модели заново
+        по текущим точкам скана из ScanCache
+        :param points: пакет деактивированных точек PointBatch (не используется)
+        :return: массив позиций изменившихся ячеек (все ячейки модели)
+        """
+        self._calk_segment_model()
+        self._reset_cell_values()
+        return np.arange(len(self), dtype=np.int64)
+
     def delete_model(self, db_connection=None):
         stmt_1 = delete(self.db_table).where(self.db_table.c.id == self.id)
         stmt_2 = delete(self.cell_type.db_table).where(self.cell_type.db_table.c.base_model_id == self.id)
@@ -199,9 +495,11 @@ class SegmentedModelABC(ABC):
                 db_connection.commit()
                 db_connection.execute(stmt_2)
                 db_connection.commit()
+                delete_model_rasters(self.id, db_connection)
         else:
             db_connection.execute(stmt_1)
             db_connection.commit()
             db_connection.execute(stmt_2)
             db_connection.commit()
+            delete_model_rasters(self.id, db_connection)
         self.logger.info(f"Удаление модели {self.model_name} из БД завершено\n")
@@ -1,12 +1,18 @@
 import logging
 from abc import ABC, abstractmethod
 
-from sqlalchemy import select, insert, desc
+import numpy as np
+from sqlalchemy import select, insert, desc, update, bindparam
 
 from app.core.CONFIG import LOGGER
+from app.core.base.VoxelArrays import VoxelArrays
 from app.core.db.start_db import Tables, engine
-from app.core.utils.FastVMSeparator import FastVMSeparator
+from app.core.utils.NumpyVMSeparator import NumpyVMSeparator
+from app.core.utils.SparseVoxelStructure import SparseVoxelStructure
 from app.core.utils.VMRawIterator import VMRawIterator
+from app.core.utils.VoxelMembership import VoxelMembership
+from app.core.utils.VoxelModelCache import VoxelModelCache
+from app.core.utils.VoxelPyramidRegistry import VoxelPyramidRegistry
 
 
 class VoxelModelABC(ABC):
@@ -59,20 +65,96 @@ class VoxelModel(VoxelModelABC):
     """
 
     def __init__(self, scan, step, dx=0.0, dy=0.0, is_2d_vxl_mdl=True,
-                 voxel_model_separator=FastVMSeparator()):
+                 voxel_model_separator=NumpyVMSeparator()):
         super().__init__(scan, step, dx, dy, is_2d_vxl_mdl)
         self.voxel_model_separator = voxel_model_separator
-        self.__init_vxl_mdl(scan)
         self.voxel_structure = None
+        self.membership = None
+        self.voxel_arrays = None
+        self.__init_vxl_mdl(scan)
 
     def __iter__(self):
         return iter(VMRawIterator(self))
 
+    def get_membership(self):
+        """
+        Возвращает принадлежность точек базового скана вокселям модели
+        При первом обращении загружает ее из БД
+        :return: объект VoxelMembership или None, если при разбиении модели она не сохранялась
+        """
+        if self.membership is None:
+            self.membership = VoxelMembership.load(self.id)
+        return self.membership
+
+    def load_arrays(self):
+        """
+        Возвращает непустые воксели модели в виде массивов numpy
+        При первом обращении загружает их из БД одним запросом
+        :return: объект VoxelArrays
+        """
+        if self.voxel_arrays is None:
+            select_ = select(Tables.voxels_db_table.c.id, Tables.voxels_db_table.c.vxl_key,
+                             Tables.voxels_db_table.c.len, Tables.voxels_db_table.c.R,
+                             Tables.voxels_db_table.c.G, Tables.voxels_db_table.c.B) \
+                .where(Tables.voxels_db_table.c.vxl_mdl_id == self.id)
+            with engine.connect() as db_connection:
+                rows = db_connection.execute(select_).fetchall()
+            self.voxel_arrays = VoxelArrays.parse_arrays_from_db_rows(self, rows)
+        return self.voxel_arrays
+
+    def update_voxels_from_deactivated_points(self, points):
+        """
+        Обновляет метрики вокселей (количество точек и цвет) после деактивации точек фильтром
+        Метрики пересчитываются векторно только для затронутых вокселей и сохраняются в БД одним пакетным UPDATE
+        :param points: пакет деактивированных точек PointBatch
+        :return: None
+        """
+        if points is None or len(points) == 0:
+            return
+        if self.voxel_structure is None:
+            self.voxel_structure = self.__load_voxel_structure()
+        membership = self.get_membership()
+        if membership is not None:
+            keys = membership.get_voxel_keys(points.ids)
+        else:
+            keys = NumpyVMSeparator.get_flat_voxel_indices(self, points)
+        changed = self.voxel_structure.remove_points(keys, points.rgb)
+        counts = self.voxel_structure.counts[changed]
+        rgb = np.zeros((len(changed), 3), dtype=np.int64)
+        not_empty = counts > 0
+        rgb[not_empty] = np.round(self.voxel_structure.rgb_sums[changed][not_empty] / counts[not_empty, None])
+        voxels = [{"b_id": voxel_id, "b_len": length, "b_R": r, "b_G": g, "b_B": b}
+                  for voxel_id, length, (r, g, b) in zip(self.voxel_structure.ids[changed].tolist(),
+                                                         counts.tolist(), rgb.tolist())]
+        if not voxels:
+            return
+        stmt = update(Tables.voxels_db_table) \
+            .where(Tables.voxels_db_table.c.id == bindparam("b_id")) \
+            .values(len=bindparam("b_len"), R=bindparam("b_R"), G=bindparam("b_G"), B=bindparam("b_B"))
+        with engine.connect() as db_connection:
+            db_connection.execute(stmt, voxels)
+            db_connection.commit()
+        self.voxel_arrays = None
+        self.logger.info(f"Метрики {len(voxels)} вокселей модели {self.vm_name} обновлены")
+
+    def __load_voxel_structure(self):
+        """
+        Создает разреженную воксельную структуру по загруженным из БД массивам вокселей
+        Суммы цветов восстанавливаются по округленным средним значениям цвета вокселей
+        :return: объект SparseVoxelStructure
+        """
+        voxel_arrays = self.load_arrays()
+        return SparseVoxelStructure(self, voxel_arrays.keys, voxel_arrays.len.copy(),
+                                    (voxel_arrays.rgb * voxel_arrays.len[:, None]).astype(np.float64),
+                                    voxel_arrays.ids.copy())
+
     def __init_vxl_mdl(self, scan):
         """
         Инициализирует воксельную модель при запуске
         Если воксельная модеьл с таким именем уже есть в БД - запускает копирование данных из БД в атрибуты модели
-        Если такой воксельной модели нет - создает новую запись в БД и запускает процедуру рабиения скана на воксели
+        Если такой воксельной модели нет - создает новую запись в БД и получает воксели из воксельной пирамиды
+        ранее разбитой модели того же скана (VoxelPyramidRegistry), затем из дискового кеша,
+        а при их отсутствии запускает процедуру рабиения скана на воксели
         по логике переданного в конструкторе воксельной модели разделителя voxel_model_separator
         :return: None
         """
@@ -105,7 +187,19 @@ class VoxelModel(VoxelModelABC):
                 db_connection.commit()
                 stmt = (select(Tables.voxel_models_db_table.c.id).order_by(desc("id")))
                 self.id = db_connection.execute(stmt).first()[0]
-                self.voxel_model_separator.separate_voxel_model(self, scan)
+                pyramid_separator = VoxelPyramidRegistry().get_separator(self, scan)
+                if pyramid_separator is not None:
+                    pyramid_separator.separate_voxel_model(self, scan)
+                else:
+                    cached_vm = VoxelModelCache().load_voxel_structure(self, scan)
+                    if cached_vm is not None:
+                        voxel_structure, self.membership = cached_vm
+                        NumpyVMSeparator.load_voxel_structure_in_db(self, voxel_structure)
+                        if self.membership is not None:
+                            self.membership.save()
+                    else:
+                        self.voxel_model_separator.separate_voxel_model(self, scan)
+                VoxelPyramidRegistry().register(self)
 
     def __calc_vxl_md_metric(self, scan):
         """
@@ -0,0 +1,68 @@
+import numpy as np
+
+
+class CellOrderStatistics:
+    """
+    Накопитель порядковых статистик высот в ячейках (минимум, медиана, процентиль) и сумм квадратов
+    отклонений высот от них (M2)
+    Пакеты значений накапливаются, затем сортируются один раз по позиции ячейки и значению,
+    процентили всех ячеек рассчитываются сегментными операциями над отсортированным массивом
+    Процентиль рассчитывается линейной интерполяцией между соседними порядковыми статистиками, как в np.percentile
+    """
+
+    def __init__(self, cells_count, percentile):
+        self.percentile = percentile
+        self.count = np.zeros(cells_count, dtype=np.int64)
+        self.value = np.full(cells_count, np.nan, dtype=np.float64)
+        self.m2 = np.zeros(cells_count, dtype=np.float64)
+        self.__cell_idx = []
+        self.__values = []
+
+    def __str__(self):
+        return f"{self.__class__.__name__} [cells: {len(self)},\tpercentile: {self.percentile}]"
+
+    def __repr__(self):
+        return f"{self.__class__.__name__} [cells: {len(self)}]"
+
+    def __len__(self):
+        return len(self.count)
+
+    def add_values(self, cell_idx, values):
+        """
+        Добавляет пакет значений, статистики ячеек пересчитываются методом calk_statistics
+        :param cell_idx: массив позиций ячеек значений
+        :param values: массив значений (высот точек)
+        :return: None
+        """
+        self.__cell_idx.append(np.asarray(cell_idx, dtype=np.int64))
+        self.__values.append(np.asarray(values, dtype=np.float64))
+
+    def calk_statistics(self, cell_idx=None):
+        """
+        Рассчитывает статистики ячеек по накопленным значениям и очищает накопленные значения
+        Накопленные значения должны содержать все точки пересчитываемых ячеек
+        :param cell_idx: массив позиций пересчитываемых ячеек, None - пересчитываются все ячейки
+        :return: None
+        """
+        cells_count = len(self)
+        idx = np.concatenate(self.__cell_idx) if self.__cell_idx else np.empty(0, dtype=np.int64)
+        values = np.concatenate(self.__values) if self.__values else np.empty(0, dtype=np.float64)
+        self.__cell_idx, self.__values = [], []
+        order = np.lexsort((values, idx))
+        idx, values = idx[order], values[order]
+        count = np.bincount(idx, minlength=cells_count)
+        not_empty = count > 0
+        starts = (np.cumsum(count) - count)[not_empty]
+        position = (count[not_empty] - 1) * (self.percentile / 100)
+        low = np.floor(position).astype(np.int64)
+        high = np.minimum(low + 1, count[not_empty] - 1)
+        low_values, high_values = values[starts + low], values[starts + high]
+        value = np.full(cells_count, np.nan, dtype=np.float64)
+        value[not_empty] = low_values + (high_values - low_values) * (position - low)
+        m2 = np.bincount(idx, weights=(values - value[idx]) ** 2, minlength=cells_count)
+        if cell_idx is None:
+            self.count, self.value, self.m2 = count, value, m2
+        else:
+            self.count[cell_idx] = count[cell_idx]
+            self.value[cell_idx] = value[cell_idx]
+            self.m2[cell_idx] = m2[cell_idx]
@@ -0,0 +1,102 @@
+import numpy as np
+
+
+class CellStatistics:
+    """
+    Накопитель количества точек, среднего значения и суммы квадратов отклонений от среднего (M2) высот в ячейках
+    Пакеты точек добавляются за один проход численно устойчивым способом (алгоритм Уэлфорда/Чана),
+    частичные результаты (например, по частям скана или из разных процессов) объединяются методом merge,
+    статистики деактивированных точек исключаются методом subtract
+    """
+
+    def __init__(self, cells_count):
+        self.count = np.zeros(cells_count, dtype=np.int64)
+        self.mean = np.zeros(cells_count, dtype=np.float64)
+        self.m2 = np.zeros(cells_count, dtype=np.float64)
+
+    def __str__(self):
+        return f"{self.__class__.__name__} [cells: {len(self)},\tpoints: {int(self.count.sum())}]"
+
+    def __repr__(self):
+        return f"{self.__class__.__name__} [cells: {len(self)}]"
+
+    def __len__(self):
+        return len(self.count)
+
+    @property
+    def value(self):
+        """
+        Высоты ячеек - средние значения, как и value порядковых статистик CellOrderStatistics
+        """
+        return self.mean
+
+    @classmethod
+    def create_from_values(cls, cells_count, cell_idx, values):
+        """
+        Рассчитывает статистики ячеек по одному пакету значений
+        :param cells_count: количество ячеек
+        :param cell_idx: массив позиций ячеек значений
+        :param values: массив значений (высот точек)
+        :return: объект CellStatistics
+        """
+        statistics = cls(cells_count)
+        statistics.count = np.bincount(cell_idx, minlength=cells_count)
+        not_empty = statistics.count > 0
+        sums = np.bincount(cell_idx, weights=values, minlength=cells_count)
+        statistics.mean[not_empty] = sums[not_empty] / statistics.count[not_empty]
+        statistics.m2 = np.bincount(cell_idx, weights=(values - statistics.mean[cell_idx]) ** 2,
+                                    minlength=cells_count)
+        return statistics
+
+    def add_values(self, cell_idx, values):
+        """
+        Добавляет в статистики пакет значений
+        :param cell_idx: массив позиций ячеек значений
+        :param values: массив значений (высот точек)
+        :return: None
+        """
+        self.merge(self.create_from_values(len(self), cell_idx, values))
+
+    def remove_values(self, cell_idx, values):
+        """
+        Исключает из статистик пакет ранее добавленных значений
+        :param cell_idx: массив позиций ячеек значений
+        :param values: массив значений (высот точек)
+        :return: None
+        """
+        self.subtract(self.create_from_values(len(self), cell_idx, values))
+
+    def merge(self, other):
+        """
+        Объединяет статистики с частичными статистиками тех же ячеек
+        n = na + nb, mean = mean_a + delta * nb / n, M2 = M2a + M2b + delta^2 * na * nb / n, delta = mean_b - mean_a
+        :param other: объект CellStatistics
+        :return: None
+        """
+        count = self.count + other.count
+        not_empty = count > 0
+        delta = other.mean - self.mean
+        mean = self.mean.copy()
+        m2 = self.m2 + other.m2
+        mean[not_empty] += delta[not_empty] * other.count[not_empty] / count[not_empty]
+        m2[not_empty] += delta[not_empty] ** 2 * self.count[not_empty] * other.count[not_empty] / count[not_empty]
+        self.count, self.mean, self.m2 = count, mean, m2
+
+    def subtract(self, other):
+        """
+        Исключает из статистик частичные статистики тех же ячеек (операция, обратная merge)
+        n = na - nb, mean = mean_a - delta_a * nb / n, M2 = M2a - M2b - delta^2 * n * nb / na,
+        delta_a = mean_b - mean_a, delta = mean_b - mean
+        Отрицательные из-за ошибок округления M2 заменяются на 0, статистики опустевших ячеек обнуляются
+        :param other: объект CellStatistics
+        :return: None
+        """
+        count = self.count - other.count
+        not_empty = count > 0
+        n, na, nb = count[not_empty], self.count[not_empty], other.count[not_empty]
+        mean = np.zeros(len(self), dtype=np.float64)
+        m2 = np.zeros(len(self), dtype=np.float64)
+        mean[not_empty] = self.mean[not_empty] - (other.mean[not_empty] - self.mean[not_empty]) * nb / n
+        delta = other.mean[not_empty] - mean[not_empty]
+        m2[not_empty] = np.maximum(self.m2[not_empty] - other.m2[not_empty] - delta ** 2 * n * nb / na, 0.0)
+        self.count, self.mean, self.m2 = count, mean, m2
@@ -90,9 +90,10 @@ class FastVMSeparator:
         with engine.connect() as db_connection:
             last_voxel_id = db_connection.execute(last_voxels_id_stmt).first()
         last_voxel_id = last_voxel_id[0] if last_voxel_id else 0
-        for voxel in iter(VMFullBaseIterator(self.voxel_model)):
+        for flat_key, voxel in enumerate(VMFullBaseIterator(self.voxel_model)):
             last_voxel_id += 1
             voxel.id = last_voxel_id
+            voxel.vxl_key = voxel.generate_vxl_key(self.voxel_model.id, flat_key)
 
     def __load_voxel_data_in_db(self):
         """
@@ -106,7 +107,7 @@ class FastVMSeparator:
             if len(voxel) == 0:
                 continue
             voxels.append({"id": voxel.id,
-                           "vxl_name": voxel.vxl_name,
+                           "vxl_key": voxel.vxl_key,
                            "X": voxel.X,
                            "Y": voxel.Y,
                            "Z": voxel.Z,
@@ -0,0 +1,119 @@
+import logging
+from collections import OrderedDict
+
+from app.core.CONFIG import LOGGER, MODEL_REGISTRY_MAX_SIZE
+from app.core.db.TableInitializer import SingletonMeta
+from app.core.utils.ScanCache import ScanCache
+
+
+class ModelRegistry(metaclass=SingletonMeta):
+    """
+    Реестр рассчитанных сегментированных моделей в оперативной памяти
+    Ключ модели - (id воксельной модели, класс модели, параметры модели, версия активных точек базового скана)
+    Пока точки скана не менялись - возвращается ранее рассчитанная модель, после деактивации точек модели
+    обновляются методом update_models_from_removed_points, устаревшие модели удаляются из реестра и из БД
+    при следующем запросе модели той же воксельной модели
+    Суммарный объем моделей ограничен max_size, при превышении удаляются модели,
+    к которым дольше всего не обращались
+    """
+    logger = logging.getLogger(LOGGER)
+
+    def __init__(self, max_size=MODEL_REGISTRY_MAX_SIZE):
+        self.max_size = max_size
+        self.__models = OrderedDict()
+
+    def __len__(self):
+        return len(self.__models)
+
+    def get_model(self, model_class, voxel_model, *args):
+        """
+        Возвращает модель из реестра, при отсутствии актуальной модели - рассчитывает ее
+        :param model_class: класс сегментированной модели
+        :param voxel_model: воксельная модель
+        :param args: дополнительные параметры конструктора модели
+        :return: объект сегментированной модели
+        """
+        key = self.get_model_key(model_class, voxel_model, *args)
+        model_data = self.__models.get(key, None)
+        if model_data is not None:
+            self.__models.move_to_end(key)
+            self.logger.info(f"Модель {model_data[0].model_name} взята из реестра моделей")
+            return model_data[0]
+        self.__delete_stale_models(key)
+        model = model_class(voxel_model, *args)
+        self.__models[key] = (model, model.get_memory_size())
+        self.__evict()
+        return model
+
+    @staticmethod
+    def get_model_key(model_class, voxel_model, *args):
+        """
+        Возвращает ключ модели в реестре
+        :param model_class: класс сегментированной модели
+        :param voxel_model: воксельная модель
+        :param args: дополнительные параметры конструктора модели
+        :return: кортеж (id воксельной модели, имя класса модели, параметры модели, версия скана)
+        """
+        version = ScanCache().get_scan(voxel_model.base_scan_id).version
+        return voxel_model.id, model_class.__name__, args, version
+
+    def update_models_from_removed_points(self, scan_id, points):
+        """
+        Обновляет модели реестра после деактивации точек скана
+        Модели, рассчитанные по предыдущей версии скана, обновляются по удаленным точкам и переносятся
+        под ключ текущей версии скана
+        :param scan_id: id скана
+        :param points: пакет деактивированных точек PointBatch
+        :return: None
+        """
+        if points is None or len(points) == 0:
+            return
+        version = ScanCache().get_scan(scan_id).version
+        models = OrderedDict()
+        for key, (model, size) in self.__models.items():
+            if model.voxel_model.base_scan_id != scan_id or key[3] != version - 1:
+                models[key] = (model, size)
+                continue
+            model.update_from_removed_points(points)
+            models[key[:3] + (version,)] = (model, model.get_memory_size())
+        self.__models = models
+        self.__evict()
+
+    def clear(self):
+        """
+        Удаляет все модели из реестра и из БД
+        :return: None
+        """
+        for key in list(self.__models):
+            self.__delete_model(key)
+
+    def __delete_stale_models(self, key):
+        """
+        Удаляет модели той же воксельной модели, класса и параметров, рассчитанные по другой версии скана
+        :param key: ключ запрошенной модели
+        :return: None
+        """
+        for stale_key in [model_key for model_key in self.__models if model_key[:3] == key[:3]]:
+            self.__delete_model(stale_key)
+
+    def __delete_model(self, key):
+        """
+        Удаляет модель из реестра и из БД
+        :param key: ключ модели
+        :return: None
+        """
+        model, _ = self.__models.pop(key)
+        model.delete_model()
+
+    def __evict(self):
+        """
+        Удаляет модели, к которым дольше всего не обращались, пока объем реестра превышает max_size
+        Последняя добавленная модель не удаляется
+        :return: None
+        """
+        total_size = sum(size for _, size in self.__models.values())
+        while total_size > self.max_size and len(self.__models) > 1:
+            key = next(iter(self.__models))
+            total_size -= self.__models[key][1]
+            self.logger.info(f"Модель {self.__models[key][0].model_name} вытеснена из реестра моделей")
+            self.__delete_model(key)
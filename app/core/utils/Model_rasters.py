@@ -0,0 +1,90 @@
+import numpy as np
+from sqlalchemy import select, delete, update, and_, bindparam
+
+from app.core.db.start_db import Tables, engine
+
+
+def save_model_rasters(model_id, rasters: dict, db_connection=None):
+    """
+    Сохраняет растры сегментированной модели в БД в виде BLOB
+    Один растр - одна строка таблицы model_rasters
+    :param model_id: id сегментированной модели
+    :param rasters: словарь {имя растра: трехмерный массив numpy (Z_count, Y_count, X_count)}
+    :param db_connection: Открытое соединение с БД
+    :return: None
+    """
+    raster_rows = []
+    for raster_name, raster in rasters.items():
+        raster = np.ascontiguousarray(raster)
+        z_count, y_count, x_count = raster.shape
+        raster_rows.append({"base_model_id": model_id,
+                            "raster_name": raster_name,
+                            "dtype": raster.dtype.str,
+                            "Z_count": z_count,
+                            "Y_count": y_count,
+                            "X_count": x_count,
+                            "data": raster.tobytes()
+                            })
+    if db_connection is None:
+        with engine.connect() as db_connection:
+            db_connection.execute(Tables.model_rasters_db_table.insert(), raster_rows)
+            db_connection.commit()
+    else:
+        db_connection.execute(Tables.model_rasters_db_table.insert(), raster_rows)
+        db_connection.commit()
+
+
+def update_model_rasters(model_id, rasters: dict, db_connection):
+    """
+    Перезаписывает данные ранее сохраненных растров сегментированной модели одним пакетным UPDATE
+    :param model_id: id сегментированной модели
+    :param rasters: словарь {имя растра: трехмерный массив numpy}
+    :param db_connection: Открытое соединение с БД
+    :return: True, если обновлены все растры, False - если часть растров модели в БД отсутствует
+    """
+    table = Tables.model_rasters_db_table
+    stmt = update(table) \
+        .where(and_(table.c.base_model_id == bindparam("b_model_id"), table.c.raster_name == bindparam("b_name"))) \
+        .values(data=bindparam("b_data"))
+    raster_rows = [{"b_model_id": model_id, "b_name": raster_name, "b_data": np.ascontiguousarray(raster).tobytes()}
+                   for raster_name, raster in rasters.items()]
+    result = db_connection.execute(stmt, raster_rows)
+    return result.rowcount == len(raster_rows)
+
+
+def load_model_rasters(model_id, db_connection=None):
+    """
+    Загружает все растры сегментированной модели из БД одним запросом
+    :param model_id: id сегментированной модели
+    :param db_connection: Открытое соединение с БД
+    :return: словарь {имя растра: трехмерный массив numpy}, пустой если растров у модели нет
+    """
+    select_ = select(Tables.model_rasters_db_table) \
+        .where(Tables.model_rasters_db_table.c.base_model_id == model_id)
+    if db_connection is None:
+        with engine.connect() as db_connection:
+            db_rasters_data = db_connection.execute(select_).mappings().all()
+    else:
+        db_rasters_data = db_connection.execute(select_).mappings().all()
+    rasters = {}
+    for row in db_rasters_data:
+        raster = np.frombuffer(row["data"], dtype=np.dtype(row["dtype"]))
+        rasters[row["raster_name"]] = raster.reshape((row["Z_count"], row["Y_count"], row["X_count"]))
+    return rasters
+
+
+def delete_model_rasters(model_id, db_connection=None):
+    """
+    Удаляет все растры сегментированной модели из БД
+    :param model_id: id сегментированной модели
+    :param db_connection: Открытое соединение с БД
+    :return: None
+    """
+    stmt = delete(Tables.model_rasters_db_table).where(Tables.model_rasters_db_table.c.base_model_id == model_id)
+    if db_connection is None:
+        with engine.connect() as db_connection:
+            db_connection.execute(stmt)
+            db_connection.commit()
+    else:
+        db_connection.execute(stmt)
+        db_connection.commit()
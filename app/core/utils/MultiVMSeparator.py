@@ -0,0 +1,70 @@
+from app.core.utils.NumpyVMSeparator import NumpyVMSeparator, VoxelDataAccumulator
+from app.core.utils.VoxelModelCache import VoxelModelCache
+from app.core.utils.VoxelPyramidRegistry import VoxelPyramidRegistry
+from app.core.utils.Voxel_model_metrics import update_voxel_model_in_db_from_voxel_model
+
+
+class MultiVMSeparator:
+    """
+    Сепаратор нескольких воксельных моделей одного скана (например, моделей со сдвигом dx/dy)
+    за один проход по скану
+    При создании воксельной модели она только регистрируется в сепараторе,
+    разбиение всех зарегистрированных моделей выполняется вызовом separate_voxel_models
+    """
+
+    def __init__(self):
+        self.voxel_models = []
+        self.scan = None
+
+    def separate_voxel_model(self, voxel_model, scan):
+        """
+        Регистрирует воксельную модель для последующего совместного разбиения
+        :param voxel_model: воксельная модель
+        :param scan: скан
+        :return: None
+        """
+        if self.scan is not None and self.scan.id != scan.id:
+            raise ValueError("Все воксельные модели MultiVMSeparator должны строиться по одному скану!")
+        self.scan = scan
+        self.voxel_models.append(voxel_model)
+
+    def separate_voxel_models(self):
+        """
+        Разбивает все зарегистрированные воксельные модели за один проход по скану
+        1. Каждый пакет точек читается один раз, для него рассчитываются индексы вокселей каждой модели
+        2. Воксели всех моделей загружаются в БД одним пакетом
+        3. Сохраняется принадлежность точек вокселям каждой модели
+        :return: список разбитых воксельных моделей
+        """
+        voxel_models = self.voxel_models
+        if not voxel_models:
+            return voxel_models
+        for voxel_model in voxel_models:
+            voxel_model.logger.info(f"Начат расчет метрик вокселей {voxel_model.vm_name}")
+        accumulators = [VoxelDataAccumulator(voxel_model) for voxel_model in voxel_models]
+        for batch in self.scan.iter_batches():
+            for accumulator in accumulators:
+                accumulator.add_batch(batch)
+        voxels = []
+        last_voxel_id = NumpyVMSeparator.get_last_voxel_id()
+        for accumulator in accumulators:
+            voxel_model = accumulator.voxel_model
+            voxel_model.voxel_structure = accumulator.create_voxel_structure()
+            voxel_model.membership = accumulator.create_membership(voxel_model.voxel_structure)
+            voxel_model.voxel_structure.ids = last_voxel_id + 1 + voxel_model.voxel_structure.keys
+            vm_voxels = NumpyVMSeparator.get_voxels_db_rows(voxel_model.voxel_structure)
+            if vm_voxels:
+                last_voxel_id = vm_voxels[-1]["id"]
+            voxel_model.len = len(vm_voxels)
+            voxels.extend(vm_voxels)
+        NumpyVMSeparator.load_voxels_in_db(voxels)
+        for voxel_model in voxel_models:
+            update_voxel_model_in_db_from_voxel_model(voxel_model)
+            if voxel_model.membership is not None:
+                voxel_model.membership.save()
+            VoxelModelCache().save_voxel_structure(voxel_model, self.scan)
+            VoxelPyramidRegistry().register(voxel_model)
+            voxel_model.logger.info(f"Воксельная модель {voxel_model.vm_name} разбита и загружена в БД")
+        self.voxel_models = []
+        self.scan = None
+        return voxel_models
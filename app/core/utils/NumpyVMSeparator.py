@@ -0,0 +1,204 @@
+import numpy as np
+from sqlalchemy import select, desc
+
+from app.core.CONFIG import DENSE_VOXEL_STRUCTURE_MAX_SIZE, STORE_VOXEL_MEMBERSHIP
+from app.core.base.Voxel import VoxelABC
+from app.core.db.start_db import Tables, engine
+from app.core.utils.SparseVoxelStructure import SparseVoxelStructure
+from app.core.utils.VoxelMembership import VoxelMembership
+from app.core.utils.VoxelModelCache import VoxelModelCache
+from app.core.utils.Voxel_model_metrics import update_voxel_model_in_db_from_voxel_model
+
+
+class VoxelDataAccumulator:
+    """
+    Накопитель количества точек и сумм цветов в вокселях одной воксельной модели
+    Для моделей с полным числом вокселей больше DENSE_VOXEL_STRUCTURE_MAX_SIZE (мелкие 3D модели)
+    метрики накапливаются сразу в разреженной структуре, иначе - в плотных массивах через np.bincount
+    При store_membership=True запоминает индексы вокселей всех точек для создания VoxelMembership
+    """
+
+    def __init__(self, voxel_model, store_membership=STORE_VOXEL_MEMBERSHIP):
+        self.voxel_model = voxel_model
+        self.__store_membership = store_membership
+        self.__point_ids, self.__flat_idx = [], []
+        self.__full_size = voxel_model.X_count * voxel_model.Y_count * voxel_model.Z_count
+        if self.__full_size > DENSE_VOXEL_STRUCTURE_MAX_SIZE:
+            self.__sparse_structure = SparseVoxelStructure(voxel_model)
+            self.__counts, self.__rgb_sums = None, None
+        else:
+            self.__sparse_structure = None
+            self.__counts = np.zeros(self.__full_size, dtype=np.int64)
+            self.__rgb_sums = np.zeros((3, self.__full_size), dtype=np.float64)
+
+    def add_batch(self, batch):
+        """
+        Добавляет пакет точек в метрики вокселей
+        :param batch: пакет точек PointBatch
+        :return: массив плоских индексов вокселей точек пакета
+        """
+        flat_idx = NumpyVMSeparator.get_flat_voxel_indices(self.voxel_model, batch)
+        if self.__sparse_structure is not None:
+            self.__sparse_structure.add_points(flat_idx, batch.rgb)
+        else:
+            self.__counts += np.bincount(flat_idx, minlength=self.__full_size)
+            for color in range(3):
+                self.__rgb_sums[color] += np.bincount(flat_idx, weights=batch.rgb[:, color],
+                                                      minlength=self.__full_size)
+        if self.__store_membership:
+            self.__point_ids.append(batch.ids)
+            self.__flat_idx.append(flat_idx)
+        return flat_idx
+
+    def create_voxel_structure(self):
+        """
+        Возвращает накопленные метрики непустых вокселей
+        :return: объект SparseVoxelStructure
+        """
+        if self.__sparse_structure is not None:
+            return self.__sparse_structure
+        return SparseVoxelStructure.create_from_dense_counts(self.voxel_model, self.__counts, self.__rgb_sums)
+
+    def create_membership(self, voxel_structure):
+        """
+        Создает принадлежность точек вокселям модели
+        :param voxel_structure: структура непустых вокселей модели
+        :return: объект VoxelMembership или None, если принадлежность не запоминалась
+        """
+        if not self.__store_membership:
+            return None
+        membership = VoxelMembership.create_from_flat_indices(voxel_structure, self.__point_ids, self.__flat_idx)
+        self.__point_ids, self.__flat_idx = [], []
+        return membership
+
+
+class NumpyVMSeparator:
+    """
+    Векторизованный сепаратор воксельной модели
+    Индексы вокселей рассчитываются для целых пакетов точек средствами numpy,
+    в БД записываются только непустые воксели
+    """
+
+    def __init__(self):
+        self.voxel_model = None
+        self.voxel_structure = None
+
+    def separate_voxel_model(self, voxel_model, scan):
+        """
+        Общая логика разбиения воксельной модели
+        :param voxel_model: воксельная модель
+        :param scan: скан
+        :return: None
+        1. Для каждого пакета точек рассчитываются плоские индексы вокселей
+        2. Количество точек и суммы цветов в вокселях накапливаются через np.bincount
+        или в разреженной воксельной структуре
+        3. Непустым вокселям присваиваются id и они загружаются в БД одним пакетом
+        """
+        self.voxel_model = voxel_model
+        voxel_model.logger.info(f"Начат расчет метрик вокселей {voxel_model.vm_name}")
+        accumulator = VoxelDataAccumulator(voxel_model)
+        for batch in scan.iter_batches():
+            accumulator.add_batch(batch)
+        self.voxel_structure = accumulator.create_voxel_structure()
+        voxel_model.membership = accumulator.create_membership(self.voxel_structure)
+        voxel_model.logger.info(f"Расчет метрик вокселей завершен")
+        voxel_model.logger.info(f"Начата загрузка метрик вокселей в БД")
+        self.load_voxel_structure_in_db(voxel_model, self.voxel_structure)
+        if voxel_model.membership is not None:
+            voxel_model.membership.save()
+        VoxelModelCache().save_voxel_structure(voxel_model, scan)
+        voxel_model.logger.info(f"Загрузка метрик вокселей в БД завершена")
+
+    @classmethod
+    def load_voxel_structure_in_db(cls, voxel_model, voxel_structure):
+        """
+        Присваивает id непустым вокселям структуры, загружает их в БД и обновляет метрики воксельной модели
+        id вокселя = последний занятый id + 1 + плоский индекс вокселя, как в FastVMSeparator, поэтому id вокселя
+        рассчитывается по его индексу без обращения к БД. Цена - пропуски в нумерации: после каждой модели
+        последний id вырастает на плоский индекс последнего непустого вокселя (до X_count * Y_count * Z_count),
+        а не на число непустых вокселей, и для крупных разреженных 3D моделей id быстро растут
+        (в пределах 64-битного INTEGER SQLite)
+        :param voxel_model: воксельная модель
+        :param voxel_structure: разреженная структура непустых вокселей модели
+        :return: None
+        """
+        voxel_model.voxel_structure = voxel_structure
+        voxel_structure.ids = cls.get_last_voxel_id() + 1 + voxel_structure.keys
+        voxels = cls.get_voxels_db_rows(voxel_structure)
+        cls.load_voxels_in_db(voxels)
+        voxel_model.len = len(voxels)
+        update_voxel_model_in_db_from_voxel_model(voxel_model)
+
+    @staticmethod
+    def get_flat_voxel_indices(voxel_model, batch):
+        """
+        Рассчитывает плоские индексы вокселей (z * Y_count + y) * X_count + x для пакета точек
+        :param voxel_model: воксельная модель
+        :param batch: пакет точек PointBatch
+        :return: массив int64 плоских индексов вокселей
+        """
+        vxl_md_X = np.floor_divide(batch.X - voxel_model.min_X, voxel_model.step).astype(np.int64)
+        vxl_md_Y = np.floor_divide(batch.Y - voxel_model.min_Y, voxel_model.step).astype(np.int64)
+        if voxel_model.is_2d_vxl_mdl:
+            vxl_md_Z = np.zeros(len(batch), dtype=np.int64)
+        else:
+            vxl_md_Z = np.floor_divide(batch.Z - voxel_model.min_Z, voxel_model.step).astype(np.int64)
+        return (vxl_md_Z * voxel_model.Y_count + vxl_md_Y) * voxel_model.X_count + vxl_md_X
+
+    @staticmethod
+    def get_last_voxel_id():
+        """
+        Возвращает последний id в таблице БД voxels
+        :return: последний id вокселя, 0 если таблица пуста
+        """
+        last_voxels_id_stmt = (select(Tables.voxels_db_table.c.id).order_by(desc("id")))
+        with engine.connect() as db_connection:
+            last_voxel_id = db_connection.execute(last_voxels_id_stmt).first()
+        return last_voxel_id[0] if last_voxel_id else 0
+
+    @staticmethod
+    def get_voxels_db_rows(voxel_structure):
+        """
+        Собирает список словарей непустых вокселей для пакетной загрузки в таблицу voxels
+        id вокселей берутся из voxel_structure.ids и равны последнему занятому id + 1 + плоский индекс вокселя,
+        что совпадает с нумерацией полной воксельной структуры в FastVMSeparator
+        :param voxel_structure: разреженная структура непустых вокселей модели
+        :return: список словарей с данными вокселей
+        """
+        vm = voxel_structure.voxel_model
+        occupied = voxel_structure.keys
+        counts = voxel_structure.counts
+        rgb = np.round(voxel_structure.rgb_sums.T / counts).astype(np.int64)
+        vxl_md_X, vxl_md_Y, vxl_md_Z = voxel_structure.unpack_keys(occupied)
+        vxl_keys = VoxelABC.generate_vxl_key(vm.id, occupied)
+        voxels = []
+        for voxel_id, vxl_key, x, y, z, length, r, g, b in zip(voxel_structure.ids.tolist(), vxl_keys.tolist(),
+                                                               vxl_md_X.tolist(), vxl_md_Y.tolist(),
+                                                               vxl_md_Z.tolist(), counts.tolist(), *rgb.tolist()):
+            X, Y, Z = vm.min_X + x * vm.step, vm.min_Y + y * vm.step, vm.min_Z + z * vm.step
+            voxels.append({"id": voxel_id,
+                           "vxl_key": vxl_key,
+                           "X": X,
+                           "Y": Y,
+                           "Z": Z,
+                           "step": vm.step,
+                           "len": length,
+                           "R": r,
+                           "G": g,
+                           "B": b,
+                           "vxl_mdl_id": vm.id
+                           })
+        return voxels
+
+    @staticmethod
+    def load_voxels_in_db(voxels):
+        """
+        Загружает данные вокселей в БД одним пакетом
+        :param voxels: список словарей с данными вокселей
+        :return: None
+        """
+        if not voxels:
+            return
+        with engine.connect() as db_connection:
+            db_connection.execute(Tables.voxels_db_table.insert(), voxels)
+            db_connection.commit()
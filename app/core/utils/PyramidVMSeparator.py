@@ -0,0 +1,30 @@
+from app.core.CONFIG import VOXEL_PYRAMID_MAX_LEVEL
+from app.core.utils.NumpyVMSeparator import NumpyVMSeparator
+from app.core.utils.VoxelPyramid import VoxelPyramid
+
+
+class PyramidVMSeparator:
+    """
+    Сепаратор воксельных моделей на основе воксельной пирамиды
+    Модели с размером вокселя base_step * 2^k, границы вокселей которых совпадают с границами вокселей
+    базовой модели, получаются из пирамиды без чтения точек скана,
+    остальные модели разбиваются резервным сепаратором
+    """
+
+    def __init__(self, base_voxel_model, max_level=VOXEL_PYRAMID_MAX_LEVEL, fallback_separator=None):
+        self.pyramid = VoxelPyramid(base_voxel_model, max_level)
+        self.fallback_separator = NumpyVMSeparator() if fallback_separator is None else fallback_separator
+
+    def separate_voxel_model(self, voxel_model, scan):
+        """
+        Разбивает воксельную модель по уровню пирамиды или резервным сепаратором
+        :param voxel_model: воксельная модель
+        :param scan: скан
+        :return: None
+        """
+        voxel_structure = self.pyramid.create_voxel_structure(voxel_model)
+        if voxel_structure is None:
+            self.fallback_separator.separate_voxel_model(voxel_model, scan)
+            return
+        voxel_model.logger.info(f"Воксели {voxel_model.vm_name} получены из воксельной пирамиды")
+        NumpyVMSeparator.load_voxel_structure_in_db(voxel_model, voxel_structure)
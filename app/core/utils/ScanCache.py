@@ -0,0 +1,161 @@
+import hashlib
+import logging
+
+import numpy as np
+
+from app.core.CONFIG import LOGGER, POINTS_CHUNK_COUNT
+from app.core.base.Point import Point
+from app.core.base.PointBatch import PointBatch
+from app.core.base.Scan import ScanABC, Scan
+from app.core.db.TableInitializer import SingletonMeta
+
+
+class CachedScan(ScanABC):
+    """
+    Скан, активные точки которого один раз прочитаны из БД и хранятся в оперативной памяти массивами numpy
+    При деактивации точек фильтром кеш не перечитывается, а исправляется
+    """
+
+    def __init__(self, scan):
+        super().__init__(scan.scan_name)
+        self.id = scan.id
+        self.points = PointBatch.concatenate(list(scan.iter_batches()))
+        self.version = 0
+        self.__fingerprint = None
+        self.__ids_order = None
+        self.__update_scan_metrics()
+
+    def __iter__(self):
+        for batch in self.iter_batches():
+            for row in zip(batch.ids.tolist(), *batch.xyz.T.tolist(), *batch.rgb.T.tolist()):
+                yield Point.parse_point_from_db_row(row)
+
+    def iter_batches(self, size=POINTS_CHUNK_COUNT):
+        """
+        Перебирает точки скана пакетами без обращения к БД
+        :param size: максимальное количество точек в пакете
+        :return: генератор пакетов точек PointBatch
+        """
+        for start in range(0, len(self.points), size):
+            yield self.points[start:start + size]
+
+    def deactivate_points(self, point_ids):
+        """
+        Удаляет из кеша точки, деактивированные фильтром, и пересчитывает метрики скана
+        :param point_ids: массив id деактивированных точек
+        :return: пакет удаленных из кеша точек PointBatch
+        """
+        deactivated = np.isin(self.points.ids, point_ids)
+        removed_points = self.points[deactivated]
+        if len(removed_points) == 0:
+            return removed_points
+        self.points = self.points[~deactivated]
+        self.version += 1
+        self.__fingerprint = None
+        self.__ids_order = None
+        self.__update_scan_metrics()
+        return removed_points
+
+    def get_points_by_ids(self, point_ids):
+        """
+        Возвращает активные точки скана с заданными id без перебора всего скана
+        :param point_ids: массив id точек, id неактивных точек пропускаются
+        :return: пакет точек PointBatch в порядке возрастания id
+        """
+        order = self.__get_ids_order()
+        sorted_ids = self.points.ids[order]
+        point_ids = np.unique(np.asarray(point_ids, dtype=np.int64))
+        if len(sorted_ids) == 0 or len(point_ids) == 0:
+            return self.points[:0]
+        pos = np.minimum(np.searchsorted(sorted_ids, point_ids), len(sorted_ids) - 1)
+        return self.points[order[pos[sorted_ids[pos] == point_ids]]]
+
+    def get_fingerprint(self):
+        """
+        Возвращает отпечаток содержимого скана - хеш координат и цветов активных точек в порядке их id
+        Рассчитывается по точкам в оперативной памяти один раз для каждой версии набора активных точек
+        :return: шестнадцатеричная строка отпечатка
+        """
+        if self.__fingerprint is None:
+            points = self.points[self.__get_ids_order()]
+            hash_ = hashlib.blake2b(digest_size=20)
+            hash_.update(np.ascontiguousarray(points.xyz, dtype=np.float64).tobytes())
+            hash_.update(np.ascontiguousarray(points.rgb, dtype=np.int64).tobytes())
+            self.__fingerprint = hash_.hexdigest()
+        return self.__fingerprint
+
+    def __get_ids_order(self):
+        """
+        Возвращает порядок точек кеша по возрастанию id, рассчитывается один раз для версии набора точек
+        :return: массив позиций точек
+        """
+        if self.__ids_order is None:
+            ids = self.points.ids
+            if np.any(ids[1:] < ids[:-1]):
+                self.__ids_order = np.argsort(ids, kind="stable")
+            else:
+                self.__ids_order = np.arange(len(ids), dtype=np.int64)
+        return self.__ids_order
+
+    def __update_scan_metrics(self):
+        """
+        Рассчитывает метрики скана по точкам в кеше
+        :return: None
+        """
+        self.len = len(self.points)
+        if self.len == 0:
+            self.min_X, self.max_X = None, None
+            self.min_Y, self.max_Y = None, None
+            self.min_Z, self.max_Z = None, None
+            return
+        min_xyz, max_xyz = self.points.xyz.min(axis=0).tolist(), self.points.xyz.max(axis=0).tolist()
+        self.min_X, self.min_Y, self.min_Z = min_xyz
+        self.max_X, self.max_Y, self.max_Z = max_xyz
+
+
+class ScanCache(metaclass=SingletonMeta):
+    """
+    Кеш активных точек сканов, общий для всех моделей и фильтров
+    Скан читается из БД только при первом обращении к нему
+    """
+    logger = logging.getLogger(LOGGER)
+
+    def __init__(self):
+        self.__scans = {}
+
+    def get_scan(self, scan_id):
+        """
+        Возвращает закешированный скан, при отсутствии - читает его из БД
+        :param scan_id: id скана
+        :return: объект CachedScan
+        """
+        cached_scan = self.__scans.get(scan_id, None)
+        if cached_scan is None:
+            cached_scan = CachedScan(Scan.get_scan_from_id(scan_id))
+            self.__scans[scan_id] = cached_scan
+            self.logger.info(f"Скан {cached_scan.scan_name} загружен в кеш")
+        return cached_scan
+
+    def deactivate_points(self, scan_id, point_ids):
+        """
+        Исправляет закешированный скан после деактивации точек
+        Если скан не закеширован - ничего не делает
+        :param scan_id: id скана
+        :param point_ids: массив id деактивированных точек
+        :return: пакет удаленных из кеша точек PointBatch или None, если скан не закеширован
+        """
+        cached_scan = self.__scans.get(scan_id, None)
+        if cached_scan is not None:
+            return cached_scan.deactivate_points(point_ids)
+        return None
+
+    def invalidate(self, scan_id=None):
+        """
+        Удаляет скан из кеша
+        :param scan_id: id скана, если None - очищается весь кеш
+        :return: None
+        """
+        if scan_id is None:
+            self.__scans.clear()
+        else:
+            self.__scans.pop(scan_id, None)
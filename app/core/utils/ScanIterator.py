@@ -3,8 +3,9 @@ import sqlite3
 
 from sqlalchemy import select, and_
 
-from app.core.CONFIG import DATABASE_NAME
+from app.core.CONFIG import DATABASE_NAME, POINTS_CHUNK_COUNT
 from app.core.base.Point import Point
+from app.core.base.PointBatch import PointBatch
 from app.core.db.start_db import engine, Tables
 
 
@@ -31,6 +32,14 @@ class ScanIterator:
     def __iter__(self):
         return iter(self.__scan_iterator)
 
+    def iter_batches(self, size=POINTS_CHUNK_COUNT):
+        """
+        Перебирает точки скана пакетами
+        :param size: максимальное количество точек в пакете
+        :return: генератор пакетов точек PointBatch
+        """
+        return self.__scan_iterator.iter_batches(size)
+
 
 class BaseScanIterator:
     """
@@ -60,6 +69,19 @@ class BaseScanIterator:
         except StopIteration:
             self.__engine.close()
             raise StopIteration
+
+    def iter_batches(self, size=POINTS_CHUNK_COUNT):
+        """
+        Перебирает точки скана пакетами, не создавая объектов Point
+        :param size: максимальное количество точек в пакете
+        :return: генератор пакетов точек PointBatch
+        """
+        try:
+            while True:
+                rows = self.__query.fetchmany(size)
+                if not rows:
+                    break
+                yield PointBatch.parse_batch_from_db_rows(rows)
         finally:
             self.__engine.close()
 
@@ -69,6 +91,12 @@ class SqlLiteScanIterator:
     Иттератор скана из БД SQLite
     Реализован через стандартную библиотеку sqlite3
     """
+    _select_points = """SELECT p.id, p.X, p.Y, p.Z,
+                        p.R, p.G, p.B
+                        FROM points p
+                        JOIN points_scans ps ON ps.point_id = p.id
+                        WHERE ps.scan_id = (?) AND ps.is_active = True"""
+
     def __init__(self, scan):
         self.__path = os.path.join(".", DATABASE_NAME)
         self.scan_id = scan.id
@@ -76,22 +104,39 @@ class SqlLiteScanIterator:
         self.generator = None
 
     def __iter__(self):
-        connection = sqlite3.connect(self.__path)
-        self.cursor = connection.cursor()
-        self.generator = (Point.parse_point_from_db_row(data) for data in
-                          self.cursor.execute("""SELECT p.id, p.X, p.Y, p.Z,
-                                                    p.R, p.G, p.B
-                                                    FROM points p
-                                                    JOIN points_scans ps ON ps.point_id = p.id
-                                                    WHERE ps.scan_id = (?) AND ps.is_active = True""", (self.scan_id,)))
-
+        self.generator = self.__points_generator()
         return self.generator
 
     def __next__(self):
+        return next(self.generator)
+
+    def __points_generator(self):
+        """
+        Генератор точек скана
+        Соединение с БД закрывается при исчерпании или закрытии генератора
+        :return: генератор объектов Point
+        """
+        connection = sqlite3.connect(self.__path)
         try:
-            return next(self.generator)
-        except StopIteration:
-            self.cursor.close()
-            raise StopIteration
+            self.cursor = connection.cursor()
+            for data in self.cursor.execute(self._select_points, (self.scan_id,)):
+                yield Point.parse_point_from_db_row(data)
+        finally:
+            connection.close()
+
+    def iter_batches(self, size=POINTS_CHUNK_COUNT):
+        """
+        Перебирает точки скана пакетами через fetchmany, не создавая объектов Point
+        :param size: максимальное количество точек в пакете
+        :return: генератор пакетов точек PointBatch
+        """
+        connection = sqlite3.connect(self.__path)
+        try:
+            cursor = connection.execute(self._select_points, (self.scan_id,))
+            while True:
+                rows = cursor.fetchmany(size)
+                if not rows:
+                    break
+                yield PointBatch.parse_batch_from_db_rows(rows)
         finally:
-            self.cursor.close()
+            connection.close()
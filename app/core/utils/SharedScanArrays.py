@@ -0,0 +1,172 @@
+import multiprocessing
+import os
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from app.core.CONFIG import POINTS_CHUNK_COUNT
+from app.core.base.Point import Point
+from app.core.base.PointBatch import PointBatch
+from app.core.base.Scan import ScanABC
+
+
+class SharedScanHandle:
+    """
+    Легкий сериализуемый описатель скана, опубликованного в разделяемой памяти
+    Передается в процессы-обработчики вместо самих точек
+    """
+
+    def __init__(self, scan_id, scan_name, metrics, length, segments):
+        self.owner_pid = os.getpid()
+        self.scan_id = scan_id
+        self.scan_name = scan_name
+        self.metrics = metrics
+        self.len = length
+        self.segments = segments
+
+    def __str__(self):
+        return f"{self.__class__.__name__} [scan_id: {self.scan_id},\tLEN: {self.len}]"
+
+    def __repr__(self):
+        return f"{self.__class__.__name__} [scan_id: {self.scan_id}]"
+
+    def attach(self):
+        """
+        Подключается к массивам скана в разделяемой памяти без копирования данных
+        :return: объект SharedScanView
+        """
+        return SharedScanView(self)
+
+
+class SharedScanView(ScanABC):
+    """
+    Скан, точки которого читаются из массивов в разделяемой памяти
+    Используется в процессах-обработчиках как контекстный менеджер
+    """
+
+    def __init__(self, handle):
+        super().__init__(handle.scan_name)
+        self.id = handle.scan_id
+        self.len = handle.len
+        self.min_X, self.max_X, self.min_Y, self.max_Y, self.min_Z, self.max_Z = handle.metrics
+        self.__shared_memory = []
+        self.arrays = {}
+        for name, (shm_name, dtype, shape) in handle.segments.items():
+            shm = SharedMemory(name=shm_name)
+            if not self.__shares_resource_tracker(handle):
+                # Сегмент создан и будет удален публикующим процессом,
+                # процесс-обработчик не должен регистрировать его для автоматического удаления
+                resource_tracker.unregister(shm._name, "shared_memory")
+            self.__shared_memory.append(shm)
+            self.arrays[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @staticmethod
+    def __shares_resource_tracker(handle):
+        """
+        Проверяет, использует ли текущий процесс тот же resource_tracker, что и публикующий процесс
+        Публикующий процесс и его дочерние процессы (пул процессов) используют общий resource_tracker,
+        в нем нельзя отменять регистрацию сегмента - иначе удаление сегмента публикующим процессом
+        завершится ошибкой в resource_tracker
+        :param handle: описатель скана SharedScanHandle
+        :return: True, если resource_tracker общий
+        """
+        parent = multiprocessing.parent_process()
+        return os.getpid() == handle.owner_pid or (parent is not None and parent.pid == handle.owner_pid)
+
+    def __iter__(self):
+        for batch in self.iter_batches():
+            for row in zip(batch.ids.tolist(), *batch.xyz.T.tolist(), *batch.rgb.T.tolist()):
+                yield Point.parse_point_from_db_row(row)
+
+    def iter_batches(self, size=POINTS_CHUNK_COUNT):
+        """
+        Перебирает активные точки скана пакетами
+        Массивы пакетов копируются из разделяемой памяти только для активных точек
+        :param size: максимальное количество точек в пакете
+        :return: генератор пакетов точек PointBatch
+        """
+        ids, xyz, rgb, active = self.arrays["ids"], self.arrays["xyz"], self.arrays["rgb"], self.arrays["active"]
+        for start in range(0, len(ids), size):
+            mask = active[start:start + size]
+            yield PointBatch(ids[start:start + size][mask],
+                             xyz[start:start + size][mask],
+                             rgb[start:start + size][mask])
+
+    def close(self):
+        """
+        Отключается от сегментов разделяемой памяти
+        Массивы скана после этого использовать нельзя
+        :return: None
+        """
+        self.arrays = {}
+        for shm in self.__shared_memory:
+            shm.close()
+        self.__shared_memory = []
+
+
+class SharedScanArrays:
+    """
+    Публикует массивы точек скана (id, X/Y/Z, RGB, активность) в сегментах multiprocessing.shared_memory
+    Используется как контекстный менеджер - сегменты удаляются при выходе из блока with:
+        with SharedScanArrays(scan) as handle:
+            pool.map(worker, [handle] * n)
+    """
+
+    def __init__(self, scan):
+        self.__scan = scan
+        self.__shared_memory = []
+        self.handle = None
+
+    def __enter__(self):
+        self.publish()
+        return self.handle
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def publish(self):
+        """
+        Копирует точки скана в разделяемую память и создает описатель для процессов-обработчиков
+        :return: объект SharedScanHandle
+        """
+        try:
+            points = self.__scan.points
+        except AttributeError:
+            points = PointBatch.concatenate(list(self.__scan.iter_batches()))
+        arrays = {"ids": points.ids,
+                  "xyz": points.xyz,
+                  "rgb": points.rgb,
+                  "active": np.ones(len(points), dtype=np.bool_)}
+        segments = {}
+        try:
+            for name, array in arrays.items():
+                shm = SharedMemory(create=True, size=max(array.nbytes, 1))
+                self.__shared_memory.append(shm)
+                np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+                segments[name] = (shm.name, array.dtype.str, array.shape)
+        except Exception:
+            self.release()
+            raise
+        metrics = (self.__scan.min_X, self.__scan.max_X,
+                   self.__scan.min_Y, self.__scan.max_Y,
+                   self.__scan.min_Z, self.__scan.max_Z)
+        self.handle = SharedScanHandle(self.__scan.id, self.__scan.scan_name, metrics, len(points), segments)
+        return self.handle
+
+    def release(self):
+        """
+        Закрывает и удаляет все сегменты разделяемой памяти скана
+        :return: None
+        """
+        for shm in self.__shared_memory:
+            shm.close()
+            shm.unlink()
+        self.__shared_memory = []
+        self.handle = None
@@ -0,0 +1,226 @@
+import numpy as np
+
+from app.core.base.Voxel import VoxelLite
+
+
+class SparseVoxelStructure:
+    """
+    Разреженная воксельная структура
+    Хранит только непустые воксели в виде отсортированного массива упакованных int64 ключей
+    key = (z * Y_count + y) * X_count + x и выровненных с ним массивов количества точек и сумм цветов
+    После загрузки вокселей в БД в ids хранятся id вокселей в таблице voxels
+    Пакеты точек, добавленные методом add_points, сводятся по вокселям и объединяются с массивами структуры
+    одной сортировкой при первом обращении к массивам
+    """
+
+    def __init__(self, voxel_model, keys=None, counts=None, rgb_sums=None, ids=None):
+        self.voxel_model = voxel_model
+        self._keys = np.empty(0, dtype=np.int64) if keys is None else keys
+        self._counts = np.empty(0, dtype=np.int64) if counts is None else counts
+        self._rgb_sums = np.empty((0, 3), dtype=np.float64) if rgb_sums is None else rgb_sums
+        self.ids = ids
+        self.__added_batches = []
+
+    @property
+    def keys(self):
+        """
+        Отсортированный массив ключей непустых вокселей
+        :return: массив int64 ключей
+        """
+        self.__merge_added_batches()
+        return self._keys
+
+    @keys.setter
+    def keys(self, keys):
+        self._keys = keys
+
+    @property
+    def counts(self):
+        """
+        Массив количества точек в вокселях, выровненный с keys
+        :return: массив int64
+        """
+        self.__merge_added_batches()
+        return self._counts
+
+    @counts.setter
+    def counts(self, counts):
+        self._counts = counts
+
+    @property
+    def rgb_sums(self):
+        """
+        Массив сумм цветов точек в вокселях формы (n, 3), выровненный с keys
+        :return: массив float64
+        """
+        self.__merge_added_batches()
+        return self._rgb_sums
+
+    @rgb_sums.setter
+    def rgb_sums(self, rgb_sums):
+        self._rgb_sums = rgb_sums
+
+    def __str__(self):
+        return f"{self.__class__.__name__} [vm: {self.voxel_model.vm_name},\tLEN: {len(self)}]"
+
+    def __repr__(self):
+        return f"{self.__class__.__name__} [LEN: {len(self)}]"
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return bool(self.find(np.array([key], dtype=np.int64))[0] >= 0)
+
+    def __iter__(self):
+        """
+        Перебирает непустые воксели структуры в порядке возрастания ключей
+        :return: генератор объектов VoxelLite
+        """
+        for idx in range(len(self)):
+            yield self.get_voxel(idx)
+
+    @classmethod
+    def create_from_dense_counts(cls, voxel_model, counts, rgb_sums):
+        """
+        Создает разреженную структуру из плотных массивов количества точек и сумм цветов
+        :param voxel_model: воксельная модель
+        :param counts: массив количества точек длиной X_count * Y_count * Z_count
+        :param rgb_sums: массив сумм цветов формы (3, X_count * Y_count * Z_count)
+        :return: объект SparseVoxelStructure
+        """
+        keys = np.flatnonzero(counts).astype(np.int64)
+        return cls(voxel_model, keys, counts[keys], np.ascontiguousarray(rgb_sums[:, keys].T))
+
+    def pack_keys(self, x, y, z):
+        """
+        Упаковывает индексы вокселей в int64 ключи
+        :param x: массив индексов по оси X
+        :param y: массив индексов по оси Y
+        :param z: массив индексов по оси Z
+        :return: массив ключей
+        """
+        return (np.asarray(z, dtype=np.int64) * self.voxel_model.Y_count
+                + np.asarray(y, dtype=np.int64)) * self.voxel_model.X_count + np.asarray(x, dtype=np.int64)
+
+    def unpack_keys(self, keys):
+        """
+        Распаковывает int64 ключи в индексы вокселей
+        :param keys: массив ключей
+        :return: массивы индексов (x, y, z)
+        """
+        x = keys % self.voxel_model.X_count
+        y = (keys // self.voxel_model.X_count) % self.voxel_model.Y_count
+        z = keys // (self.voxel_model.X_count * self.voxel_model.Y_count)
+        return x, y, z
+
+    def add_points(self, keys, rgb):
+        """
+        Добавляет в структуру пакет точек
+        Пакет сводится по вокселям и запоминается, объединение с массивами структуры выполняется
+        при обращении к ним, а не для каждого пакета
+        :param keys: массив ключей вокселей, в которые попадают точки
+        :param rgb: массив цветов точек формы (n, 3)
+        :return: None
+        """
+        self.__added_batches.append(self.__reduce_by_keys(keys, np.ones(len(keys), dtype=np.int64), rgb))
+
+    @staticmethod
+    def __reduce_by_keys(keys, counts, rgb_sums):
+        """
+        Суммирует количество точек и суммы цветов по одинаковым ключам
+        :param keys: массив ключей
+        :param counts: массив количества точек
+        :param rgb_sums: массив сумм цветов формы (n, 3)
+        :return: отсортированный массив уникальных ключей и выровненные с ним суммы количества точек и цветов
+        """
+        unique_keys, inverse = np.unique(keys, return_inverse=True)
+        unique_counts = np.bincount(inverse, weights=counts, minlength=len(unique_keys)).astype(np.int64)
+        unique_rgb_sums = np.stack([np.bincount(inverse, weights=rgb_sums[:, color], minlength=len(unique_keys))
+                                    for color in range(3)], axis=1)
+        return unique_keys, unique_counts, unique_rgb_sums
+
+    def __merge_added_batches(self):
+        """
+        Объединяет запомненные пакеты точек с массивами структуры одной сортировкой
+        :return: None
+        """
+        if not self.__added_batches:
+            return
+        batches = [(self._keys, self._counts, self._rgb_sums)] + self.__added_batches
+        self.__added_batches = []
+        self._keys, self._counts, self._rgb_sums = \
+            self.__reduce_by_keys(*(np.concatenate(arrays) for arrays in zip(*batches)))
+
+    def find(self, keys):
+        """
+        Ищет воксели по ключам
+        :param keys: массив ключей
+        :return: массив позиций вокселей в структуре, -1 для отсутствующих (пустых) вокселей
+        """
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(self.keys) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        idx = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return np.where(self.keys[idx] == keys, idx, -1)
+
+    def get_neighbour_keys(self, keys, radius=1):
+        """
+        Рассчитывает ключи соседних вокселей в кубе (2 * radius + 1)^3 вокруг каждого вокселя
+        :param keys: массив ключей центральных вокселей
+        :param radius: радиус окрестности в вокселях
+        :return: массив формы (len(keys), (2 * radius + 1)^3 - 1), -1 для соседей за пределами модели
+        """
+        x, y, z = self.unpack_keys(np.asarray(keys, dtype=np.int64))
+        offsets = np.arange(-radius, radius + 1)
+        dz, dy, dx = [offset.ravel() for offset in np.meshgrid(offsets, offsets, offsets, indexing="ij")]
+        not_center = (dx != 0) | (dy != 0) | (dz != 0)
+        dx, dy, dz = dx[not_center], dy[not_center], dz[not_center]
+        nx, ny, nz = x[:, None] + dx, y[:, None] + dy, z[:, None] + dz
+        inside = (nx >= 0) & (nx < self.voxel_model.X_count) & \
+                 (ny >= 0) & (ny < self.voxel_model.Y_count) & \
+                 (nz >= 0) & (nz < self.voxel_model.Z_count)
+        return np.where(inside, self.pack_keys(nx, ny, nz), -1)
+
+    def get_neighbours(self, key, radius=1):
+        """
+        Возвращает непустые соседние воксели вокселя с ключом key
+        :param key: ключ центрального вокселя
+        :param radius: радиус окрестности в вокселях
+        :return: список объектов VoxelLite
+        """
+        neighbour_keys = self.get_neighbour_keys(np.array([key], dtype=np.int64), radius)[0]
+        neighbour_keys = neighbour_keys[neighbour_keys >= 0]
+        return [self.get_voxel(idx) for idx in self.find(neighbour_keys) if idx >= 0]
+
+    def get_voxel(self, idx):
+        """
+        Создает объект вокселя по его позиции в структуре
+        :param idx: позиция вокселя в структуре
+        :return: объект VoxelLite
+        """
+        vm = self.voxel_model
+        x, y, z = [int(value) for value in self.unpack_keys(self.keys[idx])]
+        voxel = VoxelLite(vm.min_X + x * vm.step, vm.min_Y + y * vm.step, vm.min_Z + z * vm.step, vm.step, vm.id)
+        voxel.vxl_key = voxel.generate_vxl_key(vm.id, int(self.keys[idx]))
+        if self.ids is not None:
+            voxel.id = int(self.ids[idx])
+        voxel.len = int(self.counts[idx])
+        if voxel.len > 0:
+            voxel.R, voxel.G, voxel.B = (self.rgb_sums[idx] / voxel.len).tolist()
+        return voxel
+
+    def remove_points(self, keys, rgb):
+        """
+        Вычитает из метрик вокселей пакет точек (например, деактивированных фильтром)
+        :param keys: массив ключей вокселей, в которые попадают точки
+        :param rgb: массив цветов точек формы (n, 3)
+        :return: массив позиций вокселей, метрики которых изменились
+        """
+        idx = self.find(keys)
+        inside = idx >= 0
+        idx, rgb = idx[inside], rgb[inside]
+        self.counts = self.counts - np.bincount(idx, minlength=len(self))
+        for color in range(3):
+            self.rgb_sums[:, color] -= np.bincount(idx, weights=rgb[:, color], minlength=len(self))
+        return np.unique(idx)
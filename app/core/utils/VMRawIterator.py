@@ -30,7 +30,7 @@ class VMRawIterator:
             voxel.id = row["id"]
             voxel.R, voxel.G, voxel.B = row["R"], row["G"], row["B"]
             voxel.len = row["len"]
-            voxel.vxl_name = row["vxl_name"]
+            voxel.vxl_key = row["vxl_key"]
             return voxel
         except StopIteration:
             self.__engine.close()
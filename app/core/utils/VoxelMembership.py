@@ -0,0 +1,146 @@
+import numpy as np
+from sqlalchemy import select, delete
+
+from app.core.db.start_db import Tables, engine
+
+
+class VoxelMembership:
+    """
+    Принадлежность точек скана вокселям воксельной модели
+    Хранит отсортированные id точек и выровненный с ними компактный uint32 индекс вокселя -
+    позицию вокселя в отсортированном массиве ключей непустых вокселей модели voxel_keys
+    Позволяет группировать точки по ячейкам без пересчета координат в индексы
+    """
+
+    def __init__(self, vxl_mdl_id, point_ids, voxel_idx, voxel_keys):
+        self.vxl_mdl_id = vxl_mdl_id
+        self.point_ids = point_ids
+        self.voxel_idx = voxel_idx
+        self.voxel_keys = voxel_keys
+        self.__voxel_order = None
+        self.__voxel_starts = None
+
+    def __str__(self):
+        return f"{self.__class__.__name__} [vxl_mdl_id: {self.vxl_mdl_id},\tpoints: {len(self.point_ids)}\t" \
+               f"voxels: {len(self.voxel_keys)}]"
+
+    def __repr__(self):
+        return f"{self.__class__.__name__} [vxl_mdl_id: {self.vxl_mdl_id}]"
+
+    def __len__(self):
+        return len(self.point_ids)
+
+    @classmethod
+    def create_from_flat_indices(cls, voxel_structure, point_ids, flat_idx):
+        """
+        Создает принадлежность точек вокселям по рассчитанным при разбиении плоским индексам вокселей
+        :param voxel_structure: разреженная структура непустых вокселей модели
+        :param point_ids: список массивов id точек (по одному на пакет)
+        :param flat_idx: список массивов плоских индексов вокселей точек (по одному на пакет)
+        :return: объект VoxelMembership
+        """
+        point_ids = np.concatenate(point_ids) if point_ids else np.empty(0, dtype=np.int64)
+        flat_idx = np.concatenate(flat_idx) if flat_idx else np.empty(0, dtype=np.int64)
+        order = np.argsort(point_ids, kind="stable")
+        voxel_idx = np.searchsorted(voxel_structure.keys, flat_idx[order]).astype(np.uint32)
+        return cls(voxel_structure.voxel_model.id, point_ids[order], voxel_idx, voxel_structure.keys.copy())
+
+    def lookup(self, point_ids):
+        """
+        Возвращает индексы вокселей для точек
+        :param point_ids: массив id точек
+        :return: массив int64 индексов вокселей в voxel_keys, -1 для точек не входящих в модель
+        """
+        point_ids = np.asarray(point_ids, dtype=np.int64)
+        if len(self.point_ids) == 0:
+            return np.full(len(point_ids), -1, dtype=np.int64)
+        pos = np.minimum(np.searchsorted(self.point_ids, point_ids), len(self.point_ids) - 1)
+        return np.where(self.point_ids[pos] == point_ids, self.voxel_idx[pos].astype(np.int64), -1)
+
+    def get_voxel_keys(self, point_ids):
+        """
+        Возвращает плоские ключи вокселей (z * Y_count + y) * X_count + x для точек
+        :param point_ids: массив id точек
+        :return: массив int64 ключей вокселей, -1 для точек не входящих в модель
+        """
+        voxel_idx = self.lookup(point_ids)
+        return np.where(voxel_idx >= 0, self.voxel_keys[np.maximum(voxel_idx, 0)], -1)
+
+    def get_point_ids(self, voxel_keys):
+        """
+        Возвращает id точек, входящих в воксели с заданными плоскими ключами
+        Порядок точек по вокселям рассчитывается одной сортировкой при первом обращении
+        :param voxel_keys: массив плоских ключей вокселей
+        :return: массив int64 id точек, включая деактивированные после разбиения модели
+        """
+        if self.__voxel_order is None:
+            self.__voxel_order = np.argsort(self.voxel_idx, kind="stable")
+            self.__voxel_starts = np.searchsorted(self.voxel_idx[self.__voxel_order],
+                                                  np.arange(len(self.voxel_keys) + 1))
+        voxel_keys = np.asarray(voxel_keys, dtype=np.int64)
+        if len(self.voxel_keys) == 0 or len(voxel_keys) == 0:
+            return np.empty(0, dtype=np.int64)
+        voxel_idx = np.minimum(np.searchsorted(self.voxel_keys, voxel_keys), len(self.voxel_keys) - 1)
+        voxel_idx = voxel_idx[self.voxel_keys[voxel_idx] == voxel_keys]
+        starts, ends = self.__voxel_starts[voxel_idx], self.__voxel_starts[voxel_idx + 1]
+        lengths = ends - starts
+        positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return self.point_ids[self.__voxel_order[positions]]
+
+    def save(self, db_connection=None):
+        """
+        Сохраняет принадлежность точек вокселям в БД
+        :param db_connection: Открытое соединение с БД
+        :return: None
+        """
+        stmt = Tables.voxel_memberships_db_table.insert().values(vxl_mdl_id=self.vxl_mdl_id,
+                                                                 point_ids=self.point_ids.tobytes(),
+                                                                 voxel_idx=self.voxel_idx.tobytes(),
+                                                                 voxel_keys=self.voxel_keys.tobytes())
+        if db_connection is None:
+            with engine.connect() as db_connection:
+                db_connection.execute(stmt)
+                db_connection.commit()
+        else:
+            db_connection.execute(stmt)
+            db_connection.commit()
+
+    @classmethod
+    def load(cls, vxl_mdl_id, db_connection=None):
+        """
+        Загружает принадлежность точек вокселям воксельной модели из БД
+        :param vxl_mdl_id: id воксельной модели
+        :param db_connection: Открытое соединение с БД
+        :return: объект VoxelMembership или None, если для модели она не сохранялась
+        """
+        select_ = select(Tables.voxel_memberships_db_table) \
+            .where(Tables.voxel_memberships_db_table.c.vxl_mdl_id == vxl_mdl_id)
+        if db_connection is None:
+            with engine.connect() as db_connection:
+                db_data = db_connection.execute(select_).mappings().first()
+        else:
+            db_data = db_connection.execute(select_).mappings().first()
+        if db_data is None:
+            return None
+        return cls(vxl_mdl_id,
+                   np.frombuffer(db_data["point_ids"], dtype=np.int64),
+                   np.frombuffer(db_data["voxel_idx"], dtype=np.uint32),
+                   np.frombuffer(db_data["voxel_keys"], dtype=np.int64))
+
+    @staticmethod
+    def delete(vxl_mdl_id, db_connection=None):
+        """
+        Удаляет принадлежность точек вокселям воксельной модели из БД
+        :param vxl_mdl_id: id воксельной модели
+        :param db_connection: Открытое соединение с БД
+        :return: None
+        """
+        stmt = delete(Tables.voxel_memberships_db_table) \
+            .where(Tables.voxel_memberships_db_table.c.vxl_mdl_id == vxl_mdl_id)
+        if db_connection is None:
+            with engine.connect() as db_connection:
+                db_connection.execute(stmt)
+                db_connection.commit()
+        else:
+            db_connection.execute(stmt)
+            db_connection.commit()
@@ -0,0 +1,153 @@
+import hashlib
+import logging
+import os
+
+import numpy as np
+
+from app.core.CONFIG import LOGGER, DATABASE_NAME, VOXEL_MODEL_CACHE_DIR, VOXEL_MODEL_CACHE_MAX_SIZE
+from app.core.db.TableInitializer import SingletonMeta
+from app.core.utils.ScanCache import CachedScan, ScanCache
+from app.core.utils.SparseVoxelStructure import SparseVoxelStructure
+from app.core.utils.VoxelMembership import VoxelMembership
+
+# Каталог кеша по умолчанию находится рядом с файлом БД, путь к которому движок БД определяет при импорте
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(DATABASE_NAME)), "voxel_model_cache")
+
+
+class VoxelModelCache(metaclass=SingletonMeta):
+    """
+    Дисковый кеш разбитых воксельных моделей в сжатых файлах NPZ
+    Ключ кеша - отпечаток содержимого скана (хеш координат и цветов его активных точек), размер вокселя,
+    dx, dy и тип модели, поэтому кеш переживает пересоздание БД и не дает устаревших попаданий
+    для измененного скана
+    Вместе с вокселями сохраняются индексы вокселей точек скана (VoxelMembership), которые при загрузке
+    сопоставляются с текущими id точек по порядку их возрастания
+    Размер каталога кеша ограничен max_size, при превышении удаляются файлы,
+    к которым дольше всего не обращались; при max_size = 0 кеш отключен
+    """
+    logger = logging.getLogger(LOGGER)
+
+    def __init__(self, cache_dir=VOXEL_MODEL_CACHE_DIR, max_size=VOXEL_MODEL_CACHE_MAX_SIZE):
+        self.cache_dir = DEFAULT_CACHE_DIR if cache_dir is None else cache_dir
+        self.max_size = max_size
+
+    @staticmethod
+    def get_scan_fingerprint(scan):
+        """
+        Возвращает отпечаток содержимого скана, рассчитанный по его точкам в ScanCache
+        :param scan: скан
+        :return: строка отпечатка
+        """
+        cached_scan = scan if isinstance(scan, CachedScan) else ScanCache().get_scan(scan.id)
+        return cached_scan.get_fingerprint()
+
+    def get_cache_path(self, voxel_model, scan):
+        """
+        Возвращает путь к файлу кеша воксельной модели
+        :param voxel_model: воксельная модель
+        :param scan: скан по которому строится модель
+        :return: путь к файлу NPZ
+        """
+        vm_type = "2D" if voxel_model.is_2d_vxl_mdl else "3D"
+        key = f"{self.get_scan_fingerprint(scan)}_{vm_type}_st:{voxel_model.step}_" \
+              f"dx:{voxel_model.dx}_dy:{voxel_model.dy}"
+        return os.path.join(self.cache_dir, f"{hashlib.blake2b(key.encode(), digest_size=20).hexdigest()}.npz")
+
+    def load_voxel_structure(self, voxel_model, scan):
+        """
+        Загружает из кеша структуру непустых вокселей модели и принадлежность точек скана вокселям
+        :param voxel_model: воксельная модель с рассчитанными границами и id
+        :param scan: скан по которому строится модель
+        :return: кортеж (SparseVoxelStructure, VoxelMembership или None, если она не сохранялась)
+        или None, если модели нет в кеше
+        """
+        if self.max_size <= 0:
+            return None
+        path = self.get_cache_path(voxel_model, scan)
+        if not os.path.isfile(path):
+            return None
+        try:
+            with np.load(path) as data:
+                shape = tuple(data["shape"].tolist())
+                if shape != (voxel_model.X_count, voxel_model.Y_count, voxel_model.Z_count):
+                    return None
+                voxel_structure = SparseVoxelStructure(voxel_model, data["keys"], data["counts"], data["rgb_sums"])
+                voxel_idx = data["voxel_idx"] if "voxel_idx" in data.files else None
+        except (OSError, ValueError, KeyError) as error:
+            self.logger.warning(f"Файл кеша {path} поврежден и будет удален: {error}")
+            self.__remove_file(path)
+            return None
+        membership = None
+        if voxel_idx is not None:
+            cached_scan = scan if isinstance(scan, CachedScan) else ScanCache().get_scan(scan.id)
+            membership = VoxelMembership(voxel_model.id, np.sort(cached_scan.points.ids), voxel_idx,
+                                         voxel_structure.keys.copy())
+        os.utime(path)
+        self.logger.info(f"Воксельная модель {voxel_model.vm_name} загружена из кеша")
+        return voxel_structure, membership
+
+    def save_voxel_structure(self, voxel_model, scan):
+        """
+        Сохраняет в кеш структуру непустых вокселей разбитой модели и принадлежность точек вокселям
+        :param voxel_model: разбитая воксельная модель
+        :param scan: скан по которому строилась модель
+        :return: None
+        """
+        if self.max_size <= 0 or voxel_model.voxel_structure is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.get_cache_path(voxel_model, scan)
+        temp_path = f"{path[:-len('.npz')]}.tmp.npz"
+        voxel_structure = voxel_model.voxel_structure
+        data = {"shape": np.array([voxel_model.X_count, voxel_model.Y_count, voxel_model.Z_count]),
+                "keys": voxel_structure.keys,
+                "counts": voxel_structure.counts,
+                "rgb_sums": voxel_structure.rgb_sums}
+        if voxel_model.membership is not None:
+            data["voxel_idx"] = voxel_model.membership.voxel_idx
+        np.savez_compressed(temp_path, **data)
+        os.replace(temp_path, path)
+        self.__evict()
+
+    def clear(self):
+        """
+        Удаляет все файлы кеша
+        :return: None
+        """
+        for path, _, _ in self.__get_cache_files():
+            self.__remove_file(path)
+
+    def __evict(self):
+        """
+        Удаляет файлы, к которым дольше всего не обращались, пока размер кеша превышает max_size
+        :return: None
+        """
+        cache_files = sorted(self.__get_cache_files(), key=lambda cache_file: cache_file[1])
+        cache_size = sum(size for _, _, size in cache_files)
+        for path, _, size in cache_files:
+            if cache_size <= self.max_size:
+                break
+            self.__remove_file(path)
+            cache_size -= size
+            self.logger.info(f"Файл {path} удален из кеша воксельных моделей")
+
+    def __get_cache_files(self):
+        """
+        Возвращает файлы кеша
+        :return: список кортежей (путь, время последнего обращения, размер)
+        """
+        if not os.path.isdir(self.cache_dir):
+            return []
+        cache_files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(".npz"):
+                stat = entry.stat()
+                cache_files.append((entry.path, stat.st_mtime, stat.st_size))
+        return cache_files
+
+    @staticmethod
+    def __remove_file(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,134 @@
+import numpy as np
+
+from app.core.CONFIG import VOXEL_PYRAMID_MAX_LEVEL
+from app.core.utils.SparseVoxelStructure import SparseVoxelStructure
+
+
+class VoxelPyramid:
+    """
+    Многоуровневая воксельная пирамида, построенная по базовой (самой мелкой) воксельной модели
+    Уровень k содержит воксели размером base_step * 2^k с началом в начале базовой модели,
+    каждый уровень агрегируется из предыдущего сдвигом целочисленных индексов вокселей на 1 бит
+    Позволяет без повторного чтения точек получать воксели моделей того же скана
+    с размером вокселя base_step * 2^k, границы которых совпадают с границами вокселей базовой модели
+    """
+
+    def __init__(self, base_voxel_model, max_level=VOXEL_PYRAMID_MAX_LEVEL):
+        self.base_voxel_model = base_voxel_model
+        self.base_scan_id = base_voxel_model.base_scan_id
+        self.max_level = max_level
+        self.levels = []
+        self.points_count = 0
+        self.__create_levels()
+
+    def __str__(self):
+        return f"{self.__class__.__name__} [base_vm: {self.base_voxel_model.vm_name},\tlevels: {len(self.levels)}]"
+
+    def __repr__(self):
+        return f"{self.__class__.__name__} [levels: {len(self.levels)}]"
+
+    def __len__(self):
+        return len(self.levels)
+
+    def __create_levels(self):
+        """
+        Строит уровни пирамиды от базового к более крупным
+        Уровень хранится массивами индексов (x, y, z), количества точек и сумм цветов непустых вокселей
+        :return: None
+        """
+        base_vm = self.base_voxel_model
+        voxel_structure = base_vm.voxel_structure
+        if voxel_structure is None:
+            voxel_arrays = base_vm.load_arrays()
+            level = (voxel_arrays.ix, voxel_arrays.iy, voxel_arrays.iz,
+                     voxel_arrays.len, (voxel_arrays.rgb * voxel_arrays.len[:, None]).astype(np.float64))
+        else:
+            x, y, z = voxel_structure.unpack_keys(voxel_structure.keys)
+            level = (x, y, z, voxel_structure.counts, voxel_structure.rgb_sums)
+        not_empty = level[3] > 0
+        self.levels = [tuple(array[not_empty] for array in level)]
+        self.points_count = int(self.levels[0][3].sum())
+        for _ in range(self.max_level):
+            x, y, z, counts, rgb_sums = self.levels[-1]
+            self.levels.append(self.aggregate(x >> 1, y >> 1, z if base_vm.is_2d_vxl_mdl else z >> 1,
+                                              counts, rgb_sums))
+
+    @staticmethod
+    def aggregate(x, y, z, counts, rgb_sums):
+        """
+        Объединяет метрики вокселей с совпадающими индексами
+        :param x: массив индексов по оси X
+        :param y: массив индексов по оси Y
+        :param z: массив индексов по оси Z
+        :param counts: массив количества точек
+        :param rgb_sums: массив сумм цветов формы (n, 3)
+        :return: кортеж массивов (x, y, z, counts, rgb_sums) непустых вокселей
+        """
+        xyz, inverse = np.unique(np.stack([z, y, x], axis=1), axis=0, return_inverse=True)
+        inverse = inverse.ravel()
+        new_counts = np.bincount(inverse, weights=counts, minlength=len(xyz)).astype(np.int64)
+        new_rgb_sums = np.stack([np.bincount(inverse, weights=rgb_sums[:, color], minlength=len(xyz))
+                                 for color in range(3)], axis=1)
+        return xyz[:, 2], xyz[:, 1], xyz[:, 0], new_counts, new_rgb_sums
+
+    def get_level_shift(self, voxel_model):
+        """
+        Проверяет, может ли воксельная модель быть получена из пирамиды
+        :param voxel_model: воксельная модель с рассчитанными границами
+        :return: кортеж (уровень, смещения начала модели (x, y, z) в вокселях базовой модели)
+        или None, если модель не может быть получена из пирамиды
+        """
+        return self.calk_level_shift(self.base_voxel_model, voxel_model, self.max_level)
+
+    @staticmethod
+    def calk_level_shift(base_vm, voxel_model, max_level):
+        """
+        Проверяет, может ли воксельная модель быть получена из пирамиды базовой модели, не строя пирамиду
+        :param base_vm: базовая воксельная модель пирамиды
+        :param voxel_model: воксельная модель с рассчитанными границами
+        :param max_level: количество уровней пирамиды над базовым
+        :return: кортеж (уровень, смещения начала модели (x, y, z) в вокселях базовой модели)
+        или None, если модель не может быть получена из пирамиды
+        """
+        if voxel_model.base_scan_id != base_vm.base_scan_id or voxel_model.is_2d_vxl_mdl != base_vm.is_2d_vxl_mdl:
+            return None
+        ratio = voxel_model.step / base_vm.step
+        level = int(round(np.log2(ratio))) if ratio >= 1 else -1
+        if level < 0 or level > max_level or not np.isclose(ratio, 2 ** level):
+            return None
+        offsets = [(voxel_model.min_X - base_vm.min_X) / base_vm.step,
+                   (voxel_model.min_Y - base_vm.min_Y) / base_vm.step,
+                   0.0 if base_vm.is_2d_vxl_mdl else (voxel_model.min_Z - base_vm.min_Z) / base_vm.step]
+        if not all(np.isclose(offset, round(offset), rtol=0.0, atol=1e-6) for offset in offsets):
+            return None
+        return level, tuple(int(round(offset)) for offset in offsets)
+
+    def create_voxel_structure(self, voxel_model):
+        """
+        Создает структуру непустых вокселей модели из ближайшего подходящего уровня пирамиды
+        Используется самый крупный уровень, границы вокселей которого совпадают с границами вокселей модели
+        :param voxel_model: воксельная модель с рассчитанными границами
+        :return: объект SparseVoxelStructure или None, если модель не может быть получена из пирамиды
+        """
+        level_shift = self.get_level_shift(voxel_model)
+        if level_shift is None:
+            return None
+        level, offsets = level_shift
+        source_level = level
+        while source_level > 0 and any(offset % (2 ** source_level) for offset in offsets):
+            source_level -= 1
+        x, y, z, counts, rgb_sums = self.levels[source_level]
+        shift = level - source_level
+        x = (x - (offsets[0] >> source_level)) >> shift
+        y = (y - (offsets[1] >> source_level)) >> shift
+        if not voxel_model.is_2d_vxl_mdl:
+            z = (z - (offsets[2] >> source_level)) >> shift
+        if shift > 0:
+            x, y, z, counts, rgb_sums = self.aggregate(x, y, z, counts, rgb_sums)
+        voxel_structure = SparseVoxelStructure(voxel_model)
+        keys = voxel_structure.pack_keys(x, y, z)
+        order = np.argsort(keys, kind="stable")
+        voxel_structure.keys = keys[order]
+        voxel_structure.counts = counts[order]
+        voxel_structure.rgb_sums = rgb_sums[order]
+        return voxel_structure
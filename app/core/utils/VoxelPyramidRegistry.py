@@ -0,0 +1,63 @@
+import logging
+
+from app.core.CONFIG import LOGGER, VOXEL_PYRAMID_MAX_LEVEL
+from app.core.db.TableInitializer import SingletonMeta
+from app.core.utils.PyramidVMSeparator import PyramidVMSeparator
+from app.core.utils.VoxelPyramid import VoxelPyramid
+
+
+class VoxelPyramidRegistry(metaclass=SingletonMeta):
+    """
+    Реестр разбитых воксельных моделей, по которым строятся воксельные пирамиды
+    Новая воксельная модель того же скана с размером вокселя base_step * 2^k, границы вокселей которой совпадают
+    с границами вокселей зарегистрированной модели, разбивается сепаратором PyramidVMSeparator без чтения точек скана
+    Пирамида строится при первом подходящем запросе; базовые модели, количество точек в вокселях которых
+    не совпадает с количеством точек скана (после деактивации точек), не используются
+    """
+    logger = logging.getLogger(LOGGER)
+
+    def __init__(self, max_level=VOXEL_PYRAMID_MAX_LEVEL):
+        self.max_level = max_level
+        self.__base_models = {}
+
+    def register(self, voxel_model):
+        """
+        Регистрирует разбитую воксельную модель как возможную базовую модель пирамиды
+        Модели без разреженной воксельной структуры (загруженные из БД) не регистрируются
+        :param voxel_model: воксельная модель
+        :return: None
+        """
+        if voxel_model.voxel_structure is None:
+            return
+        self.__base_models.setdefault(voxel_model.base_scan_id, {})[voxel_model.id] = [voxel_model, None]
+
+    def get_separator(self, voxel_model, scan):
+        """
+        Возвращает сепаратор по пирамиде зарегистрированной модели, из которой может быть получена воксельная модель
+        Из подходящих базовых моделей выбирается модель с самым крупным вокселем
+        :param voxel_model: воксельная модель с рассчитанными границами
+        :param scan: скан, по которому строится воксельная модель
+        :return: объект PyramidVMSeparator или None, если подходящей базовой модели нет
+        """
+        candidates = [base for base in self.__base_models.get(scan.id, {}).values()
+                      if base[0].id != voxel_model.id
+                      and int(base[0].voxel_structure.counts.sum()) == len(scan)
+                      and VoxelPyramid.calk_level_shift(base[0], voxel_model, self.max_level) is not None]
+        if not candidates:
+            return None
+        base = max(candidates, key=lambda candidate: candidate[0].step)
+        if base[1] is None or base[1].pyramid.points_count != len(scan):
+            base[1] = PyramidVMSeparator(base[0], self.max_level)
+            self.logger.info(f"Построена воксельная пирамида по модели {base[0].vm_name}")
+        return base[1]
+
+    def invalidate(self, scan_id=None):
+        """
+        Удаляет базовые модели скана из реестра
+        :param scan_id: id скана, если None - очищается весь реестр
+        :return: None
+        """
+        if scan_id is None:
+            self.__base_models.clear()
+        else:
+            self.__base_models.pop(scan_id, None)
@@ -0,0 +1,84 @@
+"""
+Сравнение поячеечного и пакетного сохранения/загрузки ячеек сегментированных моделей в таблицах dem_cells / bi_cells
+Запуск из корня проекта:
+    python -m benchmarks.cell_persistence path/to/scan.txt [step]
+"""
+import os
+import sys
+import time
+
+from sqlalchemy import delete
+
+from app.core.CONFIG import DATABASE_NAME
+from app.core.base.Scan import Scan
+from app.core.db.start_db import create_db, engine
+from app.core.models.BIModel import BiModel
+from app.core.models.VoxelModel import VoxelModel
+from app.core.utils.ScanCache import ScanCache
+
+
+def per_cell_round_trip(model, db_connection):
+    """
+    Сохраняет и загружает ячейки модели отдельными запросами для каждой ячейки
+    :param model: сегментированная модель
+    :param db_connection: открытое соединение с БД
+    :return: время сохранения и загрузки
+    """
+    t0 = time.perf_counter()
+    for cell in model:
+        cell._save_cell_data_in_db(db_connection)
+    db_connection.commit()
+    save_time = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for cell in model:
+        cell._load_cell_data_from_db(db_connection)
+    return save_time, time.perf_counter() - t0
+
+
+def batched_round_trip(model, db_connection):
+    """
+    Сохраняет и загружает ячейки модели одним запросом на модель
+    :param model: сегментированная модель
+    :param db_connection: открытое соединение с БД
+    :return: время сохранения и загрузки
+    """
+    t0 = time.perf_counter()
+    model._save_cell_data_in_db(db_connection)
+    db_connection.commit()
+    save_time = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    model._load_cell_data_from_db(db_connection)
+    return save_time, time.perf_counter() - t0
+
+
+def clear_cells(model, db_connection):
+    db_table = model.cell_type.db_table
+    db_connection.execute(delete(db_table).where(db_table.c.base_model_id == model.id))
+    db_connection.commit()
+
+
+def main(file_name, step=5):
+    create_db()
+    scan = Scan(os.path.splitext(os.path.basename(file_name))[0])
+    scan.load_scan_from_file(file_name)
+    model = BiModel(VoxelModel(ScanCache().get_scan(scan.id), step), "DEM")
+
+    with engine.connect() as db_connection:
+        clear_cells(model, db_connection)
+        per_cell_save, per_cell_load = per_cell_round_trip(model, db_connection)
+        clear_cells(model, db_connection)
+        batched_save, batched_load = batched_round_trip(model, db_connection)
+        clear_cells(model, db_connection)
+
+    print(f"Ячеек в модели {model.model_name}: {len(model)}")
+    print(f"Сохранение: поячеечно {per_cell_save:.3f} с, пакетно {batched_save:.3f} с, "
+          f"ускорение {per_cell_save / batched_save:.1f}x")
+    print(f"Загрузка:   поячеечно {per_cell_load:.3f} с, пакетно {batched_load:.3f} с, "
+          f"ускорение {per_cell_load / batched_load:.1f}x")
+    ScanCache().invalidate()
+    engine.dispose()
+    os.remove(os.path.join(".", DATABASE_NAME))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1], float(sys.argv[2]) if len(sys.argv) > 2 else 5)
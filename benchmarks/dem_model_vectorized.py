@@ -0,0 +1,76 @@
+"""
+Сравнение векторного расчета DemModel с поточечным расчетом (средние высоты и СКП в ячейках)
+Запуск из корня проекта:
+    python -m benchmarks.dem_model_vectorized path/to/scan.txt [step]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+from app.core.CONFIG import DATABASE_NAME
+from app.core.base.Scan import Scan
+from app.core.db.start_db import create_db, engine
+from app.core.models.DemModel import DemModel
+from app.core.models.VoxelModel import VoxelModel
+from app.core.utils.ScanCache import ScanCache
+
+
+def point_by_point_dem(dem_model, scan):
+    """
+    Поточечный расчет средних высот и СКП в ячейках DEM модели
+    (два прохода по скану с обновлением скользящего среднего, как в исходной реализации DemModel)
+    :param dem_model: DEM модель, ячейки которой используются для поиска
+    :param scan: скан
+    :return: словари {id вокселя ячейки: средняя высота} и {id вокселя ячейки: СКП}
+    """
+    avr_z, lens, vv = {}, {}, {}
+    for point in scan:
+        cell = dem_model.get_model_element_for_point(point)
+        if cell is None:
+            continue
+        key = cell.voxel.id
+        lens[key] = lens.get(key, 0) + 1
+        avr_z[key] = (avr_z.get(key, 0) * (lens[key] - 1) + point.Z) / lens[key]
+    for point in scan:
+        cell = dem_model.get_model_element_for_point(point)
+        if cell is None:
+            continue
+        key = cell.voxel.id
+        vv[key] = vv.get(key, 0) + (point.Z - avr_z[key]) ** 2
+    mse = {cell.voxel.id: (vv[cell.voxel.id] / cell.r) ** 0.5 for cell in dem_model
+           if cell.r > 0 and cell.voxel.id in vv}
+    return avr_z, mse
+
+
+def main(file_name, step=5):
+    create_db()
+    scan = Scan(os.path.splitext(os.path.basename(file_name))[0])
+    scan.load_scan_from_file(file_name)
+    cached_scan = ScanCache().get_scan(scan.id)
+    voxel_model = VoxelModel(cached_scan, step)
+
+    t0 = time.perf_counter()
+    dem_model = DemModel(voxel_model)
+    vectorized_time = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    avr_z, mse = point_by_point_dem(dem_model, cached_scan)
+    point_time = time.perf_counter() - t0
+
+    avr_z_diff = max(abs(cell.avr_z - avr_z[cell.voxel.id]) for cell in dem_model if cell.voxel.id in avr_z)
+    mse_diff = max(abs(cell.mse - mse[cell.voxel.id]) for cell in dem_model if cell.voxel.id in mse)
+    print(f"Точек в скане: {len(cached_scan)}, ячеек: {len(dem_model)}")
+    print(f"Поточечный расчет:          {point_time:.3f} с")
+    print(f"Векторный расчет (с БД):    {vectorized_time:.3f} с")
+    print(f"Ускорение: {point_time / vectorized_time:.1f}x")
+    print(f"Макс. расхождение средних высот: {avr_z_diff:.3e}, СКП: {mse_diff:.3e}")
+    assert np.isclose(avr_z_diff, 0, atol=1e-6) and np.isclose(mse_diff, 0, atol=1e-6)
+    ScanCache().invalidate()
+    engine.dispose()
+    os.remove(os.path.join(".", DATABASE_NAME))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1], float(sys.argv[2]) if len(sys.argv) > 2 else 5)
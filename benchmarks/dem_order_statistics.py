@@ -0,0 +1,82 @@
+"""
+Сравнение расчета процентилей высот в ячейках DEM модели одной сортировкой (CellOrderStatistics)
+с расчетом по спискам высот отдельных ячеек
+Запуск из корня проекта:
+    python -m benchmarks.dem_order_statistics path/to/scan.txt [step]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+from app.core.CONFIG import DATABASE_NAME
+from app.core.base.Scan import Scan
+from app.core.db.start_db import create_db, engine
+from app.core.models.DemModel import DemModel
+from app.core.models.VoxelModel import VoxelModel
+from app.core.utils.CellOrderStatistics import CellOrderStatistics
+from app.core.utils.ScanCache import ScanCache
+
+
+def per_cell_percentiles(cells_count, cell_idx, values, percentile):
+    """
+    Рассчитывает процентили высот ячеек по спискам высот, собранным для каждой ячейки
+    :param cells_count: количество ячеек
+    :param cell_idx: массив позиций ячеек точек
+    :param values: массив высот точек
+    :param percentile: процентиль
+    :return: массив процентилей, NaN - ячейка без точек
+    """
+    cells_values = [[] for _ in range(cells_count)]
+    for idx, value in zip(cell_idx.tolist(), values.tolist()):
+        cells_values[idx].append(value)
+    return np.array([np.percentile(cell_values, percentile) if cell_values else np.nan
+                     for cell_values in cells_values], dtype=np.float64)
+
+
+def sorted_percentiles(cells_count, cell_idx, values, percentile):
+    """
+    Рассчитывает процентили высот ячеек одной сортировкой и сегментными операциями
+    :param cells_count: количество ячеек
+    :param cell_idx: массив позиций ячеек точек
+    :param values: массив высот точек
+    :param percentile: процентиль
+    :return: массив процентилей, NaN - ячейка без точек
+    """
+    statistics = CellOrderStatistics(cells_count, percentile)
+    statistics.add_values(cell_idx, values)
+    statistics.calk_statistics()
+    return statistics.value
+
+
+def main(file_name, step=5, percentiles=(0, 10, 50)):
+    create_db()
+    scan = Scan(os.path.splitext(os.path.basename(file_name))[0])
+    scan.load_scan_from_file(file_name)
+    cached_scan = ScanCache().get_scan(scan.id)
+    model = DemModel(VoxelModel(cached_scan, step))
+    cell_idx = model.get_cell_indices(cached_scan.points.X, cached_scan.points.Y, cached_scan.points.Z)
+    inside = cell_idx >= 0
+    cell_idx, values = cell_idx[inside], cached_scan.points.Z[inside]
+
+    print(f"Точек в скане: {len(cached_scan)}, ячеек: {len(model)}")
+    for percentile in percentiles:
+        t0 = time.perf_counter()
+        per_cell = per_cell_percentiles(len(model), cell_idx, values, percentile)
+        per_cell_time = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        by_sort = sorted_percentiles(len(model), cell_idx, values, percentile)
+        sort_time = time.perf_counter() - t0
+        print(f"Процентиль {percentile}: по спискам ячеек {per_cell_time:.3f} с, одной сортировкой {sort_time:.3f} с, "
+              f"ускорение {per_cell_time / sort_time:.1f}x, "
+              f"макс. расхождение {np.nanmax(np.abs(per_cell - by_sort)):.3e}")
+        assert np.array_equal(np.isnan(per_cell), np.isnan(by_sort))
+    model.delete_model()
+    ScanCache().invalidate()
+    engine.dispose()
+    os.remove(os.path.join(".", DATABASE_NAME))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1], float(sys.argv[2]) if len(sys.argv) > 2 else 5)
@@ -0,0 +1,68 @@
+"""
+Сравнение инкрементного обновления BiModel по деактивированным точкам с полным перерасчетом модели
+Запуск из корня проекта:
+    python -m benchmarks.incremental_model_update path/to/scan.txt [step]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+from app.core.CONFIG import DATABASE_NAME
+from app.core.base.Scan import Scan
+from app.core.db.start_db import create_db, engine
+from app.core.models.BIModel import BiModel
+from app.core.models.VoxelModel import VoxelModel
+from app.core.utils.ScanCache import ScanCache
+
+
+def get_cells_z(model):
+    """
+    Возвращает средние высоты ячеек базовой модели и отметки вершин ячеек билинейной модели
+    :param model: билинейная модель
+    :return: массив значений, NaN - нет значения
+    """
+    values = [[cell.cell.avr_z, cell.left_down["Z"], cell.left_up["Z"], cell.right_down["Z"], cell.right_up["Z"]]
+              for cell in model]
+    return np.array(values, dtype=np.float64)
+
+
+def main(file_name, step=5, fractions=(0.3, 0.01, 0.001)):
+    create_db()
+    scan = Scan(os.path.splitext(os.path.basename(file_name))[0])
+    scan.load_scan_from_file(file_name)
+    cached_scan = ScanCache().get_scan(scan.id)
+    voxel_model = VoxelModel(cached_scan, step)
+    model = BiModel(voxel_model, "DEM")
+    rng = np.random.default_rng(0)
+
+    print(f"Точек в скане: {len(cached_scan)}, ячеек: {len(model)}")
+    for fraction in fractions:
+        removed = cached_scan.deactivate_points(cached_scan.points.ids[rng.random(len(cached_scan)) < fraction])
+        voxel_model.update_voxels_from_deactivated_points(removed)
+
+        t0 = time.perf_counter()
+        model.update_from_removed_points(removed)
+        update_time = time.perf_counter() - t0
+        updated_z = get_cells_z(model)
+
+        model.delete_model()
+        t0 = time.perf_counter()
+        model = BiModel(voxel_model, "DEM")
+        full_time = time.perf_counter() - t0
+        z_diff = np.nanmax(np.abs(updated_z - get_cells_z(model)))
+
+        print(f"Деактивировано точек: {len(removed)}")
+        print(f"    полный перерасчет:       {full_time:.3f} с")
+        print(f"    инкрементное обновление: {update_time:.3f} с, ускорение {full_time / update_time:.1f}x")
+        print(f"    макс. расхождение высот: {z_diff:.3e}")
+        assert np.array_equal(np.isnan(updated_z), np.isnan(get_cells_z(model))) and z_diff < 1e-6
+    model.delete_model()
+    ScanCache().invalidate()
+    engine.dispose()
+    os.remove(os.path.join(".", DATABASE_NAME))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1], float(sys.argv[2]) if len(sys.argv) > 2 else 5)
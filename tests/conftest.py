@@ -0,0 +1,50 @@
+import os
+import tempfile
+
+import numpy as np
+import pytest
+
+# Движок БД привязывается к файлу ./TEMP_DB.sqlite в рабочем каталоге при импорте app,
+# поэтому тесты работают в отдельном временном каталоге
+os.chdir(tempfile.mkdtemp(prefix="relief_tests_"))
+
+from app.core.CONFIG import DATABASE_NAME  # noqa: E402
+from app.core.base.Scan import Scan  # noqa: E402
+from app.core.db.start_db import create_db, engine  # noqa: E402
+from app.core.utils.ModelRegistry import ModelRegistry  # noqa: E402
+from app.core.utils.ScanCache import ScanCache  # noqa: E402
+from app.core.utils.VoxelModelCache import VoxelModelCache  # noqa: E402
+from app.core.utils.VoxelPyramidRegistry import VoxelPyramidRegistry  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """
+    Новая БД для каждого теста, удаляемая после теста
+    """
+    create_db()
+    yield
+    ModelRegistry().clear()
+    ScanCache().invalidate()
+    VoxelPyramidRegistry().invalidate()
+    VoxelModelCache().clear()
+    engine.dispose()
+    os.remove(os.path.join(".", DATABASE_NAME))
+
+
+@pytest.fixture
+def scan(db, tmp_path):
+    """
+    Синтетический скан из 5000 точек, загруженный в БД
+    """
+    rng = np.random.default_rng(0)
+    count = 5000
+    xyz = np.column_stack([500000 + rng.uniform(0, 40, count),
+                           6000000 + rng.uniform(0, 30, count),
+                           150 + rng.uniform(0, 10, count)])
+    rgb = rng.integers(0, 256, (count, 3))
+    file_name = tmp_path / "scan.txt"
+    np.savetxt(file_name, np.column_stack([xyz, rgb]), fmt=["%.3f", "%.3f", "%.3f", "%d", "%d", "%d"])
+    scan = Scan("scan")
+    scan.load_scan_from_file(str(file_name))
+    return scan
@@ -0,0 +1,81 @@
+import math
+
+import numpy as np
+import pytest
+
+from app.core.base.Point import Point
+from app.core.models.BIModel import BiModel
+from app.core.models.VoxelModel import VoxelModel
+from app.core.utils.ScanCache import ScanCache
+
+
+def weighted_average(z, mse):
+    """
+    Средняя высота узла с весами 1 / mse^2 по правилам поячеечного расчета узлов
+    """
+    sum_p, sum_of_pz = 0, None
+    for cell_z, cell_mse in zip(z, mse):
+        if cell_mse is None:
+            continue
+        if cell_mse == 0:
+            return cell_z, 0
+        p = 1 / cell_mse ** 2
+        sum_of_pz = p * cell_z if sum_of_pz is None else sum_of_pz + p * cell_z
+        sum_p += p
+    if sum_of_pz is None:
+        return None, None
+    return sum_of_pz / sum_p, 1 / math.sqrt(sum_p)
+
+
+def average(z):
+    """
+    Средняя высота узла без учета СКП, не определена при отсутствии высоты у смежной ячейки
+    """
+    if any(cell_z is None for cell_z in z):
+        return None, None
+    return sum(z) / len(z), None
+
+
+def reference_node(model, cell, vx, vy, enable_mse):
+    """
+    Высота и СКП вершины (vx, vy) ячейки по смежным с вершиной ячейкам базовой модели,
+    найденным по центрам соседних ячеек
+    """
+    step = model.voxel_model.step
+    x0, y0 = cell.voxel.X + step / 2, cell.voxel.Y + step / 2
+    neighbours = []
+    for dx in (vx - 1, vx):
+        for dy in (vy - 1, vy):
+            point = Point(X=x0 + dx * step, Y=y0 + dy * step, Z=0)
+            neighbour = model.base_model.get_model_element_for_point(point)
+            if neighbour is not None:
+                neighbours.append(neighbour)
+    z = [neighbour.avr_z for neighbour in neighbours]
+    mse = [neighbour.mse for neighbour in neighbours]
+    return weighted_average(z, mse) if enable_mse else average(z)
+
+
+@pytest.mark.parametrize("step", [1.0, 0.5])
+@pytest.mark.parametrize("enable_mse", [True, False])
+def test_bi_model_nodes_match_per_cell_reference(scan, step, enable_mse):
+    model = BiModel(VoxelModel(ScanCache().get_scan(scan.id), step), "DEM", enable_mse)
+    for cell in model:
+        for node, vx, vy in ((cell.left_down, 0, 0), (cell.left_up, 0, 1),
+                             (cell.right_down, 1, 0), (cell.right_up, 1, 1)):
+            z, mse = reference_node(model, cell, vx, vy, enable_mse)
+            assert (node["Z"] is None and z is None) or node["Z"] == pytest.approx(z, abs=1e-9)
+            assert (node["MSE"] is None and mse is None) or node["MSE"] == pytest.approx(mse, abs=1e-9)
+
+
+def test_bi_model_sample_matches_cell_interpolation(scan):
+    cached_scan = ScanCache().get_scan(scan.id)
+    model = BiModel(VoxelModel(cached_scan, 0.5), "DEM")
+    points = cached_scan.points
+    x = np.concatenate([points.X, [0.0, points.X.min() - 5]])
+    y = np.concatenate([points.Y, [0.0, points.Y.min() - 5]])
+    z, mse = model.sample(x, y)
+    assert np.isnan(mse).all()
+    for point_z, point_x, point_y in zip(z.tolist(), x.tolist(), y.tolist()):
+        cell = model.get_model_element_for_point(Point(X=point_x, Y=point_y, Z=0))
+        cell_z = None if cell is None else cell.get_z_from_xy(point_x, point_y)
+        assert (np.isnan(point_z) and cell_z is None) or point_z == pytest.approx(cell_z, abs=1e-9)
@@ -0,0 +1,61 @@
+import numpy as np
+
+from app.core.utils.CellStatistics import CellStatistics
+
+
+def reference_statistics(cells_count, cell_idx, values):
+    """
+    Количество, среднее и M2 значений ячеек, рассчитанные двумя проходами по значениям каждой ячейки
+    """
+    count = np.zeros(cells_count, dtype=np.int64)
+    mean = np.zeros(cells_count)
+    m2 = np.zeros(cells_count)
+    for idx in range(cells_count):
+        cell_values = values[cell_idx == idx]
+        count[idx] = len(cell_values)
+        if len(cell_values):
+            mean[idx] = cell_values.mean()
+            m2[idx] = ((cell_values - mean[idx]) ** 2).sum()
+    return count, mean, m2
+
+
+def create_values(count=20000, cells_count=50):
+    rng = np.random.default_rng(5)
+    # Высоты порядка 10^6 с разбросом в миллиметры - наивная формула среднего и суммы квадратов теряет здесь точность
+    return cells_count, rng.integers(0, cells_count, count), 1e6 + rng.uniform(0, 0.01, count)
+
+
+def assert_statistics(statistics, count, mean, m2, mean_atol=1e-9):
+    assert np.array_equal(statistics.count, count)
+    assert np.allclose(statistics.mean, mean, rtol=0, atol=mean_atol)
+    assert np.allclose(statistics.m2, m2, rtol=1e-6, atol=1e-12)
+
+
+def test_chunked_accumulation_matches_two_pass_reference():
+    cells_count, cell_idx, values = create_values()
+    statistics = CellStatistics(cells_count)
+    for chunk in np.array_split(np.arange(len(values)), 7):
+        statistics.add_values(cell_idx[chunk], values[chunk])
+    assert_statistics(statistics, *reference_statistics(cells_count, cell_idx, values))
+
+
+def test_merge_of_partial_statistics_matches_single_pass():
+    cells_count, cell_idx, values = create_values()
+    parts = [CellStatistics.create_from_values(cells_count, cell_idx[chunk], values[chunk])
+             for chunk in np.array_split(np.arange(len(values)), 3)]
+    statistics = CellStatistics(cells_count)
+    for part in reversed(parts):
+        statistics.merge(part)
+    assert_statistics(statistics, *reference_statistics(cells_count, cell_idx, values))
+
+
+def test_remove_values_matches_statistics_of_remaining_values():
+    cells_count, cell_idx, values = create_values()
+    statistics = CellStatistics.create_from_values(cells_count, cell_idx, values)
+    removed = np.random.default_rng(6).random(len(values)) < 0.3
+    removed[cell_idx == 0] = True
+    statistics.remove_values(cell_idx[removed], values[removed])
+    count, mean, m2 = reference_statistics(cells_count, cell_idx[~removed], values[~removed])
+    assert statistics.count[0] == 0 and statistics.mean[0] == 0 and statistics.m2[0] == 0
+    # Исключение значений - операция, обратная объединению, и накапливает ошибку округления в несколько ulp
+    assert_statistics(statistics, count, mean, m2, mean_atol=1e-8)
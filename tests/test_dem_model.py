@@ -0,0 +1,57 @@
+import math
+
+import numpy as np
+import pytest
+
+from app.core.base.Point import Point
+from app.core.models.DemModel import DemModel
+from app.core.models.VoxelModel import VoxelModel
+from app.core.utils.ScanCache import ScanCache
+
+
+def reference_cells(model, scan):
+    """
+    Средние высоты, избыточность и СКП ячеек, рассчитанные поточечно по ячейкам get_model_element_for_point
+    """
+    cells_z = {}
+    for point in scan:
+        cell = model.get_model_element_for_point(point)
+        if cell is not None:
+            cells_z.setdefault(id(cell), []).append(point.Z)
+    reference = {}
+    for cell_id, z in cells_z.items():
+        avr_z = math.fsum(z) / len(z)
+        mse = math.sqrt(math.fsum((value - avr_z) ** 2 for value in z) / (len(z) - 1)) if len(z) > 1 else None
+        reference[cell_id] = (avr_z, len(z) - 1, mse)
+    return reference
+
+
+@pytest.mark.parametrize("step, is_2d", [(2.0, True), (1.0, True), (2.0, False)])
+def test_dem_model_matches_per_point_reference(scan, step, is_2d):
+    cached_scan = ScanCache().get_scan(scan.id)
+    model = DemModel(VoxelModel(cached_scan, step, is_2d_vxl_mdl=is_2d))
+    reference = reference_cells(model, cached_scan)
+    assert len(reference) == len(model)
+    for cell in model:
+        avr_z, r, mse = reference[id(cell)]
+        assert cell.avr_z == pytest.approx(avr_z, abs=1e-9)
+        assert cell.r == r
+        assert (cell.mse is None and mse is None) or cell.mse == pytest.approx(mse, abs=1e-9)
+
+
+
+def test_dem_model_sample_matches_cells_of_points(scan):
+    cached_scan = ScanCache().get_scan(scan.id)
+    model = DemModel(VoxelModel(cached_scan, 1.0))
+    points = cached_scan.points
+    x = np.concatenate([points.X, [0.0, points.X.max() + 10]])
+    y = np.concatenate([points.Y, [0.0, points.Y.max() + 10]])
+    z, mse = model.sample(x, y)
+    for point_z, point_mse, point_x, point_y in zip(z.tolist(), mse.tolist(), x.tolist(), y.tolist()):
+        cell = model.get_model_element_for_point(Point(X=point_x, Y=point_y, Z=0))
+        if cell is None:
+            assert np.isnan(point_z) and np.isnan(point_mse)
+            continue
+        assert point_z == cell.get_z_from_xy(point_x, point_y)
+        cell_mse = cell.get_mse_z_from_xy(point_x, point_y)
+        assert (np.isnan(point_mse) and cell_mse is None) or point_mse == cell_mse
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from app.core.models.BIModel import BiModel
+from app.core.models.DemPercentileModel import DemMedianModel, DemMinModel, DemPercentileModel
+from app.core.models.VoxelModel import VoxelModel
+from app.core.utils.ScanCache import ScanCache
+
+
+def reference_cells(model, scan, percentile):
+    """
+    Процентили и СКП высот, рассчитанные np.percentile отдельно для точек каждой ячейки
+    """
+    points = scan.points
+    cell_idx = model.get_cell_indices(points.X, points.Y, points.Z)
+    z = np.full(len(model), np.nan)
+    mse = np.full(len(model), np.nan)
+    for idx in np.unique(cell_idx[cell_idx >= 0]).tolist():
+        cell_z = points.Z[cell_idx == idx]
+        z[idx] = np.percentile(cell_z, percentile)
+        if len(cell_z) > 1:
+            mse[idx] = np.sqrt(np.sum((cell_z - z[idx]) ** 2) / (len(cell_z) - 1))
+    return z, mse
+
+
+@pytest.mark.parametrize("model_factory, percentile", [(DemMinModel, 0),
+                                                       (DemMedianModel, 50),
+                                                       (lambda vm: DemPercentileModel(vm, 25), 25)])
+def test_percentile_models_match_np_percentile_per_cell(scan, model_factory, percentile):
+    cached_scan = ScanCache().get_scan(scan.id)
+    model = model_factory(VoxelModel(cached_scan, 2.0))
+    z, mse = reference_cells(model, cached_scan, percentile)
+    assert model.percentile == percentile
+    assert np.allclose(model.get_cell_values("avr_z"), z, equal_nan=True)
+    assert np.allclose(model.get_cell_values("mse"), mse, equal_nan=True)
+
+
+def test_bi_model_passes_percentile_to_base_model(scan):
+    voxel_model = VoxelModel(ScanCache().get_scan(scan.id), 2.0)
+    model = BiModel(voxel_model, "DEM_PERCENTILE", True, 25)
+    default_model = BiModel(voxel_model, "DEM_PERCENTILE")
+    assert model.base_model.percentile == 25
+    assert model.model_type == "BI_DEM_P25_WITH_MSE"
+    assert default_model.model_name != model.model_name
+    expected = DemPercentileModel(voxel_model, 25)
+    assert np.allclose(model.base_model.get_cell_values("avr_z"), expected.get_cell_values("avr_z"),
+                       equal_nan=True)
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from app.core.models.BIModel import BiModel
+from app.core.models.VoxelModel import VoxelModel
+from app.core.utils.ScanCache import ScanCache
+
+
+def model_state(model, cached_scan):
+    points = cached_scan.points
+    z, mse = model.sample(points.X, points.Y, points.Z)
+    return [model.get_cell_values("mse"), model.get_cell_values("r"),
+            model.base_model.get_cell_values("avr_z"), model.base_model.get_cell_values("mse"), z, mse]
+
+
+def assert_same_state(state, expected):
+    for values, expected_values in zip(state, expected):
+        assert np.allclose(values, expected_values, equal_nan=True)
+
+
+@pytest.mark.parametrize("storage", ["raster", "cells"])
+@pytest.mark.parametrize("base_model_type", ["DEM", "DEM_MEDIAN"])
+def test_incremental_update_matches_rebuild(scan, monkeypatch, storage, base_model_type):
+    monkeypatch.setattr("app.core.models.SegmentedModelABC.SEGMENTED_MODEL_STORAGE", storage)
+    cached_scan = ScanCache().get_scan(scan.id)
+    voxel_model = VoxelModel(cached_scan, 2.0)
+    model = BiModel(voxel_model, base_model_type)
+    assert voxel_model.get_membership() is not None
+
+    def read_scan(*args):
+        raise AssertionError("Точки изменившихся ячеек должны выбираться по принадлежности точек вокселям")
+
+    rng = np.random.default_rng(3)
+    with monkeypatch.context() as patch:
+        patch.setattr(type(cached_scan), "iter_batches", read_scan)
+        for share in (0.001, 0.05):
+            removed = cached_scan.deactivate_points(cached_scan.points.ids[rng.random(len(cached_scan)) < share])
+            voxel_model.update_voxels_from_deactivated_points(removed)
+            assert len(model.update_from_removed_points(removed)) > 0
+    updated = model_state(model, cached_scan)
+
+    assert_same_state(model_state(BiModel(voxel_model, base_model_type), cached_scan), updated)
+    model.delete_model()
+    model.base_model.delete_model()
+    assert_same_state(model_state(BiModel(voxel_model, base_model_type), cached_scan), updated)
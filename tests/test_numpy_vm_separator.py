@@ -0,0 +1,49 @@
+import os
+
+import numpy as np
+from sqlalchemy import select
+
+from app.core.CONFIG import DATABASE_NAME
+from app.core.base.Scan import Scan
+from app.core.db.start_db import Tables, create_db, engine
+from app.core.models.VoxelModel import VoxelModel
+from app.core.utils.FastVMSeparator import FastVMSeparator
+from app.core.utils.NumpyVMSeparator import NumpyVMSeparator
+from app.core.utils.ScanCache import ScanCache
+from app.core.utils.VoxelModelCache import VoxelModelCache
+from app.core.utils.VoxelPyramidRegistry import VoxelPyramidRegistry
+
+
+def separate_voxel_models(scan, separator):
+    """
+    Разбивает по скану 3D и 2D воксельные модели и возвращает строки таблицы voxels
+    """
+    for step, is_2d in ((1.0, False), (2.0, True)):
+        VoxelModel(scan, step, dx=0.25, dy=0.25, is_2d_vxl_mdl=is_2d, voxel_model_separator=separator)
+    columns = Tables.voxels_db_table.c
+    select_ = select(columns.id, columns.vxl_key, columns.X, columns.Y, columns.Z, columns.step, columns.len,
+                     columns.R, columns.G, columns.B, columns.vxl_mdl_id).order_by(columns.id)
+    with engine.connect() as db_connection:
+        return np.array(db_connection.execute(select_).fetchall(), dtype=np.float64)
+
+
+def test_numpy_separator_matches_fast_separator_rows(scan, tmp_path, monkeypatch):
+    monkeypatch.setattr(VoxelModelCache(), "max_size", 0)
+    monkeypatch.setattr(VoxelPyramidRegistry, "get_separator", lambda *args: None)
+    file_name = tmp_path / "scan.txt"
+    fast_rows = separate_voxel_models(Scan.get_scan_from_id(scan.id), FastVMSeparator())
+
+    ScanCache().invalidate()
+    engine.dispose()
+    os.remove(os.path.join(".", DATABASE_NAME))
+    create_db()
+    scan = Scan("scan")
+    scan.load_scan_from_file(str(file_name))
+    numpy_rows = separate_voxel_models(ScanCache().get_scan(scan.id), NumpyVMSeparator())
+
+    assert len(fast_rows) > 0 and fast_rows.shape == numpy_rows.shape
+    rgb = slice(7, 10)
+    assert np.array_equal(np.delete(fast_rows, rgb, axis=1), np.delete(numpy_rows, rgb, axis=1))
+    # Средний цвет FastVMSeparator накапливается скользящим средним, поэтому при округлении половин
+    # допускается расхождение на единицу
+    assert np.abs(fast_rows[:, rgb] - numpy_rows[:, rgb]).max() <= 1
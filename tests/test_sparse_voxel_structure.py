@@ -0,0 +1,28 @@
+import numpy as np
+
+from app.core.utils.SparseVoxelStructure import SparseVoxelStructure
+
+
+class GridVoxelModel:
+    X_count, Y_count, Z_count = 20, 15, 10
+    vm_name = "grid"
+
+
+def test_add_points_batches_match_dense_accumulation():
+    rng = np.random.default_rng(0)
+    full_size = GridVoxelModel.X_count * GridVoxelModel.Y_count * GridVoxelModel.Z_count
+    keys = rng.integers(0, full_size, 10000)
+    rgb = rng.integers(0, 256, (10000, 3)).astype(np.float64)
+    voxel_structure = SparseVoxelStructure(GridVoxelModel())
+    for start in range(0, len(keys), 700):
+        voxel_structure.add_points(keys[start:start + 700], rgb[start:start + 700])
+    counts = np.bincount(keys, minlength=full_size)
+    expected_keys = np.flatnonzero(counts)
+    assert np.array_equal(voxel_structure.keys, expected_keys)
+    assert np.array_equal(voxel_structure.counts, counts[expected_keys])
+    assert voxel_structure.counts.dtype == np.int64
+    for color in range(3):
+        assert np.allclose(voxel_structure.rgb_sums[:, color],
+                           np.bincount(keys, weights=rgb[:, color], minlength=full_size)[expected_keys])
+    voxel_structure.add_points(keys[:10], rgb[:10])
+    assert voxel_structure.counts.sum() == len(keys) + 10
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from sqlalchemy import func, select
+
+from app.core.base.Voxel import Voxel
+from app.core.db.start_db import Tables, engine
+from app.core.models.VoxelModel import VoxelModel
+from app.core.utils.ScanCache import ScanCache
+
+
+def voxels_count():
+    with engine.connect() as db_connection:
+        return db_connection.execute(select(func.count()).select_from(Tables.voxels_db_table)).scalar()
+
+
+def grid_voxel_data(voxel_model, x, y, z):
+    return (voxel_model.min_X + x * voxel_model.step, voxel_model.min_Y + y * voxel_model.step,
+            voxel_model.min_Z + z * voxel_model.step, voxel_model.step, voxel_model.id)
+
+
+@pytest.fixture
+def voxel_model(scan):
+    return VoxelModel(ScanCache().get_scan(scan.id), 1.0, is_2d_vxl_mdl=False)
+
+
+def test_get_or_create_many_resolves_existing_and_creates_new_voxels(voxel_model):
+    voxel_arrays = voxel_model.load_arrays()
+    existing = [grid_voxel_data(voxel_model, x, y, z)
+                for x, y, z in zip(voxel_arrays.ix[:3].tolist(), voxel_arrays.iy[:3].tolist(),
+                                   voxel_arrays.iz[:3].tolist())]
+    empty_keys = np.setdiff1d(np.arange(voxel_model.X_count * voxel_model.Y_count * voxel_model.Z_count),
+                              voxel_arrays.keys & ((1 << Voxel.VXL_KEY_MODEL_SHIFT) - 1))[:2]
+    new = [grid_voxel_data(voxel_model, key % voxel_model.X_count, key // voxel_model.X_count % voxel_model.Y_count,
+                           key // (voxel_model.X_count * voxel_model.Y_count))
+           for key in empty_keys.tolist()]
+    voxels_data = existing + new + new[:1]
+    count_before = voxels_count()
+
+    voxels = Voxel.get_or_create_many(voxels_data)
+    assert [voxel.id for voxel in voxels[:3]] == voxel_arrays.ids[:3].tolist()
+    assert [voxel.len for voxel in voxels[:3]] == voxel_arrays.len[:3].tolist()
+    assert voxels[3].id not in voxel_arrays.ids and voxels[4].id not in voxel_arrays.ids
+    assert voxels[3].id != voxels[4].id and voxels[5].id == voxels[3].id
+    assert voxels[3].len == 0
+    assert voxels_count() == count_before + 2
+
+    resolved = Voxel.get_or_create_many(voxels_data)
+    assert [voxel.id for voxel in resolved] == [voxel.id for voxel in voxels]
+    assert [voxel.vxl_key for voxel in resolved] == [voxel.vxl_key for voxel in voxels]
+    assert Voxel(*new[0]).id == voxels[3].id
+    assert voxels_count() == count_before + 2
+
+
+@pytest.mark.parametrize("shift", [(0.5, 0, 0, 0),
+                                   (0, 0.3, 0, 0),
+                                   (-1, 0, 0, 0),
+                                   (0, 0, 1000, 0),
+                                   (0, 1000, 0, 0),
+                                   (0, 0, 0, 1.0)])
+def test_get_or_create_many_rejects_voxels_outside_model_grid(voxel_model, shift):
+    X, Y, Z, step, vxl_mdl_id = grid_voxel_data(voxel_model, 0, 0, 0)
+    dx, dy, dz, d_step = shift
+    bad_voxel = (X + dx * voxel_model.step, Y + dy * voxel_model.step, Z + dz * voxel_model.step, step + d_step,
+                 vxl_mdl_id)
+    count_before = voxels_count()
+    with pytest.raises(ValueError):
+        Voxel.get_or_create_many([grid_voxel_data(voxel_model, 1, 1, 1), bad_voxel])
+    with pytest.raises(ValueError):
+        Voxel(*bad_voxel)
+    assert voxels_count() == count_before
+
+
+def test_get_or_create_many_rejects_unknown_voxel_model(voxel_model):
+    X, Y, Z, step, vxl_mdl_id = grid_voxel_data(voxel_model, 0, 0, 0)
+    with pytest.raises(ValueError):
+        Voxel.get_or_create_many([(X, Y, Z, step, vxl_mdl_id + 1)])
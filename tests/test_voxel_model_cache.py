@@ -0,0 +1,104 @@
+import os
+
+import numpy as np
+import pytest
+
+from app.core.CONFIG import DATABASE_NAME
+from app.core.base.Scan import Scan
+from app.core.db.start_db import create_db, engine
+from app.core.models.VoxelModel import VoxelModel
+from app.core.utils.ModelRegistry import ModelRegistry
+from app.core.utils.NumpyVMSeparator import NumpyVMSeparator
+from app.core.utils.ScanCache import ScanCache
+from app.core.utils.VoxelModelCache import VoxelModelCache
+from app.core.utils.VoxelPyramidRegistry import VoxelPyramidRegistry
+
+
+@pytest.fixture
+def points():
+    rng = np.random.default_rng(1)
+    count = 3000
+    xyz = np.column_stack([500000 + rng.uniform(0, 20, count),
+                           6000000 + rng.uniform(0, 15, count),
+                           150 + rng.uniform(0, 5, count)])
+    return np.round(xyz, 3), rng.integers(0, 256, (count, 3))
+
+
+@pytest.fixture
+def separations(monkeypatch):
+    """
+    Счетчик разбиений воксельных моделей по скану (промахов кеша)
+    """
+    calls = []
+    separate_voxel_model = NumpyVMSeparator.separate_voxel_model
+
+    def counting_separate(self, voxel_model, scan):
+        calls.append(voxel_model.vm_name)
+        return separate_voxel_model(self, voxel_model, scan)
+
+    monkeypatch.setattr(NumpyVMSeparator, "separate_voxel_model", counting_separate)
+    return calls
+
+
+def load_scan(file_name, xyz, rgb):
+    np.savetxt(file_name, np.column_stack([xyz, rgb]), fmt=["%.3f", "%.3f", "%.3f", "%d", "%d", "%d"])
+    scan = Scan("scan")
+    scan.load_scan_from_file(str(file_name))
+    return ScanCache().get_scan(scan.id)
+
+
+def reset_db():
+    ModelRegistry().clear()
+    ScanCache().invalidate()
+    VoxelPyramidRegistry().invalidate()
+    engine.dispose()
+    os.remove(os.path.join(".", DATABASE_NAME))
+    create_db()
+
+
+def test_cache_hit_after_db_reset_restores_voxels_and_membership(db, tmp_path, points, separations):
+    xyz, rgb = points
+    built = VoxelModel(load_scan(tmp_path / "scan.txt", xyz, rgb), 1.0, is_2d_vxl_mdl=False)
+    built_arrays = built.load_arrays()
+    path = VoxelModelCache().get_cache_path(built, ScanCache().get_scan(built.base_scan_id))
+    os.utime(path, (0, 0))
+
+    reset_db()
+    loaded = VoxelModel(load_scan(tmp_path / "scan.txt", xyz, rgb), 1.0, is_2d_vxl_mdl=False)
+    loaded_arrays = loaded.load_arrays()
+    assert len(separations) == 1
+    assert os.path.getmtime(path) > 0
+    assert np.array_equal(loaded_arrays.keys, built_arrays.keys)
+    assert np.array_equal(loaded_arrays.len, built_arrays.len)
+    assert np.array_equal(loaded_arrays.rgb, built_arrays.rgb)
+    assert np.array_equal(loaded.membership.point_ids, built.membership.point_ids)
+    assert np.array_equal(loaded.membership.voxel_idx, built.membership.voxel_idx)
+    loaded.membership = None
+    assert np.array_equal(loaded.get_membership().voxel_idx, built.membership.voxel_idx)
+
+
+def test_cache_miss_after_db_reset_and_changed_point(db, tmp_path, points, separations):
+    xyz, rgb = points
+    VoxelModel(load_scan(tmp_path / "scan.txt", xyz, rgb), 1.0, is_2d_vxl_mdl=False)
+
+    reset_db()
+    xyz = xyz.copy()
+    xyz[len(xyz) // 2, 2] += 0.5
+    changed_scan = load_scan(tmp_path / "scan.txt", xyz, rgb)
+    VoxelModel(changed_scan, 1.0, is_2d_vxl_mdl=False)
+    assert len(separations) == 2
+
+
+def test_cache_evicts_least_recently_used_files(db, tmp_path, points, monkeypatch):
+    xyz, rgb = points
+    cached_scan = load_scan(tmp_path / "scan.txt", xyz, rgb)
+    first = VoxelModel(cached_scan, 1.0, is_2d_vxl_mdl=False)
+    second = VoxelModel(cached_scan, 1.5, is_2d_vxl_mdl=False)
+    cache = VoxelModelCache()
+    first_path, second_path = cache.get_cache_path(first, cached_scan), cache.get_cache_path(second, cached_scan)
+    os.utime(second_path, (0, 0))
+
+    monkeypatch.setattr(cache, "max_size", os.path.getsize(first_path) + os.path.getsize(second_path) - 1)
+    cache.save_voxel_structure(first, cached_scan)
+    assert os.path.isfile(first_path)
+    assert not os.path.isfile(second_path)
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from app.core.models.VoxelModel import VoxelModel
+from app.core.utils.NumpyVMSeparator import NumpyVMSeparator, VoxelDataAccumulator
+from app.core.utils.ScanCache import ScanCache
+
+
+def separate_with_numpy(voxel_model, scan):
+    accumulator = VoxelDataAccumulator(voxel_model, store_membership=False)
+    for batch in scan.iter_batches():
+        accumulator.add_batch(batch)
+    return accumulator.create_voxel_structure()
+
+
+@pytest.mark.parametrize("is_2d", [True, False])
+def test_pyramid_served_models_match_numpy_separation(scan, monkeypatch, is_2d):
+    cached_scan = ScanCache().get_scan(scan.id)
+    VoxelModel(cached_scan, 0.5, is_2d_vxl_mdl=is_2d)
+
+    def read_scan(*args):
+        raise AssertionError("Воксельная модель должна быть получена из пирамиды без чтения скана")
+
+    monkeypatch.setattr(NumpyVMSeparator, "separate_voxel_model", read_scan)
+    for step, shift in ((1.0, 0.0), (2.0, 0.0), (2.0, 0.5), (4.0, 0.25)):
+        voxel_model = VoxelModel(cached_scan, step, dx=shift, dy=shift, is_2d_vxl_mdl=is_2d)
+        expected = separate_with_numpy(voxel_model, cached_scan)
+        assert np.array_equal(voxel_model.voxel_structure.keys, expected.keys)
+        assert np.array_equal(voxel_model.voxel_structure.counts, expected.counts)
+        assert np.allclose(voxel_model.voxel_structure.rgb_sums, expected.rgb_sums)
+        assert voxel_model.len == len(expected)
+
+
+def test_models_not_on_pyramid_grid_are_separated(scan):
+    cached_scan = ScanCache().get_scan(scan.id)
+    VoxelModel(cached_scan, 0.5)
+    voxel_model = VoxelModel(cached_scan, 1.5)
+    expected = separate_with_numpy(voxel_model, cached_scan)
+    assert np.array_equal(voxel_model.voxel_structure.counts, expected.counts)
+    assert voxel_model.membership is not None